@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CatalogueServiceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalogue_service'
+
+    def ready(self):
+        from . import signals  # noqa: F401
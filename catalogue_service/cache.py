@@ -0,0 +1,84 @@
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from utils.versions import lire_version, nouvelle_version
+
+from .models import Service
+
+# Séquence PostgreSQL : la version est commune à tous les processus, alors que
+# le cache par défaut (LocMemCache) est propre à chacun.
+SEQUENCE_VERSION = 'catalogue_version'
+
+# Par processus : modèle -> (version, objets dans l'ordre du modèle, objets par clé).
+_instantanes = {}
+_verrou = threading.Lock()
+
+
+def version_catalogue():
+    """
+    Version courante du catalogue (services et catégories), à inclure dans les
+    clés des fragments qui affichent plusieurs de ses objets : elle change à
+    chaque écriture, y compris une suppression, dans tous les processus.
+    """
+    return lire_version(SEQUENCE_VERSION)
+
+
+def _nouvelle_version():
+    nouvelle_version(SEQUENCE_VERSION)
+
+
+def invalider_catalogue():
+    """
+    Change de version tout de suite, puis à nouveau à la validation de la
+    transaction : un rendu fait entre les deux, qui lisait encore l'ancien
+    état, n'est pas servi après la validation.
+    """
+    _nouvelle_version()
+    transaction.on_commit(_nouvelle_version)
+
+
+def _charger(modele):
+    # Toujours sur le primaire : un réplica en retard figerait un état périmé
+    # sous la nouvelle version, jusqu'à l'écriture suivante.
+    queryset = modele._default_manager.db_manager(DEFAULT_DB_ALIAS).all()
+    if modele is Service:
+        queryset = queryset.select_related('categorie')
+    objets = list(queryset)
+    return objets, {objet.pk: objet for objet in objets}
+
+
+def _instantane(modele):
+    version = version_catalogue()
+    instantane = _instantanes.get(modele)
+    if instantane is not None and instantane[0] == version:
+        return instantane
+    with _verrou:
+        instantane = _instantanes.get(modele)
+        if instantane is not None and instantane[0] == version:
+            return instantane
+        instantane = (version, *_charger(modele))
+        # Chargé dans une transaction, l'instantané peut contenir des écritures
+        # qui seront annulées : il sert à l'appelant mais n'est pas gardé.
+        if not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            _instantanes[modele] = instantane
+    return instantane
+
+
+def objets_catalogue(modele):
+    """
+    Tous les services (catégorie comprise) ou toutes les catégories, dans
+    l'ordre du modèle, servis depuis la mémoire du processus : relus quand la
+    version du catalogue a changé. Les objets sont partagés : ne pas les modifier.
+    """
+    return _instantane(modele)[1]
+
+
+def objet_catalogue(modele, pk):
+    """Le service ou la catégorie de clé ``pk`` (partagé, comme objets_catalogue()), ou None."""
+    return _instantane(modele)[2].get(pk)
+
+
+def vider_instantanes():
+    """Oublie les instantanés du processus (tests)."""
+    with _verrou:
+        _instantanes.clear()
@@ -0,0 +1,76 @@
+import copy
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django_filters import fields as filtres
+
+from .cache import objet_catalogue, objets_catalogue
+
+
+class _ChoixCatalogueIterator(forms.models.ModelChoiceIterator):
+    """Choix lus dans l'instantané du catalogue plutôt que par une requête."""
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for objet in self.field.objets_proposes():
+            yield self.choice(objet)
+
+    def __len__(self):
+        return len(self.field.objets_proposes()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.objets_proposes())
+
+
+class _ChoixCatalogueFiltreIterator(filtres.ModelChoiceIterator, _ChoixCatalogueIterator):
+    pass
+
+
+class ChoixCatalogueMixin:
+    """
+    Pour un ModelChoiceField sur Service ou Categorie : liste et validation
+    servies par l'instantané du catalogue. Un queryset sans filtre propose tout
+    le modèle, sans requête ; un queryset restreint (services actifs...) est
+    respecté, au prix d'une requête sur les seules clés, une fois par champ.
+    """
+
+    def _cles_autorisees(self):
+        """Clés du queryset s'il est restreint, None s'il couvre tout le modèle."""
+        if not self.queryset.query.has_filters():
+            return None
+        autorisees = getattr(self, '_autorisees', None)
+        if autorisees is None or autorisees[0] is not self.queryset:
+            autorisees = self._autorisees = (self.queryset, set(self.queryset.values_list('pk', flat=True)))
+        return autorisees[1]
+
+    def objets_proposes(self):
+        objets = objets_catalogue(self.queryset.model)
+        cles = self._cles_autorisees()
+        return objets if cles is None else [objet for objet in objets if objet.pk in cles]
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        modele = self.queryset.model
+        if isinstance(value, modele):
+            value = value.pk
+        try:
+            objet = objet_catalogue(modele, int(value))
+        except (TypeError, ValueError):
+            objet = None
+        cles = self._cles_autorisees() if objet is not None else None
+        if objet is None or (cles is not None and objet.pk not in cles):
+            raise ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value},
+            )
+        # Copie : l'objet validé est rattaché à une instance qui peut le modifier.
+        return copy.copy(objet)
+
+
+class ChoixCatalogueField(ChoixCatalogueMixin, forms.ModelChoiceField):
+    iterator = _ChoixCatalogueIterator
+
+
+class ChoixCatalogueFiltreField(ChoixCatalogueMixin, filtres.ModelChoiceField):
+    iterator = _ChoixCatalogueFiltreIterator
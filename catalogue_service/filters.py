@@ -1,6 +1,13 @@
 import django_filters
 from django import forms
 from .models import Service, Categorie
+from .fields import ChoixCatalogueFiltreField
+
+
+class ChoixCatalogueFilter(django_filters.ModelChoiceFilter):
+    """ModelChoiceFilter sur Service ou Categorie servi par l'instantané du catalogue."""
+    field_class = ChoixCatalogueFiltreField
+
 
 class ServiceFilter(django_filters.FilterSet):
     nom = django_filters.CharFilter(
@@ -8,7 +15,7 @@ class ServiceFilter(django_filters.FilterSet):
         lookup_expr='icontains',
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Rechercher par nom'})
     )
-    categorie = django_filters.ModelChoiceFilter(
+    categorie = ChoixCatalogueFilter(
         field_name='categorie',
         queryset=Categorie.objects.all(),
         empty_label='Toutes les catégories',
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue_service', '0003_categorie_date_mise_a_jour'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(condition=models.Q(('actif', True)), fields=['nom'], name='service_actifs_nom_idx'),
+        ),
+    ]
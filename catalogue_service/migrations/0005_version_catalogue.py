@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue_service', '0004_index_acces'),
+    ]
+
+    operations = [
+        # Version du catalogue partagée par tous les processus (catalogue_service.cache).
+        migrations.RunSQL(
+            "CREATE SEQUENCE catalogue_version; SELECT setval('catalogue_version', 1);",
+            'DROP SEQUENCE catalogue_version;',
+        ),
+    ]
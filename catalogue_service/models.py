@@ -87,6 +87,10 @@ class Service(models.Model):
         verbose_name = "Service"
         verbose_name_plural = "Services"
         ordering = ['nom']
+        indexes = [
+            # Catalogue et listes déroulantes : services actifs triés par nom.
+            models.Index(fields=['nom'], condition=models.Q(actif=True), name='service_actifs_nom_idx'),
+        ]
 
     def __str__(self):
         return self.nom
\ No newline at end of file
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalider_catalogue
+from .models import Categorie, Service
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Categorie)
+@receiver(post_delete, sender=Categorie)
+def changer_version_catalogue(sender, **kwargs):
+    invalider_catalogue()
@@ -1,12 +1,21 @@
-from django.test import TestCase, Client
+from django import forms
+from django.core.cache import cache, caches
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import Group
 from utilisateur.models import Utilisateur, Role
 from .models import Categorie, Service
 from .forms import CategorieForm, ServiceForm
+from .cache import objet_catalogue, objets_catalogue, vider_instantanes
+from .fields import ChoixCatalogueField
 from decimal import Decimal
+from utils.testing import QueryBudgetTestMixin
+from utils.versions import versions_memorisees
 
-class CatalogueServiceTest(TestCase):
+class CatalogueServiceTest(QueryBudgetTestMixin, TestCase):
     @classmethod
     def setUpTestData(cls):
         # Création des utilisateurs et des groupes
@@ -58,6 +67,8 @@ class CatalogueServiceTest(TestCase):
 
     def setUp(self):
         self.client = Client()
+        # Les fragments d'une version du catalogue survivraient au rollback du test précédent.
+        caches['template_fragments'].clear()
 
     # --- Tests des permissions de la vue de service ---
 
@@ -152,4 +163,164 @@ class CatalogueServiceTest(TestCase):
         response = self.client.get(reverse('service_list'), {'actif': 'False'})
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.context['services']), 1)
-        self.assertEqual(response.context['services'][0], self.service3)
\ No newline at end of file
+        self.assertEqual(response.context['services'][0], self.service3)
+
+    def test_service_export_csv(self):
+        """Export CSV des services filtrés, avec le libellé des choix."""
+        self.client.login(username='commercial_user', password='password123')
+        response = self.client.get(reverse('service_list'), {'categorie': self.categorie1.pk, 'export': 'csv'})
+        lignes = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lignes), 3)
+        self.assertIn('Abonnement Maintenance;Développement Web;', lignes[1])
+        self.assertIn(';Abonnement Mensuel;', lignes[1])
+
+    # --- Tests du cache des fragments ---
+
+    def test_liste_services_tableau_en_cache(self):
+        """Le tableau est servi par le cache sans relire les services, jusqu'à la prochaine écriture."""
+        self.client.login(username='commercial_user', password='password123')
+        self.client.get(reverse('service_list'))
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('service_list'))
+        self.assertContains(response, 'Nombre total de services : 3')
+        self.assertFalse(any('catalogue_service_service' in q['sql'] for q in requetes.captured_queries))
+
+        Service.objects.create(nom="Campagne Emailing", prix=Decimal('800.00'), categorie=self.categorie2)
+        self.assertContains(self.client.get(reverse('service_list')), 'Campagne Emailing')
+        self.service3.delete()
+        self.assertNotContains(self.client.get(reverse('service_list')), 'Consultation SEO')
+
+    def test_liste_services_tableau_version_partagee(self):
+        """Une écriture faite dans un autre processus change la version partagée : le tableau est recalculé."""
+        self.client.login(username='commercial_user', password='password123')
+        self.client.get(reverse('service_list'))
+        # Ni signal ni version locale : seule la séquence partagée avance, comme depuis un autre processus.
+        Service.objects.filter(pk=self.service3.pk).update(nom="Audit SEO", date_mise_a_jour=timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval('catalogue_version')")
+        self.assertContains(self.client.get(reverse('service_list')), 'Audit SEO')
+
+    def test_liste_services_lignes_en_cache(self):
+        """Chaque ligne suit la date de mise à jour du service et de sa catégorie."""
+        self.client.login(username='admin_user', password='password123')
+        self.client.get(reverse('service_list'))
+
+        # Écriture sans signal ni date de mise à jour : la ligne vient toujours du cache.
+        Service.objects.filter(pk=self.service1.pk).update(nom="Site Vitrine Premium")
+        Service.objects.create(nom="Campagne Emailing", prix=Decimal('800.00'), categorie=self.categorie2)
+        response = self.client.get(reverse('service_list'))
+        self.assertContains(response, 'Campagne Emailing')
+        self.assertContains(response, 'Création de Site Vitrine')
+
+        self.service1.refresh_from_db()
+        self.service1.save()
+        self.categorie2.nom = "Marketing Digital"
+        self.categorie2.save()
+        response = self.client.get(reverse('service_list'))
+        self.assertContains(response, 'Site Vitrine Premium')
+        self.assertContains(response, '<td>Marketing Digital</td>', count=2)
+        self.assertNotContains(response, '<td>Marketing</td>')
+        self.assertContains(self.client.get(reverse('categorie_list')), 'Marketing Digital')
+
+    # --- Tests des budgets de requêtes ---
+
+    def test_budget_requetes_vues(self):
+        """Le nombre de requêtes des vues du catalogue ne dépend pas du nombre de services."""
+        for i in range(10):
+            Service.objects.create(
+                nom=f"Service {i}", description="Service de test.", prix=Decimal('100.00'),
+                type_tarif='FACTURATION_UNIQUE', categorie=self.categorie2
+            )
+        self.client.login(username='commercial_user', password='password123')
+        for url in [
+            reverse('service_list'), reverse('categorie_list'),
+            reverse('service_detail', args=[self.service1.pk]),
+            reverse('categorie_detail', args=[self.categorie1.pk]),
+        ]:
+            with self.subTest(url=url):
+                self.assertRespecteBudget(url)
+
+        self.client.login(username='admin_user', password='password123')
+        for url in [
+            reverse('service_create'), reverse('categorie_create'),
+            reverse('service_update', args=[self.service1.pk]),
+            reverse('categorie_update', args=[self.categorie1.pk]),
+            reverse('service_confirm_delete', args=[self.service1.pk]),
+            reverse('categorie_confirm_delete', args=[self.categorie1.pk]),
+        ]:
+            with self.subTest(url=url):
+                self.assertRespecteBudget(url)
+
+
+class InstantaneCatalogueTest(TransactionTestCase):
+    """Hors TestCase : un instantané chargé dans une transaction n'est pas gardé."""
+
+    def setUp(self):
+        cache.clear()
+        vider_instantanes()
+        self.categorie = Categorie.objects.create(nom="Formation")
+        self.service = Service.objects.create(nom="Atelier", prix=Decimal('300.00'), categorie=self.categorie)
+
+    def tearDown(self):
+        cache.clear()
+        vider_instantanes()
+
+    def test_relu_seulement_quand_la_version_change(self):
+        with versions_memorisees(), CaptureQueriesContext(connection) as requetes:
+            self.assertEqual(objets_catalogue(Service), [self.service])
+            self.assertEqual(objet_catalogue(Service, self.service.pk).categorie.nom, "Formation")
+            self.assertEqual(objet_catalogue(Categorie, self.categorie.pk), self.categorie)
+        # Version (une fois par requête), services, catégories.
+        self.assertEqual(len(requetes), 3)
+
+        self.categorie.nom = "Formation continue"
+        self.categorie.save()
+        with versions_memorisees(), CaptureQueriesContext(connection) as requetes:
+            self.assertIsNone(objet_catalogue(Service, 0))
+            self.assertEqual(objet_catalogue(Service, self.service.pk).categorie.nom, "Formation continue")
+            objets_catalogue(Service)
+        self.assertEqual(len(requetes), 2)
+
+        self.service.delete()
+        self.assertEqual(objets_catalogue(Service), [])
+
+    def test_version_partagee_entre_processus(self):
+        """Une écriture faite par un autre processus (sans signal ici) est vue à la requête suivante."""
+        self.assertEqual(objet_catalogue(Service, self.service.pk).prix, Decimal('300.00'))
+        Service.objects.filter(pk=self.service.pk).update(prix=Decimal('350.00'))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval('catalogue_version')")
+        self.assertEqual(objet_catalogue(Service, self.service.pk).prix, Decimal('350.00'))
+
+    def test_non_garde_dans_une_transaction(self):
+        with transaction.atomic():
+            Service.objects.create(nom="Annulé", prix=Decimal('1.00'))
+            self.assertEqual(len(objets_catalogue(Service)), 2)
+            transaction.set_rollback(True)
+        self.assertEqual(objets_catalogue(Service), [self.service])
+
+    def test_champ_choix_catalogue(self):
+        class ChoixForm(forms.Form):
+            service = ChoixCatalogueField(queryset=Service.objects.all(), empty_label="Aucun")
+
+        with versions_memorisees():
+            objets_catalogue(Service)
+            with CaptureQueriesContext(connection) as requetes:
+                self.assertEqual([libelle for _, libelle in ChoixForm().fields['service'].choices], ["Aucun", "Atelier"])
+                form = ChoixForm({'service': str(self.service.pk)})
+                self.assertTrue(form.is_valid())
+                self.assertEqual(form.cleaned_data['service'].prix, Decimal('300.00'))
+                self.assertIsNot(form.cleaned_data['service'], objet_catalogue(Service, self.service.pk))
+                self.assertFalse(ChoixForm({'service': '0'}).is_valid())
+            self.assertEqual(len(requetes), 0)
+
+    def test_champ_choix_catalogue_queryset_restreint(self):
+        """Un queryset restreint (services actifs) limite les choix proposés et acceptés."""
+        inactif = Service.objects.create(nom="Ancien atelier", prix=Decimal('100.00'), actif=False)
+
+        class ChoixForm(forms.Form):
+            service = ChoixCatalogueField(queryset=Service.objects.filter(actif=True), empty_label=None)
+
+        self.assertEqual([libelle for _, libelle in ChoixForm().fields['service'].choices], ["Atelier"])
+        self.assertTrue(ChoixForm({'service': str(self.service.pk)}).is_valid())
+        self.assertFalse(ChoixForm({'service': str(inactif.pk)}).is_valid())
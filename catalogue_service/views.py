@@ -4,12 +4,23 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from .models import Service, Categorie
 from .forms import ServiceForm, CategorieForm
 from .filters import ServiceFilter, CategorieFilter
+from .cache import version_catalogue
 from utils.permissions import est_administrateur
+from utils.export import ExportCSVMixin
+from utils.relations import RelationsMixin
+from utils.routage import LectureReplicaMixin
 
-class ServiceListView(LoginRequiredMixin, ListView):
+class ServiceListView(LoginRequiredMixin, LectureReplicaMixin, ExportCSVMixin, RelationsMixin, ListView):
     model = Service
     template_name = 'catalogue_service/service_list.html'
     context_object_name = 'services'
+    relations = ('categorie',)
+    max_queries = 6
+    export_colonnes = (
+        ('nom', 'Nom du service'), ('categorie__nom', 'Catégorie'), ('description', 'Description'),
+        ('prix', 'Prix'), ('type_tarif', 'Type de tarification'), ('actif', 'Actif'),
+        ('date_mise_a_jour', 'Date de mise à jour'),
+    )
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -20,50 +31,57 @@ class ServiceListView(LoginRequiredMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filter'] = self.filter
-        context['total_services'] = self.filter.qs.count()
         context['est_administrateur'] = est_administrateur(self.request.user)
+        # Le tableau est mis en cache par version du catalogue : la liste n'est lue qu'en cas d'absence.
+        context['version_catalogue'] = version_catalogue()
         return context
 
-class ServiceDetailView(LoginRequiredMixin, DetailView):
+class ServiceDetailView(LoginRequiredMixin, LectureReplicaMixin, RelationsMixin, DetailView):
     model = Service
     template_name = 'catalogue_service/service_detail.html'
     context_object_name = 'service'
+    relations = ('categorie',)
+    max_queries = 4
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['est_administrateur'] = est_administrateur(self.request.user)
         return context
 
-class ServiceCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
+class ServiceCreateView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, CreateView):
     model = Service
     form_class = ServiceForm
     template_name = 'catalogue_service/service_form.html'
     success_url = reverse_lazy('service_list')
+    max_queries = 4
 
     def test_func(self):
         return est_administrateur(self.request.user)
 
-class ServiceUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class ServiceUpdateView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, UpdateView):
     model = Service
     form_class = ServiceForm
     template_name = 'catalogue_service/service_form.html'
     success_url = reverse_lazy('service_list')
+    max_queries = 5
 
     def test_func(self):
         return est_administrateur(self.request.user)
 
-class ServiceDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class ServiceDeleteView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, DeleteView):
     model = Service
     template_name = 'catalogue_service/service_confirm_delete.html'
     success_url = reverse_lazy('service_list')
+    max_queries = 4
 
     def test_func(self):
         return est_administrateur(self.request.user)
 
-class CategorieListView(LoginRequiredMixin, ListView):
+class CategorieListView(LoginRequiredMixin, LectureReplicaMixin, RelationsMixin, ListView):
     model = Categorie
     template_name = 'catalogue_service/categorie_list.html'
     context_object_name = 'categories'
+    max_queries = 5
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -75,41 +93,45 @@ class CategorieListView(LoginRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
         context['filter'] = self.filterset
         context['est_administrateur'] = est_administrateur(self.request.user)
-        context['total_categories'] = self.filterset.qs.count()
+        context['version_catalogue'] = version_catalogue()
         return context
 
-class CategorieDetailView(LoginRequiredMixin, DetailView):
+class CategorieDetailView(LoginRequiredMixin, LectureReplicaMixin, RelationsMixin, DetailView):
     model = Categorie
     template_name = 'catalogue_service/categorie_detail.html'
     context_object_name = 'categorie'
+    max_queries = 4
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['est_administrateur'] = est_administrateur(self.request.user)
         return context
 
-class CategorieCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
+class CategorieCreateView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, CreateView):
     model = Categorie
     form_class = CategorieForm
     template_name = 'catalogue_service/categorie_form.html'
     success_url = reverse_lazy('categorie_list')
+    max_queries = 3
 
     def test_func(self):
         return est_administrateur(self.request.user)
 
-class CategorieUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class CategorieUpdateView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, UpdateView):
     model = Categorie
     form_class = CategorieForm
     template_name = 'catalogue_service/categorie_form.html'
     success_url = reverse_lazy('categorie_list')
+    max_queries = 4
 
     def test_func(self):
         return est_administrateur(self.request.user)
 
-class CategorieDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class CategorieDeleteView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, DeleteView):
     model = Categorie
     template_name = 'catalogue_service/categorie_confirm_delete.html'
     success_url = reverse_lazy('categorie_list')
+    max_queries = 4
 
     def test_func(self):
         return est_administrateur(self.request.user)
\ No newline at end of file
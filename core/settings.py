@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_filters',
     'catalogue_service',
     'gestion_commerciale',
@@ -51,18 +52,47 @@ AUTH_USER_MODEL = 'utilisateur.Utilisateur'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'utils.versions.VersionsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'utils.routage.PrimaireApresEcritureMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.locale.LocaleMiddleware',
+    'utils.instrumentation.InstrumentationMiddleware',
 ]
 
+# Mesure des requêtes HTTP (utils.instrumentation) : échantillonnage et seuils
+# réglables par environnement pour rester active en production. L'en-tête
+# Server-Timing (staff seulement) s'active avec INSTRUMENTATION_EN_TETE=1.
+INSTRUMENTATION = {
+    'TAUX_ECHANTILLONNAGE': float(os.environ.get('INSTRUMENTATION_TAUX', '0.01')),
+    'SEUIL_DUREE_MS': int(os.environ.get('INSTRUMENTATION_SEUIL_DUREE_MS', '500')),
+    'SEUIL_REQUETES_SQL': int(os.environ.get('INSTRUMENTATION_SEUIL_REQUETES', '30')),
+    'EN_TETE_SERVER_TIMING': os.environ.get('INSTRUMENTATION_EN_TETE', '0') == '1',
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'essentiel_crm.requetes': {
+            'handlers': ['console'],
+            'level': os.environ.get('INSTRUMENTATION_NIVEAU_JOURNAL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, avec chronométrage du rendu pour InstrumentationMiddleware.
+        'BACKEND': 'utils.instrumentation.DjangoTemplatesMesures',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,15 +113,99 @@ WSGI_APPLICATION = 'core.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': 'essentiel_crm_services.db',
-        'USER': 'postgres',
-        'PASSWORD': 'admin',
-        'HOST': '127.0.0.1',
-        'PORT': '5432',
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME', 'essentiel_crm_services.db'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', 'admin'),
+        'HOST': os.environ.get('DB_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Connexions persistantes : réutilisées d'une requête à l'autre pendant
+        # CONN_MAX_AGE secondes, et vérifiées avant réutilisation.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+# Pool de connexions psycopg 3 (DB_POOL=1) : remplace les connexions
+# persistantes, incompatibles avec lui. Taille et délais par environnement.
+if os.environ.get('DB_POOL', '').lower() in ('1', 'oui', 'true'):
+    from psycopg_pool import ConnectionPool
+
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX', '10')),
+        # Attente maximale d'une connexion libre avant erreur.
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+        # Connexions inactives au-delà de min_size fermées après ce délai.
+        'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', '300')),
+        # Une connexion coupée côté serveur n'est jamais remise à une requête.
+        'check': ConnectionPool.check_connection,
+    }
+
+
+# Réplicas en lecture (DB_REPLICAS=hote1,hote2:5433). Seules les vues de
+# lecture désignées les utilisent, et une session qui vient d'écrire reste sur
+# le primaire (utils.routage). En local, DB_REPLICA_NAME désigne une seconde
+# base qui tient lieu de réplica.
+REPLICAS_LECTURE = []
+for numero, adresse in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    hote, _, port = adresse.strip().partition(':')
+    alias = f'replica_{numero}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': hote,
+        'PORT': port or DATABASES['default']['PORT'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICAS_LECTURE.append(alias)
+
+DATABASE_ROUTERS = ['utils.routage.RoutageReplicas']
+DUREE_PRIMAIRE_APRES_ECRITURE = int(os.environ.get('DB_DUREE_PRIMAIRE_APRES_ECRITURE', '10'))
+
+# Âge (en jours depuis la clôture) au-delà duquel la commande archiver_opportunites
+# déplace une opportunité gagnée ou perdue vers la table des archives.
+ARCHIVAGE_OPPORTUNITES_JOURS = int(os.environ.get('ARCHIVAGE_OPPORTUNITES_JOURS', '730'))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Mémoire locale par défaut (un cache par processus). CACHE_BACKEND=fichier
+# partage le cache entre les processus du serveur sans service externe.
+# « template_fragments » (balise {% cache %}) est séparé du cache par défaut :
+# ses clés changent à chaque modification des objets affichés, les entrées
+# périmées ne sont plus lues et sont évincées sans chasser les autres.
+
+NOMBRE_FRAGMENTS_EN_CACHE = int(os.environ.get('CACHE_FRAGMENTS_MAX', '20000'))
+
+if os.environ.get('CACHE_BACKEND') == 'fichier':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+        },
+        'template_fragments': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')), 'fragments'),
+            'OPTIONS': {'MAX_ENTRIES': NOMBRE_FRAGMENTS_EN_CACHE},
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'essentiel-crm',
+        },
+        'template_fragments': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'essentiel-crm-fragments',
+            'OPTIONS': {'MAX_ENTRIES': NOMBRE_FRAGMENTS_EN_CACHE},
+        },
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,131 @@
+import json
+import unittest
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from catalogue_service.models import Service
+from utilisateur.models import Utilisateur
+from utils.routage import CLE_SESSION_PRIMAIRE, PrimaireApresEcritureMiddleware, RoutageReplicas, lecture_replica
+
+
+class SanteTest(TestCase):
+    def test_sonde_de_sante(self):
+        """La sonde répond sans authentification ; les métriques de connexion sont réservées au staff."""
+        response = self.client.get(reverse('sante'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['base_de_donnees'], 'ok')
+        self.assertNotIn('connexions', response.json())
+
+        staff = Utilisateur.objects.create_user(username='staff', password='password123', is_staff=True)
+        self.client.force_login(staff)
+        connexions = self.client.get(reverse('sante')).json()['connexions']
+        self.assertFalse(connexions['pool'])
+        self.assertIn('conn_max_age', connexions)
+
+
+# unittest.TestCase et non django.test.TestCase : le benchmark ouvre, depuis ses
+# threads, des connexions sous un alias temporaire que les tests Django interdisent.
+class BenchmarkConnexionsTest(unittest.TestCase):
+    def test_benchmark_connexions(self):
+        """Le benchmark mesure les trois modes de connexion et rapporte les compteurs du pool."""
+        sortie = StringIO()
+        call_command('benchmark_connexions', requetes=20, threads=2, taille_pool=2, stdout=sortie)
+        self.assertEqual(sortie.getvalue().count('req/s'), 3)
+        self.assertIn("'requests_num': 20", sortie.getvalue())
+
+
+@override_settings(REPLICAS_LECTURE=['replica_test'])
+class RoutageReplicasTest(SimpleTestCase):
+    def setUp(self):
+        self.routeur = RoutageReplicas()
+
+    def test_seules_les_lectures_designees_vont_sur_le_replica(self):
+        self.assertIsNone(self.routeur.db_for_read(Service))
+        with lecture_replica():
+            self.assertEqual(self.routeur.db_for_read(Service), 'replica_test')
+        self.assertEqual(self.routeur.db_for_write(Service), 'default')
+        self.assertFalse(self.routeur.allow_migrate('replica_test', 'catalogue_service'))
+
+    def test_session_collee_au_primaire_apres_ecriture(self):
+        """Une requête qui écrit relit le primaire, et la session y reste pour les requêtes suivantes."""
+        def vue(request):
+            with lecture_replica():
+                avant = self.routeur.db_for_read(Service)
+                if request.method == 'POST':
+                    self.routeur.db_for_write(Service)
+                apres = self.routeur.db_for_read(Service)
+            return HttpResponse(f'{avant},{apres}')
+
+        middleware = PrimaireApresEcritureMiddleware(vue)
+        session = {}
+        requete = RequestFactory().post('/')
+        requete.session = session
+        self.assertEqual(middleware(requete).content, b'replica_test,None')
+        self.assertIn(CLE_SESSION_PRIMAIRE, session)
+
+        requete = RequestFactory().get('/')
+        requete.session = session
+        self.assertEqual(middleware(requete).content, b'None,None')
+
+        requete = RequestFactory().get('/')
+        requete.session = {}
+        self.assertEqual(middleware(requete).content, b'replica_test,replica_test')
+
+
+@override_settings(INSTRUMENTATION={'TAUX_ECHANTILLONNAGE': 1.0, 'EN_TETE_SERVER_TIMING': True})
+class InstrumentationTest(TestCase):
+    def setUp(self):
+        self.admin = Utilisateur.objects.create_user(
+            username='admin', password='password123', is_superuser=True, is_staff=True,
+        )
+        self.client.force_login(self.admin)
+
+    def test_server_timing_et_journal(self):
+        """Chaque requête mesurée porte l'en-tête Server-Timing et produit une ligne JSON par nom d'URL."""
+        with self.assertLogs('essentiel_crm.requetes', 'INFO') as journal, \
+                CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('service_list'))
+        en_tete = response['Server-Timing']
+        for metrique in ('total;dur=', 'vue;dur=', 'sql;dur=', 'sql-max;dur=', 'gabarits;dur='):
+            self.assertIn(metrique, en_tete)
+
+        ligne = json.loads(journal.records[0].getMessage())
+        self.assertEqual(journal.records[0].levelname, 'INFO')
+        self.assertEqual(ligne['url'], 'service_list')
+        self.assertEqual(ligne['requetes_sql'], len(requetes))
+        self.assertIn(f'"{len(requetes)} requêtes SQL"', en_tete)
+        self.assertGreater(ligne['gabarits_ms'], 0)
+        self.assertGreater(ligne['vue_ms'], 0)
+        self.assertLessEqual(ligne['vue_ms'], ligne['duree_ms'])
+
+    def test_server_timing_reserve_au_staff(self):
+        """L'en-tête, qui révèle le détail des requêtes SQL, n'est envoyé qu'aux utilisateurs staff."""
+        commercial = Utilisateur.objects.create_user(username='commercial', password='password123')
+        self.client.force_login(commercial)
+        with self.assertLogs('essentiel_crm.requetes', 'INFO'):
+            response = self.client.get(reverse('service_list'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(INSTRUMENTATION={})
+    def test_en_tete_desactive_par_defaut(self):
+        """Par défaut, même une requête échantillonnée ne porte pas l'en-tête."""
+        with self.assertLogs('essentiel_crm.requetes', 'INFO'), \
+                mock.patch('utils.instrumentation.random.random', return_value=0.0):
+            response = self.client.get(reverse('service_list'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(INSTRUMENTATION={'TAUX_ECHANTILLONNAGE': 1.0, 'SEUIL_REQUETES_SQL': 0})
+    def test_seuil_depasse(self):
+        with self.assertLogs('essentiel_crm.requetes', 'WARNING'):
+            self.client.get(reverse('service_list'))
+
+    @override_settings(INSTRUMENTATION={'TAUX_ECHANTILLONNAGE': 0})
+    def test_requete_non_echantillonnee(self):
+        response = self.client.get(reverse('service_list'))
+        self.assertNotIn('Server-Timing', response)
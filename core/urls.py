@@ -16,9 +16,11 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from .views import sante_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('sante/', sante_view, name='sante'),
     path('comptes/', include('utilisateur.urls')),
     path('', include('tableau_de_bord.urls')),
     path('catalogue/', include('catalogue_service.urls')),
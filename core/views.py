@@ -0,0 +1,33 @@
+import time
+
+from django.db import DatabaseError, connection
+from django.http import JsonResponse
+
+
+def statistiques_connexions():
+    """Réglages de connexion et, si le pool est actif, ses compteurs (psycopg_pool.ConnectionPool.get_stats)."""
+    pool = connection.pool
+    if pool is None:
+        return {'pool': False, 'conn_max_age': connection.settings_dict['CONN_MAX_AGE']}
+    return {'pool': True, **pool.get_stats()}
+
+
+def sante_view(request):
+    """
+    Sonde de santé pour le répartiteur de charge : 200 si la base répond, 503
+    sinon. Les membres du staff reçoivent en plus les métriques de connexion.
+    """
+    debut = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        statut, code = 'ok', 200
+    except DatabaseError:
+        statut, code = 'indisponible', 503
+    donnees = {
+        'base_de_donnees': statut,
+        'duree_ms': round((time.perf_counter() - debut) * 1000, 2),
+    }
+    if request.user.is_staff:
+        donnees['connexions'] = statistiques_connexions()
+    return JsonResponse(donnees, status=code)
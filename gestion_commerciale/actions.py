@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.utils import timezone
+from .models import STATUTS_CLOS, Opportunite, recalculer_types_clients
+from .signals import opportunites_avant_maj_groupee, opportunites_maj_groupee
+
+TAILLE_LOT_ACTIONS = 5000
+
+
+def modifier_opportunites(queryset, **valeurs):
+    """
+    Applique ``valeurs`` (statut et/ou responsable) aux opportunités de
+    ``queryset`` par UPDATE, lot par lot, dans une seule transaction. Les
+    save() par ligne sont remplacés par des traitements ensemblistes : types
+    des clients recalculés par lot, agrégats et caches mis à jour via les
+    signaux opportunites_(avant_)maj_groupee. Renvoie le nombre de lignes modifiées.
+    """
+    # Les clés sont figées avant l'UPDATE : le filtre d'origine peut ne plus correspondre après.
+    ids = list(queryset.exclude(**valeurs).order_by().values_list('pk', flat=True))
+    modifiees = 0
+    with transaction.atomic():
+        for debut in range(0, len(ids), TAILLE_LOT_ACTIONS):
+            lot = Opportunite.objects.filter(pk__in=ids[debut:debut + TAILLE_LOT_ACTIONS])
+            maintenant = timezone.now()
+            opportunites_avant_maj_groupee.send(sender=Opportunite, queryset=lot, valeurs=valeurs, date=maintenant)
+            modifiees += lot.update(**valeurs, **_cloture(valeurs, maintenant), date_mise_a_jour=maintenant)
+            opportunites_maj_groupee.send(sender=Opportunite, queryset=lot, valeurs=valeurs, date=maintenant)
+            if 'statut' in valeurs:
+                recalculer_types_clients(
+                    particuliers=lot.values('client_particulier'),
+                    entreprises=lot.values('client_entreprise'),
+                )
+    return modifiees
+
+
+def _cloture(valeurs, maintenant):
+    """date_cloture à poser avec un changement de statut, comme Opportunite.save()."""
+    if 'statut' not in valeurs:
+        return {}
+    if valeurs['statut'] not in STATUTS_CLOS:
+        return {'date_cloture': None}
+    # Les lignes déjà à ce statut (réaffectées seulement) gardent leur date.
+    return {'date_cloture': Case(
+        When(statut=valeurs['statut'], then=F('date_cloture')),
+        default=Value(maintenant, output_field=DateTimeField()),
+    )}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Particulier, Entreprise, Opportunite
+from .models import Particulier, Entreprise, Opportunite, OpportuniteArchivee, DoublonPotentiel
 
 @admin.register(Particulier)
 class ParticulierAdmin(admin.ModelAdmin):
@@ -20,4 +20,17 @@ class OpportuniteAdmin(admin.ModelAdmin):
     list_filter = ('statut', 'responsable', 'date_creation', 'date_mise_a_jour')
     search_fields = ('nom', 'description')
     date_hierarchy = 'date_creation'
-    raw_id_fields = ('responsable', 'client_particulier', 'client_entreprise', 'service')
\ No newline at end of file
+    raw_id_fields = ('responsable', 'client_particulier', 'client_entreprise', 'service')
+
+@admin.register(OpportuniteArchivee)
+class OpportuniteArchiveeAdmin(admin.ModelAdmin):
+    list_display = ('nom', 'statut', 'responsable', 'date_cloture', 'date_archivage')
+    list_filter = ('statut', 'date_archivage')
+    search_fields = ('nom', 'description')
+    raw_id_fields = ('responsable', 'client_particulier', 'client_entreprise', 'service')
+
+@admin.register(DoublonPotentiel)
+class DoublonPotentielAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'score', 'statut', 'date_detection', 'examine_par')
+    list_filter = ('statut', 'date_detection')
+    raw_id_fields = ('particulier_a', 'particulier_b', 'entreprise_a', 'entreprise_b', 'examine_par')
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import STATUTS_CLOS, Opportunite, OpportuniteArchivee
+from .signals import opportunites_archivees
+
+# Opportunités déplacées par transaction : chaque lot ne verrouille que ses propres lignes, brièvement.
+TAILLE_LOT_ARCHIVAGE = 5000
+
+
+def _colonnes():
+    """Colonnes communes aux deux tables (la colonne de recherche est générée de part et d'autre)."""
+    return [
+        connection.ops.quote_name(champ.column) for champ in OpportuniteArchivee._meta.concrete_fields
+        if not champ.generated and champ.name != 'date_archivage'
+    ]
+
+
+def archiver(age_jours=None, taille_lot=TAILLE_LOT_ARCHIVAGE):
+    """
+    Déplace vers OpportuniteArchivee les opportunités gagnées ou perdues
+    clôturées depuis plus de ``age_jours`` (par défaut
+    settings.ARCHIVAGE_OPPORTUNITES_JOURS), les plus anciennes d'abord. Par
+    lots : une requête (DELETE ... RETURNING puis INSERT) et une transaction
+    courte par lot ; une ligne verrouillée par ailleurs est laissée à un
+    passage suivant (SKIP LOCKED). Aucun signal par ligne : les agrégats, les
+    cumuls et l'historique des statuts gardent la contribution des lignes
+    archivées. Renvoie le nombre d'opportunités archivées.
+    """
+    if age_jours is None:
+        age_jours = settings.ARCHIVAGE_OPPORTUNITES_JOURS
+    maintenant = timezone.now()
+    quote = connection.ops.quote_name
+    opportunites = quote(Opportunite._meta.db_table)
+    colonnes = _colonnes()
+    params = {
+        'limite': maintenant - timedelta(days=age_jours), 'clos': list(STATUTS_CLOS),
+        'taille_lot': taille_lot, 'maintenant': maintenant,
+    }
+    archivees = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH lot AS (
+                    SELECT id FROM {opportunites}
+                    WHERE date_cloture < %(limite)s AND statut = ANY(%(clos)s)
+                    ORDER BY date_cloture
+                    LIMIT %(taille_lot)s
+                    FOR UPDATE SKIP LOCKED
+                ),
+                deplacees AS (
+                    DELETE FROM {opportunites} o USING lot WHERE o.id = lot.id
+                    RETURNING {', '.join(f'o.{colonne}' for colonne in colonnes)}
+                )
+                INSERT INTO {quote(OpportuniteArchivee._meta.db_table)} ({', '.join(colonnes)}, date_archivage)
+                SELECT {', '.join(colonnes)}, %(maintenant)s FROM deplacees
+                """,
+                params,
+            )
+            nombre = cursor.rowcount
+            if nombre:
+                opportunites_archivees.send(sender=Opportunite, nombre=nombre)
+        archivees += nombre
+        if nombre < taille_lot:
+            return archivees
@@ -0,0 +1,172 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import DoublonPotentiel, Entreprise, Particulier, STATUT_ENTREPRISE_CHOICES
+
+# Score minimal (0 à 1) d'une paire pour entrer dans la file d'examen.
+SEUIL_DOUBLON = 0.6
+
+# Les blocs plus grands (nom très courant dans une grande ville...) sont ignorés :
+# ils coûteraient un nombre quadratique de comparaisons pour peu de vrais doublons.
+TAILLE_BLOC_MAX = 100
+
+# Domaines de messagerie partagés : ils ne désignent pas une entreprise.
+DOMAINES_MESSAGERIE = [
+    'gmail.com', 'googlemail.com', 'yahoo.com', 'yahoo.fr', 'hotmail.com', 'hotmail.fr', 'outlook.com',
+    'outlook.fr', 'live.com', 'live.fr', 'msn.com', 'icloud.com', 'gmx.fr', 'laposte.net', 'orange.fr',
+    'free.fr', 'menara.ma', 'example.com',
+]
+
+# Mots retirés des raisons sociales avant comparaison (« Sté X SARL » et « X SARL » deviennent « x »).
+FORMES_JURIDIQUES = sorted(
+    {forme.lower() for forme, _ in STATUT_ENTREPRISE_CHOICES if ' ' not in forme and '-' not in forme}
+    | {'sarlau', 'ste', 'societe', 'ets', 'etablissements', 'cie', 'compagnie', 'groupe', 'group', 'et'}
+)
+
+
+def _normaliser(expression):
+    """Texte sans accents, en minuscules, réduit aux lettres et chiffres séparés par une espace."""
+    return rf"trim(regexp_replace(lower(unaccent({expression})), '[^a-z0-9]+', ' ', 'g'))"
+
+
+def _telephone(expression):
+    # Les neuf derniers chiffres : le même numéro saisi avec un autre indicatif.
+    return rf"right(regexp_replace({expression}, '\D', '', 'g'), 9)"
+
+
+PARTICULIERS = {
+    'modele': Particulier,
+    'colonnes': ('particulier_a_id', 'particulier_b_id'),
+    'normalises': f"""
+        SELECT p.id,
+               {_telephone('p.telephone')} AS telephone,
+               regexp_replace(split_part(lower(p.email), '@', 1), '\\+.*$|\\.', '', 'g')
+                   || '@' || split_part(lower(p.email), '@', 2) AS email,
+               split_part(lower(p.email), '@', 2) AS domaine,
+               {_normaliser('p.nom')} AS nom,
+               {_normaliser("p.prenom || ' ' || p.nom")} AS nom_complet,
+               {_normaliser('p.ville')} AS ville,
+               p.date_de_naissance AS naissance
+        FROM {{table}} p
+    """,
+    'cles': """
+        SELECT id, 'telephone' AS motif, telephone AS cle FROM normalises WHERE length(telephone) = 9
+        UNION ALL SELECT id, 'email', email FROM normalises
+        UNION ALL SELECT id, 'domaine_nom', domaine || '|' || nom FROM normalises WHERE nom <> ''
+        UNION ALL SELECT id, 'ville_nom', ville || '|' || nom FROM normalises WHERE nom <> ''
+    """,
+    'score': """
+        0.4 * similarity(x.nom_complet, y.nom_complet)
+        + 0.3 * (x.telephone = y.telephone)::int
+        + 0.3 * (x.email = y.email)::int
+        + 0.2 * (x.naissance = y.naissance)::int
+        + 0.1 * (x.ville = y.ville)::int
+    """,
+}
+
+ENTREPRISES = {
+    'modele': Entreprise,
+    'colonnes': ('entreprise_a_id', 'entreprise_b_id'),
+    'normalises': f"""
+        SELECT n.*,
+               regexp_replace(n.nom, '[^0-9]', '', 'g') AS chiffres,
+               (SELECT string_agg(left(mot, 3), ' ' ORDER BY rang)
+                FROM unnest(string_to_array(n.nom, ' ')) WITH ORDINALITY AS m(mot, rang)) AS trigrammes
+        FROM (
+            SELECT e.id,
+                   {_telephone('e.telephone')} AS telephone,
+                   CASE WHEN split_part(lower(e.email), '@', 2) = ANY(%(messageries)s) THEN NULL
+                        ELSE split_part(lower(e.email), '@', 2) END AS domaine,
+                   substring(lower(e.website) FROM '^(?:[a-z]+://)?(?:www\\.)?([^/:?#]+)') AS site,
+                   trim(regexp_replace(
+                       regexp_replace({_normaliser('e.nom_entreprise')}, %(formes)s, ' ', 'g'),
+                       ' +', ' ', 'g'
+                   )) AS nom,
+                   {_normaliser('e.ville')} AS ville
+            FROM {{table}} e
+        ) AS n
+    """,
+    'cles': """
+        SELECT id, 'telephone' AS motif, telephone AS cle FROM normalises WHERE length(telephone) = 9
+        UNION ALL SELECT id, 'domaine', domaine FROM normalises WHERE domaine IS NOT NULL
+        UNION ALL SELECT id, 'domaine', site FROM normalises WHERE site IS NOT NULL
+        UNION ALL SELECT id, 'nom', nom FROM normalises WHERE nom <> ''
+        UNION ALL SELECT id, 'trigrammes', trigrammes FROM normalises WHERE strpos(nom, ' ') > 0
+    """,
+    'score': """
+        -- Des numéros différents (« Agence 2 », « Agence 3 ») désignent d'ordinaire des entités distinctes.
+        0.6 * similarity(x.nom, y.nom) * CASE WHEN x.chiffres = y.chiffres THEN 1 ELSE 0.5 END
+        + 0.3 * (x.telephone = y.telephone)::int
+        + 0.2 * coalesce(x.domaine IN (y.domaine, y.site) OR x.site IN (y.domaine, y.site), false)::int
+        + 0.1 * (x.ville = y.ville)::int
+    """,
+}
+
+
+def _detecter(definition, seuil, taille_bloc, maintenant):
+    """
+    Une requête : normalisation de chaque fiche, clés de regroupement, paires
+    formées à l'intérieur de chaque bloc (jamais de comparaison de toutes les
+    fiches deux à deux), score, puis ajout à la file. Une paire ignorée n'y
+    revient pas (une paire fusionnée disparaît avec la fiche absorbée) ; une
+    paire en attente est mise à jour.
+    """
+    quote = connection.ops.quote_name
+    table = quote(definition['modele']._meta.db_table)
+    colonne_a, colonne_b = (quote(colonne) for colonne in definition['colonnes'])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH normalises AS MATERIALIZED ({definition['normalises'].format(table=table)}),
+            cles AS ({definition['cles']}),
+            blocs AS (
+                SELECT motif, array_agg(id) AS ids FROM cles
+                GROUP BY motif, cle HAVING count(*) BETWEEN 2 AND %(taille_bloc)s
+            ),
+            paires AS (
+                SELECT a, b, array_agg(DISTINCT motif ORDER BY motif) AS motifs
+                FROM blocs, unnest(ids) AS a, unnest(ids) AS b
+                WHERE a < b
+                GROUP BY a, b
+            ),
+            scores AS (
+                SELECT p.a, p.b, p.motifs, LEAST(1, {definition['score']}) AS score
+                FROM paires p
+                JOIN normalises x ON x.id = p.a
+                JOIN normalises y ON y.id = p.b
+            )
+            INSERT INTO {quote(DoublonPotentiel._meta.db_table)} AS d
+                ({colonne_a}, {colonne_b}, score, motifs, statut, date_detection)
+            SELECT a, b, round(score::numeric, 3), motifs, 'a_examiner', %(maintenant)s
+            FROM scores WHERE score >= %(seuil)s
+            ON CONFLICT ({colonne_a}, {colonne_b}) DO UPDATE
+            SET score = EXCLUDED.score, motifs = EXCLUDED.motifs, date_detection = EXCLUDED.date_detection
+            WHERE d.statut = 'a_examiner'
+            """,
+            {
+                'taille_bloc': taille_bloc, 'seuil': seuil, 'maintenant': maintenant,
+                'messageries': DOMAINES_MESSAGERIE, 'formes': rf"\m({'|'.join(FORMES_JURIDIQUES)})\M",
+            },
+        )
+        return cursor.rowcount
+
+
+def detecter_doublons(modeles=(Particulier, Entreprise), seuil=SEUIL_DOUBLON, taille_bloc=TAILLE_BLOC_MAX):
+    """
+    Cherche les doublons probables parmi les particuliers et/ou les entreprises
+    et les ajoute à la file d'examen (DoublonPotentiel). Renvoie, par modèle,
+    le nombre de paires ajoutées ou mises à jour.
+    """
+    maintenant = timezone.now()
+    resultats = {}
+    for definition in (PARTICULIERS, ENTREPRISES):
+        if definition['modele'] in modeles:
+            with transaction.atomic():
+                resultats[definition['modele']] = _detecter(definition, seuil, taille_bloc, maintenant)
+    return resultats
+
+
+def ignorer(doublons, utilisateur):
+    """Écarte de la file les paires de ``doublons`` (QuerySet) : elles ne seront plus proposées."""
+    return doublons.filter(statut='a_examiner').update(
+        statut='ignore', examine_par=utilisateur, date_examen=timezone.now(),
+    )
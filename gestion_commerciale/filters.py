@@ -3,7 +3,9 @@ from django import forms
 from .models import Particulier, Entreprise, Opportunite
 from django.contrib.auth import get_user_model
 from utils.permissions import est_manager_ou_plus
+from catalogue_service.filters import ChoixCatalogueFilter
 from catalogue_service.models import Service
+from .widgets import AutocompleteSelect
 
 User = get_user_model()
 
@@ -14,13 +16,13 @@ class ResponsableFilter(django_filters.ModelChoiceFilter):
 class ParticulierFilter(django_filters.FilterSet):
     nom = django_filters.CharFilter(
         field_name='nom',
-        lookup_expr='icontains',
+        lookup_expr='contient',
         label='Nom du Particulier',
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Rechercher par nom'})
     )
     prenom = django_filters.CharFilter(
         field_name='prenom',
-        lookup_expr='icontains',
+        lookup_expr='contient',
         label='Prénom du Particulier',
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Rechercher par prénom'})
     )
@@ -42,7 +44,7 @@ class ParticulierFilter(django_filters.FilterSet):
         queryset=User.objects.all(),
         empty_label='Tous les responsables',
         label='Responsable',
-        widget=forms.Select(attrs={'class': 'form-select'})
+        widget=AutocompleteSelect('responsables', attrs={'class': 'form-select'})
     )
     date_creation = django_filters.DateFromToRangeFilter(
         field_name='date_creation',
@@ -72,13 +74,13 @@ class ParticulierFilter(django_filters.FilterSet):
 class EntrepriseFilter(django_filters.FilterSet):
     nom_entreprise = django_filters.CharFilter(
         field_name='nom_entreprise',
-        lookup_expr='icontains',
+        lookup_expr='contient',
         label='Nom de l\'Entreprise',
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Rechercher par nom'})
     )
     ice = django_filters.CharFilter(
         field_name='ice',
-        lookup_expr='icontains',
+        lookup_expr='contains',
         label='ICE',
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Rechercher par ICE'})
     )
@@ -114,7 +116,7 @@ class EntrepriseFilter(django_filters.FilterSet):
         queryset=User.objects.all(),
         empty_label='Tous les responsables',
         label='Responsable',
-        widget=forms.Select(attrs={'class': 'form-select'})
+        widget=AutocompleteSelect('responsables', attrs={'class': 'form-select'})
     )
     date_creation = django_filters.DateFromToRangeFilter(
         field_name='date_creation',
@@ -145,7 +147,7 @@ class EntrepriseFilter(django_filters.FilterSet):
 class OpportuniteFilter(django_filters.FilterSet):
     nom = django_filters.CharFilter(
         field_name='nom',
-        lookup_expr='icontains',
+        lookup_expr='contient',
         label='Nom de l\'opportunité',
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Rechercher par nom'})
     )
@@ -160,21 +162,21 @@ class OpportuniteFilter(django_filters.FilterSet):
         queryset=User.objects.all(),
         empty_label='Tous les responsables',
         label='Responsable',
-        widget=forms.Select(attrs={'class': 'form-select'})
+        widget=AutocompleteSelect('responsables', attrs={'class': 'form-select'})
     )
     client_particulier = django_filters.ModelChoiceFilter(
         queryset=Particulier.objects.all(),
         label='Client Particulier',
         empty_label='Tous les particuliers',
-        widget=forms.Select(attrs={'class': 'form-select'})
+        widget=AutocompleteSelect('particuliers', attrs={'class': 'form-select'})
     )
     client_entreprise = django_filters.ModelChoiceFilter(
         queryset=Entreprise.objects.all(),
         label='Client Entreprise',
         empty_label='Toutes les entreprises',
-        widget=forms.Select(attrs={'class': 'form-select'})
+        widget=AutocompleteSelect('entreprises', attrs={'class': 'form-select'})
     )
-    service = django_filters.ModelChoiceFilter(
+    service = ChoixCatalogueFilter(
         queryset=Service.objects.all(),
         label='Service',
         empty_label='Tous les services',
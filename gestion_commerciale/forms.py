@@ -1,6 +1,8 @@
 from django import forms
-from .models import Particulier, Entreprise, Opportunite, STATUT_ENTREPRISE_CHOICES, SECTEUR_ACTIVITE_CHOICES, CIVILITE_CHOICES, STATUT_OPPORTUNITE_CHOICES, PRIORITE_CHOICES
+from .models import User, Particulier, Entreprise, Opportunite, DoublonPotentiel, STATUT_ENTREPRISE_CHOICES, SECTEUR_ACTIVITE_CHOICES, CIVILITE_CHOICES, STATUT_OPPORTUNITE_CHOICES, PRIORITE_CHOICES
 from utils.permissions import est_manager_ou_plus
+from catalogue_service.fields import ChoixCatalogueField
+from .widgets import AutocompleteSelect
 
 class ParticulierForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
@@ -61,7 +63,7 @@ class EntrepriseForm(forms.ModelForm):
             'ville': forms.TextInput(attrs={'class': 'form-control'}),
             'code_postal': forms.TextInput(attrs={'class': 'form-control'}),
             'pays': forms.TextInput(attrs={'class': 'form-control'}),
-            'contact_principal': forms.Select(attrs={'class': 'form-select'}),
+            'contact_principal': AutocompleteSelect('particuliers', attrs={'class': 'form-select'}),
             'nombre_employes': forms.Select(attrs={'class': 'form-select'}),
             'source': forms.Select(attrs={'class': 'form-select'}),
             'notes_supplementaires': forms.Textarea(attrs={'class': 'form-control'}),
@@ -97,12 +99,13 @@ class OpportuniteForm(forms.ModelForm):
     class Meta:
         model = Opportunite
         fields = ['nom', 'description', 'statut', 'client_particulier', 'client_entreprise', 'service']
+        field_classes = {'service': ChoixCatalogueField}
         widgets = {
             'nom': forms.TextInput(attrs={'class': 'form-control'}),
             'description': forms.Textarea(attrs={'class': 'form-control'}),
             'statut': forms.Select(attrs={'class': 'form-select'}),
-            'client_particulier': forms.Select(attrs={'class': 'form-select'}),
-            'client_entreprise': forms.Select(attrs={'class': 'form-select'}),
+            'client_particulier': AutocompleteSelect('particuliers', attrs={'class': 'form-select'}),
+            'client_entreprise': AutocompleteSelect('entreprises', attrs={'class': 'form-select'}),
             'service': forms.Select(attrs={'class': 'form-select'}),
         }
         labels = {
@@ -126,4 +129,75 @@ class OpportuniteForm(forms.ModelForm):
             raise forms.ValidationError(
                 "Vous ne pouvez pas associer l'opportunité à la fois à un particulier et à une entreprise.")
 
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+
+class ImportClientsForm(forms.Form):
+    type_client = forms.ChoiceField(
+        label="Type de clients",
+        choices=[('particuliers', 'Particuliers'), ('entreprises', 'Entreprises')],
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    fichier = forms.FileField(
+        label="Fichier CSV ou XLSX",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
+
+
+class ActionGroupeeForm(forms.Form):
+    opportunites = forms.ModelMultipleChoiceField(queryset=Opportunite.objects.all(), required=False)
+    tout_selectionner = forms.BooleanField(
+        label="Appliquer à toutes les opportunités filtrées",
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+    statut = forms.ChoiceField(
+        label="Nouveau statut",
+        choices=[('', 'Statut inchangé')] + STATUT_OPPORTUNITE_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    responsable = forms.ModelChoiceField(
+        label="Nouveau responsable",
+        queryset=User.objects.all(),
+        required=False,
+        empty_label='Responsable inchangé',
+        widget=AutocompleteSelect('responsables', attrs={'class': 'form-select'}),
+    )
+
+    def __init__(self, *args, **kwargs):
+        self.request = kwargs.pop('request', None)
+        super().__init__(*args, **kwargs)
+
+        # La réaffectation est réservée aux managers, comme le choix du responsable dans les filtres.
+        if self.request and not est_manager_ou_plus(self.request.user):
+            del self.fields['responsable']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('opportunites') and not cleaned_data.get('tout_selectionner'):
+            raise forms.ValidationError("Sélectionnez au moins une opportunité.")
+        if not self.valeurs():
+            raise forms.ValidationError("Choisissez un nouveau statut ou un nouveau responsable.")
+        return cleaned_data
+
+    def valeurs(self):
+        """Champs à modifier, prêts pour modifier_opportunites()."""
+        valeurs = {}
+        if self.cleaned_data.get('statut'):
+            valeurs['statut'] = self.cleaned_data['statut']
+        if self.cleaned_data.get('responsable'):
+            valeurs['responsable'] = self.cleaned_data['responsable']
+        return valeurs
+
+
+class ExamenDoublonsForm(forms.Form):
+    doublons = forms.ModelMultipleChoiceField(queryset=DoublonPotentiel.objects.filter(statut='a_examiner'))
+    action = forms.ChoiceField(
+        choices=[
+            ('fusionner_a', 'Fusionner en conservant la fiche A'),
+            ('fusionner_b', 'Fusionner en conservant la fiche B'),
+            ('ignorer', 'Ignorer (ce ne sont pas des doublons)'),
+        ],
+        widget=forms.Select(attrs={'class': 'form-select w-auto'}),
+    )
@@ -0,0 +1,197 @@
+from django.db import connection, models, transaction
+from django.utils import timezone
+from .models import DoublonPotentiel, Entreprise, Particulier, recalculer_types_clients
+from .signals import clients_fusionnes
+
+# Fiches absorbées par transaction : les verrous ne portent que sur un lot à la fois.
+TAILLE_LOT_FUSION = 1000
+
+# Champs de doublon désignant une fiche de chaque modèle.
+COLONNES_DOUBLON = {
+    Particulier: ('particulier_a_id', 'particulier_b_id'),
+    Entreprise: ('entreprise_a_id', 'entreprise_b_id'),
+}
+
+
+def resoudre(paires):
+    """
+    Correspondance {absorbée: conservée} des couples (conservée, absorbée) de
+    ``paires``, chaînes résolues : avec (1, 2) puis (2, 3), la fiche 3 va à 1.
+    Un couple dont les deux fiches ont déjà la même destination est ignoré.
+    """
+    parent = {}
+
+    def racine(pk):
+        while pk in parent:
+            pk = parent[pk]
+        return pk
+
+    for conservee, absorbee in paires:
+        conservee, absorbee = racine(conservee), racine(absorbee)
+        if conservee != absorbee:
+            parent[absorbee] = conservee
+    return {pk: racine(pk) for pk in parent}
+
+
+def _lots(correspondance, taille_lot):
+    """Découpe la correspondance en lots, sans séparer les fiches absorbées par une même fiche."""
+    groupes = {}
+    for absorbee, conservee in correspondance.items():
+        groupes.setdefault(conservee, []).append(absorbee)
+    lot = {}
+    for conservee, absorbees in groupes.items():
+        lot.update(dict.fromkeys(absorbees, conservee))
+        if len(lot) >= taille_lot:
+            yield lot
+            lot = {}
+    if lot:
+        yield lot
+
+
+def _champs_a_completer(modele):
+    """Champs facultatifs (ni clé, ni unique, ni généré) que la fiche conservée reprend s'ils lui manquent."""
+    return [
+        champ for champ in modele._meta.concrete_fields
+        if (champ.blank or champ.null) and not (champ.primary_key or champ.unique or champ.generated)
+        and not getattr(champ, 'auto_now', False) and not getattr(champ, 'auto_now_add', False)
+    ]
+
+
+def _completer(cursor, modele, maintenant):
+    """
+    Reprend sur chaque fiche conservée les champs vides qu'une fiche absorbée
+    renseigne ; les notes sont mises bout à bout. Une seule requête UPDATE.
+    """
+    quote = connection.ops.quote_name
+    affectations, agregats = [], []
+    for champ in _champs_a_completer(modele):
+        colonne = quote(champ.column)
+        texte = isinstance(champ, (models.CharField, models.TextField))
+        if isinstance(champ, models.TextField):
+            affectations.append(f"{colonne} = concat_ws(E'\\n\\n', NULLIF(c.{colonne}, ''), s.{colonne})")
+            agregats.append(f"string_agg(NULLIF(a.{colonne}, ''), E'\\n\\n' ORDER BY a.id) AS {colonne}")
+        elif texte:
+            affectations.append(f"{colonne} = COALESCE(NULLIF(c.{colonne}, ''), s.{colonne}, c.{colonne})")
+            agregats.append(f"max(NULLIF(a.{colonne}, '')) AS {colonne}")
+        else:
+            affectations.append(f"{colonne} = COALESCE(c.{colonne}, s.{colonne})")
+            agregats.append(f"max(a.{colonne}) AS {colonne}")
+    table = quote(modele._meta.db_table)
+    cursor.execute(
+        f"""
+        UPDATE {table} AS c SET {', '.join(affectations)}, date_mise_a_jour = %s
+        FROM (
+            SELECT f.conservee, {', '.join(agregats)}
+            FROM fusion_clients f JOIN {table} a ON a.id = f.absorbee
+            GROUP BY f.conservee
+        ) AS s
+        WHERE c.id = s.conservee
+        """,
+        [maintenant],
+    )
+
+
+def _rattacher(cursor, modele, maintenant):
+    """
+    Reporte sur les fiches conservées toutes les clés étrangères vers les
+    fiches absorbées (opportunités, contact principal...), une requête UPDATE
+    par relation. La file des doublons est traitée à part.
+    """
+    quote = connection.ops.quote_name
+    for relation in modele._meta.related_objects:
+        if relation.related_model is DoublonPotentiel or not relation.field.concrete:
+            continue
+        colonne = quote(relation.field.column)
+        affectations = [f'{colonne} = f.conservee']
+        params = []
+        if any(champ.name == 'date_mise_a_jour' for champ in relation.related_model._meta.concrete_fields):
+            # update() ne passe pas par auto_now : date_mise_a_jour est posée ici (clés des fragments de liste).
+            affectations.append('date_mise_a_jour = %s')
+            params.append(maintenant)
+        cursor.execute(
+            f"""
+            UPDATE {quote(relation.related_model._meta.db_table)} AS r SET {', '.join(affectations)}
+            FROM fusion_clients f WHERE r.{colonne} = f.absorbee
+            """,
+            params,
+        )
+
+
+def _fusionner_lot(modele, correspondance, maintenant):
+    quote = connection.ops.quote_name
+    table = quote(modele._meta.db_table)
+    colonne_a, colonne_b = (quote(colonne) for colonne in COLONNES_DOUBLON[modele])
+    with transaction.atomic():
+        # Verrou des fiches du lot : une fiche modifiée ou supprimée entre-temps n'est pas perdue.
+        existantes = set(
+            modele.objects.select_for_update().order_by()
+            .filter(pk__in=[*correspondance, *correspondance.values()]).values_list('pk', flat=True)
+        )
+        correspondance = {
+            absorbee: conservee for absorbee, conservee in correspondance.items()
+            if absorbee in existantes and conservee in existantes
+        }
+        if not correspondance:
+            return 0
+        absorbees = list(correspondance)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                CREATE TEMPORARY TABLE fusion_clients (absorbee bigint PRIMARY KEY, conservee bigint NOT NULL)
+                """
+            )
+            cursor.execute(
+                'INSERT INTO fusion_clients SELECT * FROM unnest(%s::bigint[], %s::bigint[])',
+                [absorbees, list(correspondance.values())],
+            )
+            cursor.execute('ANALYZE fusion_clients')
+            _completer(cursor, modele, maintenant)
+            _rattacher(cursor, modele, maintenant)
+            # Paires en file touchant une fiche absorbée : examinées (la paire fusionnée) ou devenues caduques.
+            cursor.execute(
+                f"""
+                DELETE FROM {quote(DoublonPotentiel._meta.db_table)}
+                WHERE {colonne_a} = ANY(%(absorbees)s) OR {colonne_b} = ANY(%(absorbees)s)
+                """,
+                {'absorbees': absorbees},
+            )
+            cursor.execute(f'DELETE FROM {table} WHERE id = ANY(%s)', [absorbees])
+            cursor.execute('DROP TABLE fusion_clients')
+        parametre = 'particuliers' if modele is Particulier else 'entreprises'
+        recalculer_types_clients(**{parametre: set(correspondance.values())})
+        clients_fusionnes.send(sender=modele, nombre=len(absorbees))
+    return len(absorbees)
+
+
+def fusionner(modele, paires, taille_lot=TAILLE_LOT_FUSION):
+    """
+    Fusionne des fiches ``modele`` (Particulier ou Entreprise) : pour chaque
+    couple (conservée, absorbée) de ``paires``, les opportunités et autres
+    références de la fiche absorbée passent à la fiche conservée, qui reprend
+    ses champs vides, puis la fiche absorbée est supprimée et le type de
+    relation (client / prospect) recalculé. Requêtes ensemblistes par lots de
+    ``taille_lot`` fiches absorbées, une transaction par lot, quel que soit le
+    nombre de références. Renvoie le nombre de fiches absorbées.
+    """
+    maintenant = timezone.now()
+    return sum(
+        _fusionner_lot(modele, lot, maintenant)
+        for lot in _lots(resoudre(paires), taille_lot)
+    )
+
+
+def fusionner_doublons(doublons, conserver='a', taille_lot=TAILLE_LOT_FUSION):
+    """
+    Fusionne les paires en attente de ``doublons`` (QuerySet de DoublonPotentiel)
+    en conservant la fiche A (la plus ancienne) ou B. Renvoie le nombre de
+    fiches absorbées.
+    """
+    paires = {Particulier: [], Entreprise: []}
+    for particulier_a, particulier_b, entreprise_a, entreprise_b in doublons.filter(statut='a_examiner').values_list(
+        'particulier_a_id', 'particulier_b_id', 'entreprise_a_id', 'entreprise_b_id',
+    ).order_by('-score', '-id'):
+        modele, a, b = (
+            (Particulier, particulier_a, particulier_b) if particulier_a else (Entreprise, entreprise_a, entreprise_b)
+        )
+        paires[modele].append((a, b) if conserver == 'a' else (b, a))
+    return sum(fusionner(modele, couples, taille_lot) for modele, couples in paires.items() if couples)
@@ -0,0 +1,230 @@
+import csv
+import io
+import logging
+from datetime import date, datetime
+from itertools import islice
+
+from django.db import DatabaseError, IntegrityError, transaction
+from .forms import ParticulierForm, EntrepriseForm
+from .models import Particulier, Entreprise
+from .signals import clients_importes
+
+logger = logging.getLogger(__name__)
+
+TAILLE_LOT = 1000
+
+
+class FormatImportInvalide(Exception):
+    pass
+
+
+class ParticulierImportForm(ParticulierForm):
+    def validate_unique(self):
+        # Vérifiée par lot (une requête par champ unique) dans importer().
+        pass
+
+
+class EntrepriseImportForm(EntrepriseForm):
+    class Meta(EntrepriseForm.Meta):
+        fields = [champ for champ in EntrepriseForm.Meta.fields if champ != 'contact_principal']
+
+    def validate_unique(self):
+        pass
+
+
+FORMULAIRES_IMPORT = {
+    Particulier: ParticulierImportForm,
+    Entreprise: EntrepriseImportForm,
+}
+
+
+def _lignes_csv(fichier):
+    texte = io.TextIOWrapper(fichier, encoding='utf-8-sig', newline='')
+    debut = texte.read(8192)
+    texte.seek(0)
+    try:
+        dialecte = csv.Sniffer().sniff(debut, delimiters=';,\t')
+    except csv.Error:
+        dialecte = csv.excel
+    lecteur = csv.reader(texte, dialecte)
+    entetes = next(lecteur, None)
+    if not entetes:
+        raise FormatImportInvalide("Le fichier est vide.")
+    for valeurs in lecteur:
+        if any(valeurs):
+            yield dict(zip(entetes, valeurs))
+    texte.detach()
+
+
+def _lignes_xlsx(fichier):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as exc:
+        raise FormatImportInvalide("L'import XLSX nécessite le paquet openpyxl.") from exc
+
+    # Mode lecture seule : les lignes sont lues au fil de l'eau, sans charger la feuille.
+    classeur = load_workbook(fichier, read_only=True, data_only=True)
+    try:
+        lignes = classeur.active.iter_rows(values_only=True)
+        entetes = next(lignes, None)
+        if not entetes:
+            raise FormatImportInvalide("Le fichier est vide.")
+        entetes = ['' if entete is None else str(entete) for entete in entetes]
+        for valeurs in lignes:
+            if any(valeur not in (None, '') for valeur in valeurs):
+                yield dict(zip(entetes, valeurs))
+    finally:
+        classeur.close()
+
+
+def lire_lignes(fichier, nom):
+    """Itère sur les lignes d'un fichier CSV ou XLSX (fichier binaire), sous forme de dictionnaires."""
+    if nom.lower().endswith('.xlsx'):
+        return _lignes_xlsx(fichier)
+    if nom.lower().endswith('.csv'):
+        return _lignes_csv(fichier)
+    raise FormatImportInvalide("Format non pris en charge : utilisez un fichier .csv ou .xlsx.")
+
+
+def _colonnes(form_class):
+    """Correspondance en-tête normalisé -> champ : nom du champ ou libellé du formulaire."""
+    colonnes = {}
+    for champ in form_class._meta.fields:
+        colonnes[champ.lower()] = champ
+        libelle = form_class._meta.labels.get(champ)
+        if libelle:
+            colonnes[libelle.lower()] = champ
+    return colonnes
+
+
+def _valeur(valeur):
+    if valeur is None:
+        return ''
+    if isinstance(valeur, datetime):
+        return valeur.date().isoformat()
+    if isinstance(valeur, date):
+        return valeur.isoformat()
+    if isinstance(valeur, float) and valeur.is_integer():
+        return str(int(valeur))
+    return str(valeur).strip()
+
+
+def _cle_unique(valeur):
+    return getattr(valeur, 'as_e164', valeur)
+
+
+class Importateur:
+    """
+    Import en masse de particuliers ou d'entreprises.
+
+    Chaque ligne est validée par le formulaire de création (mêmes règles : ICE,
+    téléphone, choix...). L'unicité est vérifiée par lot de ``taille_lot`` lignes,
+    contre la base et à l'intérieur du lot, puis les lignes valides sont
+    insérées par bulk_create. Seul le lot courant est gardé en mémoire ; les
+    erreurs sont transmises à ``signaler_erreur(numero_ligne, champ, message)``.
+    """
+
+    def __init__(self, model, responsable=None, signaler_erreur=None, taille_lot=TAILLE_LOT):
+        self.model = model
+        self.form_class = FORMULAIRES_IMPORT[model]
+        self.responsable = responsable
+        self.signaler_erreur = signaler_erreur or (lambda numero, champ, message: None)
+        self.taille_lot = taille_lot
+        self.colonnes = _colonnes(self.form_class)
+        self.champs_uniques = [
+            champ.name for champ in model._meta.concrete_fields
+            if champ.unique and not champ.primary_key and champ.name in self.form_class._meta.fields
+        ]
+        self.crees = 0
+        self.rejetees = 0
+
+    def importer(self, lignes):
+        lignes = enumerate(lignes, start=2)  # La ligne 1 est l'en-tête.
+        while lot := list(islice(lignes, self.taille_lot)):
+            self._importer_lot(lot)
+        if self.crees:
+            clients_importes.send(sender=self.model, nombre=self.crees)
+        return self.crees, self.rejetees
+
+    def _rejeter(self, numero, champ, message):
+        self.signaler_erreur(numero, champ, message)
+
+    def _rejeter_doublon(self, numero, champ):
+        verbose = self.model._meta.get_field(champ).verbose_name
+        self._rejeter(numero, champ, f"{verbose.capitalize()} déjà utilisé(e).")
+
+    def _champ_en_conflit(self, exc):
+        """Champ unique dont la contrainte est violée, d'après le diagnostic PostgreSQL, ou None."""
+        contrainte = getattr(getattr(exc.__cause__, 'diag', None), 'constraint_name', None) or ''
+        return next((
+            champ for champ in self.champs_uniques
+            if f'_{self.model._meta.get_field(champ).column}_' in contrainte
+        ), None)
+
+    def _valider(self, numero, ligne):
+        donnees = {}
+        for entete, valeur in ligne.items():
+            champ = self.colonnes.get((entete or '').strip().lower())
+            if champ:
+                donnees[champ] = _valeur(valeur)
+        form = self.form_class(data=donnees)
+        if not form.is_valid():
+            for champ, erreurs in form.errors.items():
+                for erreur in erreurs:
+                    self._rejeter(numero, champ, erreur)
+            return None
+        form.instance.responsable = self.responsable
+        return form.instance
+
+    def _importer_lot(self, lot):
+        valides = []
+        for numero, ligne in lot:
+            instance = self._valider(numero, ligne)
+            if instance is None:
+                self.rejetees += 1
+            else:
+                valides.append((numero, instance))
+
+        # Une requête par champ unique pour tout le lot, puis dédoublonnage interne au lot.
+        existants = {
+            champ: {
+                _cle_unique(valeur) for valeur in self.model.objects.filter(**{
+                    f'{champ}__in': [getattr(instance, champ) for _, instance in valides]
+                }).values_list(champ, flat=True)
+            }
+            for champ in self.champs_uniques
+        }
+        a_creer = []
+        for numero, instance in valides:
+            doublon = next((
+                champ for champ in self.champs_uniques
+                if _cle_unique(getattr(instance, champ)) in existants[champ]
+            ), None)
+            if doublon:
+                self._rejeter_doublon(numero, doublon)
+                self.rejetees += 1
+                continue
+            for champ in self.champs_uniques:
+                existants[champ].add(_cle_unique(getattr(instance, champ)))
+            a_creer.append((numero, instance))
+
+        try:
+            with transaction.atomic():
+                self.model.objects.bulk_create([instance for _, instance in a_creer])
+            self.crees += len(a_creer)
+        except DatabaseError:
+            # Doublon inséré entre la vérification et l'insertion : ligne par ligne.
+            for numero, instance in a_creer:
+                try:
+                    with transaction.atomic():
+                        instance.save()
+                    self.crees += 1
+                except DatabaseError as exc:
+                    # Le message brut (contrainte, détail SQL) va au journal, pas au rapport d'import.
+                    logger.warning("Import %s, ligne %s refusée par la base.", self.model.__name__, numero, exc_info=True)
+                    champ = self._champ_en_conflit(exc) if isinstance(exc, IntegrityError) else None
+                    if champ:
+                        self._rejeter_doublon(numero, champ)
+                    else:
+                        self._rejeter(numero, None, "Ligne refusée par la base de données.")
+                    self.rejetees += 1
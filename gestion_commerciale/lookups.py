@@ -0,0 +1,49 @@
+from django.db import models
+from django.db.models.functions import Lower
+
+
+class SansAccents(models.Func):
+    """
+    sans_accents(texte) : unaccent déclaré IMMUTABLE (migration 0009), seul
+    utilisable dans un index ; unaccent() seul dépend du dictionnaire courant.
+    """
+    function = 'sans_accents'
+    output_field = models.TextField()
+
+
+def forme_normalisee(expression):
+    """Minuscules sans accents : la forme indexée des champs filtrés par « contient »."""
+    return SansAccents(Lower(expression))
+
+
+@models.CharField.register_lookup
+class Contient(models.Lookup):
+    """
+    champ__contient='Éric' : sous-chaîne, sans tenir compte de la casse ni des
+    accents. Compare sans_accents(lower(champ)), l'expression des index
+    trigrammes *_sa_trgm : contrairement à icontains (UPPER(champ) LIKE ...),
+    le filtre est servi par l'index.
+    """
+    lookup_name = 'contient'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = compiler.compile(forme_normalisee(self.lhs))
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        rhs_params = [connection.ops.prep_for_like_query(param) for param in rhs_params]
+        return f"{lhs} LIKE '%%' || sans_accents(lower({rhs})) || '%%'", [*lhs_params, *rhs_params]
+
+
+@models.CharField.register_lookup
+class CommencePar(models.Lookup):
+    """
+    champ__commence_par='dup' : champ ILIKE 'dup%'. Servi par un index
+    trigramme (gin_trgm_ops) sur le champ, contrairement à istartswith
+    (UPPER(champ) LIKE ...), qui n'a pas d'index.
+    """
+    lookup_name = 'commence_par'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        rhs_params = [connection.ops.prep_for_like_query(param) for param in rhs_params]
+        return f"{lhs} ILIKE {rhs} || '%%'", [*lhs_params, *rhs_params]
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from gestion_commerciale import archivage
+
+
+class Command(BaseCommand):
+    help = (
+        "Déplace vers la table des archives les opportunités gagnées ou perdues clôturées depuis "
+        "plus d'un certain nombre de jours, par lots courts. À lancer périodiquement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--age-jours', type=int, default=settings.ARCHIVAGE_OPPORTUNITES_JOURS,
+            help="Âge minimal (jours depuis la clôture) d'une opportunité archivée.",
+        )
+        parser.add_argument('--taille-lot', type=int, default=archivage.TAILLE_LOT_ARCHIVAGE)
+
+    def handle(self, *args, **options):
+        debut = time.monotonic()
+        archivees = archivage.archiver(options['age_jours'], options['taille_lot'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{archivees} opportunité(s) archivée(s) en {time.monotonic() - debut:.1f} s."
+        ))
@@ -0,0 +1,106 @@
+import copy
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from gestion_commerciale.models import Opportunite
+
+ALIAS = 'benchmark_connexions'
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le débit (requêtes/s) du cycle de connexion d'une requête HTTP contre la "
+        "base locale : une connexion par requête (réglage historique), connexions "
+        "persistantes (CONN_MAX_AGE) et pool psycopg 3. Chaque « requête » ouvre ou "
+        "emprunte une connexion, lit la première page des opportunités puis la rend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requetes', type=int, default=2000, help="Nombre total de requêtes par mode.")
+        parser.add_argument('--threads', type=int, default=8, help="Requêtes simultanées (workers).")
+        parser.add_argument('--taille-pool', type=int, default=8, help="Taille du pool (min = max).")
+
+    def handle(self, *args, **options):
+        sql, params = Opportunite.objects.order_by('-date_creation', '-id').values_list('pk')[:20].query.sql_with_params()
+        taille = options['taille_pool']
+        modes = [
+            ("Sans pool, une connexion par requête", {'CONN_MAX_AGE': 0}),
+            ("Connexions persistantes (CONN_MAX_AGE)", {'CONN_MAX_AGE': None}),
+            (f"Pool psycopg 3 ({taille} connexions)", {
+                'CONN_MAX_AGE': 0,
+                'OPTIONS': {'pool': {'min_size': taille, 'max_size': taille}},
+            }),
+        ]
+        for libelle, reglages in modes:
+            debit, latence, stats = self.mesurer(sql, params, reglages, options['requetes'], options['threads'])
+            self.stdout.write(f"{libelle:<45} {debit:>9.0f} req/s   latence moyenne {latence:6.2f} ms")
+            if stats:
+                self.stdout.write(f"    pool : {stats}")
+
+    def reglages_base(self, reglages):
+        settings_dict = copy.deepcopy(connections['default'].settings_dict)
+        options = reglages.get('OPTIONS', {})
+        settings_dict.update({cle: valeur for cle, valeur in reglages.items() if cle != 'OPTIONS'})
+        settings_dict['OPTIONS'] = {
+            **{cle: valeur for cle, valeur in settings_dict['OPTIONS'].items() if cle != 'pool'},
+            **options,
+        }
+        return settings_dict
+
+    def mesurer(self, sql, params, reglages, nb_requetes, nb_threads):
+        settings_dict = self.reglages_base(reglages)
+        # Alias temporaire : chaque thread obtient sa propre connexion via connections[ALIAS].
+        connections.settings[ALIAS] = settings_dict
+        try:
+            return self.executer(sql, params, settings_dict, nb_requetes, nb_threads)
+        finally:
+            del connections.settings[ALIAS]
+
+    def executer(self, sql, params, settings_dict, nb_requetes, nb_threads):
+        persistante = settings_dict['CONN_MAX_AGE'] != 0
+        durees = []
+        erreurs = []
+        verrou = threading.Lock()
+
+        def travailler(nombre):
+            # Une connexion Django par thread, comme un worker de serveur.
+            base = connections[ALIAS]
+            locales = []
+            try:
+                for _ in range(nombre):
+                    debut = time.perf_counter()
+                    with base.cursor() as cursor:
+                        cursor.execute(sql, params)
+                        cursor.fetchall()
+                    if not persistante:
+                        base.close()  # Fermeture, ou restitution au pool.
+                    locales.append(time.perf_counter() - debut)
+            except Exception as exc:
+                erreurs.append(exc)
+            finally:
+                base.close()
+                with verrou:
+                    durees.extend(locales)
+
+        pool = connections.create_connection(ALIAS).pool
+        if pool is not None:
+            pool.open(wait=True)
+        parts = [nb_requetes // nb_threads + (i < nb_requetes % nb_threads) for i in range(nb_threads)]
+        threads = [threading.Thread(target=travailler, args=(part,)) for part in parts]
+        debut = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total = time.perf_counter() - debut
+        if erreurs:
+            raise CommandError(f"Échec d'un worker : {erreurs[0]}")
+
+        stats = None
+        if pool is not None:
+            stats = {cle: valeur for cle, valeur in pool.get_stats().items()
+                     if cle in ('pool_size', 'requests_num', 'requests_waiting', 'connections_num', 'usage_ms')}
+            connections.create_connection(ALIAS).close_pool()
+        return len(durees) / total, sum(durees) / max(len(durees), 1) * 1000, stats
@@ -0,0 +1,147 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from catalogue_service.models import Service
+from gestion_commerciale.models import Particulier, Entreprise, Opportunite
+from gestion_commerciale.recherche import _suggerer
+from utils.pagination import KeysetPaginator
+
+User = get_user_model()
+
+STATUTS_OUVERTS = ['qualification', 'negociation']
+
+
+def index_acces():
+    """
+    Index déclarés sur les tables mesurées : B-tree des chemins d'accès et GIN
+    (trigrammes des filtres « contient » et de l'autocomplétion, plein texte).
+    """
+    return [
+        index.name
+        for model in (Particulier, Entreprise, Opportunite, Service, User)
+        for index in model._meta.indexes
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare les plans d'exécution (EXPLAIN ANALYZE) des chemins d'accès des listes "
+        "et de la recherche, sans puis avec les index déclarés (B-tree et GIN), sur un jeu de données "
+        "synthétique. Tout est annulé en fin de commande : la base n'est pas modifiée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lignes', type=int, default=100_000, help="Nombre d'opportunités générées.")
+        parser.add_argument('--responsables', type=int, default=50, help="Nombre de commerciaux générés.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            responsable = self.generer(options['lignes'], options['responsables'])
+            scenarios = self.scenarios(responsable)
+
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for nom in index_acces():
+                        cursor.execute(f'DROP INDEX {connection.ops.quote_name(nom)}')
+                self.expliquer("AVANT (sans les index déclarés)", scenarios)
+                transaction.set_rollback(True)
+
+            self.expliquer("APRÈS (avec les index déclarés)", scenarios)
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Jeu de données synthétique supprimé."))
+
+    def generer(self, lignes, nb_responsables):
+        self.stdout.write(f"Génération de {lignes} opportunités et {lignes // 2} particuliers...")
+        responsables = User.objects.bulk_create(
+            User(username=f'benchmark_{i}', first_name=f'Prenom{i}', last_name=f'Nom{i}', password='!')
+            for i in range(nb_responsables)
+        )
+        ids = [user.pk for user in responsables]
+        qn = connection.ops.quote_name
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {qn(Particulier._meta.db_table)}
+                    (civilite, nom, prenom, date_de_naissance, email, telephone, source,
+                     notes_supplementaires, adresse, ville, code_postal, pays, type_relation,
+                     responsable_id, date_creation, date_mise_a_jour)
+                SELECT 'M', 'Nom' || (g %% 5000), 'Prenom' || g, DATE '1980-01-01',
+                       'benchmark' || g || '@example.com', '+2127' || lpad(g::text, 8, '0'), '',
+                       '', 'Adresse ' || g, 'Ville ' || (g %% 200), '10000', 'Maroc', 'prospect',
+                       (%(ids)s::bigint[])[1 + g %% cardinality(%(ids)s::bigint[])],
+                       now() - g * interval '1 minute', now() - g * interval '1 minute'
+                FROM generate_series(1, %(n)s) AS g
+                ON CONFLICT DO NOTHING
+                """,
+                {'ids': ids, 'n': lignes // 2},
+            )
+            # 20 % d'opportunités ouvertes, le reste clos (gagnées ou perdues).
+            cursor.execute(
+                f"""
+                INSERT INTO {qn(Opportunite._meta.db_table)}
+                    (nom, description, statut, montant, responsable_id, client_particulier_id,
+                     date_creation, date_mise_a_jour)
+                SELECT 'Opportunité ' || g, '',
+                       (ARRAY['qualification', 'negociation', 'gagnee', 'gagnee', 'gagnee',
+                              'perdue', 'perdue', 'perdue', 'perdue', 'perdue'])[1 + (g / 7) %% 10],
+                       (g %% 1000) * 10, (%(ids)s::bigint[])[1 + g %% cardinality(%(ids)s::bigint[])],
+                       p.id, now() - g * interval '1 minute', now() - g * interval '1 minute'
+                FROM generate_series(1, %(n)s) AS g
+                JOIN {qn(Particulier._meta.db_table)} AS p
+                  ON p.email = 'benchmark' || (1 + g %% %(clients)s) || '@example.com'
+                ON CONFLICT DO NOTHING
+                """,
+                {'ids': ids, 'n': lignes, 'clients': max(lignes // 2, 1)},
+            )
+            for model in (Particulier, Opportunite, User):
+                cursor.execute(f'ANALYZE {qn(model._meta.db_table)}')
+        return responsables[0]
+
+    def page_profonde(self, queryset, ordering):
+        """Page de liste atteinte par curseur aux trois quarts de ``queryset`` (le coût ne doit pas croître avec la profondeur)."""
+        paginateur = KeysetPaginator(queryset, 25, ordering=ordering)
+        tri = [f"{'-' if descendant else ''}{champ.attname}" for champ, descendant in paginateur.ordering]
+        ligne = queryset.order_by(*tri)[queryset.count() * 3 // 4]
+        return paginateur.requete_apres(paginateur.valeurs(ligne))[:26]
+
+    def scenarios(self, responsable):
+        return [
+            ("Liste des opportunités, manager (page aux trois quarts, par curseur)",
+             self.page_profonde(Opportunite.objects.all(), ['-date_creation'])),
+            ("Liste des particuliers, manager (page aux trois quarts, par curseur)",
+             self.page_profonde(Particulier.objects.all(), ['nom', 'prenom'])),
+            ("Liste des opportunités d'un commercial (1re page)",
+             Opportunite.objects.filter(responsable=responsable).order_by('-date_creation', '-id')[:26]),
+            ("Liste des opportunités, manager (1re page)",
+             Opportunite.objects.order_by('-date_creation', '-id')[:26]),
+            ("Opportunités en négociation d'un commercial",
+             Opportunite.objects.filter(statut='negociation', responsable=responsable).order_by()),
+            ("Pipeline ouvert d'un commercial",
+             Opportunite.objects.filter(responsable=responsable, statut__in=STATUTS_OUVERTS)
+             .order_by('-date_creation')[:26]),
+            ("Opportunités modifiées depuis 24 h",
+             Opportunite.objects.filter(date_mise_a_jour__gte=timezone.now() - timedelta(days=1))
+             .order_by()),
+            ("Particuliers filtrés par nom (« contient », sans accents)",
+             Particulier.objects.filter(nom__contient='nom123').order_by('nom', 'prenom', 'id')[:26]),
+            ("Opportunités filtrées par nom (« contient », sans accents)",
+             Opportunite.objects.filter(nom__contient='opportunite 4242').order_by('-date_creation', '-id')[:26]),
+            ("Autocomplétion des particuliers (préfixe ou similarité)",
+             _suggerer(Particulier.objects.only('nom', 'prenom'), 'Nom1234', ['nom', 'prenom'], 20)),
+            ("Autocomplétion des responsables (préfixe ou similarité)",
+             _suggerer(User.objects.only('username', 'first_name', 'last_name').order_by('last_name', 'first_name'),
+                       'Nom1234', ['last_name', 'first_name', 'username'], 20)),
+            ("Liste des particuliers d'un commercial (1re page)",
+             Particulier.objects.filter(responsable=responsable).order_by('nom', 'prenom', 'id')[:26]),
+        ]
+
+    def expliquer(self, titre, scenarios):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n=== {titre} ==="))
+        for libelle, queryset in scenarios:
+            self.stdout.write(self.style.MIGRATE_LABEL(f"\n-- {libelle}"))
+            self.stdout.write(queryset.explain(analyze=True, buffers=True))
@@ -0,0 +1,193 @@
+import json
+import statistics
+import subprocess
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from catalogue_service.models import Service
+from gestion_commerciale.models import Opportunite, Particulier
+from utilisateur.models import Utilisateur, Role
+
+FICHIER_RESULTATS = Path(settings.BASE_DIR) / 'benchmarks' / 'vues.jsonl'
+
+# (nom d'URL, rôle de l'utilisateur, paramètres GET)
+SCENARIOS = [
+    ('tableau_de_bord', 'manager', {}),
+    ('tableau_de_bord', 'commercial', {}),
+    ('graphiques_tableau_de_bord', 'manager', {'dimension': 'categorie'}),
+    ('graphiques_tableau_de_bord', 'commercial', {'granularite': 'semaine'}),
+    ('entonnoir_tableau_de_bord', 'manager', {}),
+    ('entonnoir_tableau_de_bord', 'commercial', {}),
+    ('opportunite_list', 'manager', {}),
+    ('opportunite_list', 'commercial', {}),
+    ('opportunite_list', 'manager', {'statut': 'negociation'}),
+    ('opportunite_detail', 'manager', {}),
+    ('particulier_list', 'manager', {}),
+    ('particulier_list', 'commercial', {}),
+    ('particulier_detail', 'manager', {}),
+    ('entreprise_list', 'manager', {}),
+    ('service_list', 'manager', {}),
+    ('service_detail', 'manager', {}),
+    ('categorie_list', 'manager', {}),
+    ('recherche', 'manager', {'q': 'Alami'}),
+    ('doublon_list', 'manager', {}),
+]
+
+# Objet affiché par les vues de détail : le plus récent.
+OBJETS_DETAIL = {
+    'opportunite_detail': Opportunite,
+    'particulier_detail': Particulier,
+    'service_detail': Service,
+}
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _centile(valeurs, centile):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, round(centile / 100 * (len(valeurs) - 1)))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure, pour chaque vue nommée (tableau de bord, listes, détails, catalogue, "
+        "recherche), la latence (médiane, p95), le nombre de requêtes SQL et le pic mémoire, "
+        "sur les données présentes en base (voir generer_donnees). Les résultats sont "
+        "ajoutés à un fichier JSON Lines, avec le commit courant, pour comparer les commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repetitions', type=int, default=10, help="Mesures de latence par vue.")
+        parser.add_argument('--vues', nargs='*', help="Noms d'URL à mesurer (toutes par défaut).")
+        parser.add_argument('--froid', action='store_true', help="Vide le cache avant chaque requête.")
+        parser.add_argument('--sortie', default=str(FICHIER_RESULTATS), help="Fichier JSON Lines des résultats.")
+        parser.add_argument('--comparer', nargs='?', const='', default=None, metavar='COMMIT',
+                            help="Compare à la dernière exécution enregistrée (ou à celle du commit donné).")
+
+    def handle(self, *args, **options):
+        utilisateurs = self.utilisateurs()
+        resultats = {}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for nom_url, role, parametres in SCENARIOS:
+                if options['vues'] and nom_url not in options['vues']:
+                    continue
+                url = self.url(nom_url)
+                if url is None or utilisateurs.get(role) is None:
+                    self.stdout.write(self.style.WARNING(f"{nom_url} [{role}] : pas de données, ignoré."))
+                    continue
+                client = Client()
+                client.force_login(utilisateurs[role])
+                cle = f"{nom_url} [{role}]" + (f" {parametres}" if parametres else '')
+                resultats[cle] = self.mesurer(client, url, parametres, options['repetitions'], options['froid'])
+                self.afficher(cle, resultats[cle])
+
+        sortie = Path(options['sortie'])
+        reference = self.reference(sortie, options['comparer']) if options['comparer'] is not None else None
+        sortie.parent.mkdir(parents=True, exist_ok=True)
+        with sortie.open('a', encoding='utf-8') as fichier:
+            fichier.write(json.dumps({
+                'date': timezone.now().isoformat(timespec='seconds'),
+                'commit': _commit(),
+                'froid': options['froid'],
+                'resultats': resultats,
+            }, ensure_ascii=False) + '\n')
+        self.stdout.write(self.style.SUCCESS(f"Résultats ajoutés à {sortie}."))
+        if reference is not None:
+            self.comparer(reference, resultats)
+
+    def utilisateurs(self):
+        return {
+            'manager': Utilisateur.objects.filter(role=Role.MANAGER, is_active=True).order_by('pk').first(),
+            # Le commercial au plus gros portefeuille : le cas le plus lourd pour sa portée.
+            'commercial': Utilisateur.objects.filter(role=Role.COMMERCIAL, is_active=True)
+            .annotate(nb=Count('opportunites_gerees')).order_by('-nb', 'pk').first(),
+        }
+
+    def url(self, nom_url):
+        if nom_url not in OBJETS_DETAIL:
+            return reverse(nom_url)
+        pk = OBJETS_DETAIL[nom_url].objects.order_by('-pk').values_list('pk', flat=True).first()
+        return reverse(nom_url, args=[pk]) if pk else None
+
+    def requete(self, client, url, parametres, froid):
+        if froid:
+            cache.clear()
+        response = client.get(url, parametres)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        else:
+            response.content
+        return response
+
+    def mesurer(self, client, url, parametres, repetitions, froid):
+        self.requete(client, url, parametres, froid)  # Échauffement (connexion, caches de code).
+
+        durees = []
+        for _ in range(repetitions):
+            debut = time.perf_counter()
+            response = self.requete(client, url, parametres, froid)
+            durees.append((time.perf_counter() - debut) * 1000)
+
+        # Passage séparé : la capture des requêtes et tracemalloc faussent la latence.
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as requetes:
+                self.requete(client, url, parametres, froid)
+            _, pic = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'statut': response.status_code,
+            'mediane_ms': round(statistics.median(durees), 2),
+            'p95_ms': round(_centile(durees, 95), 2),
+            'min_ms': round(min(durees), 2),
+            'requetes': len(requetes),
+            'memoire_kio': round(pic / 1024),
+        }
+
+    def afficher(self, cle, mesure):
+        self.stdout.write(
+            f"{cle:<55} {mesure['statut']}  médiane {mesure['mediane_ms']:8.2f} ms  "
+            f"p95 {mesure['p95_ms']:8.2f} ms  {mesure['requetes']:3d} requêtes  {mesure['memoire_kio']:7d} Kio"
+        )
+
+    def reference(self, sortie, commit):
+        if not sortie.exists():
+            return None
+        executions = [json.loads(ligne) for ligne in sortie.read_text(encoding='utf-8').splitlines() if ligne]
+        if commit:
+            executions = [e for e in executions if (e.get('commit') or '').startswith(commit)]
+        return executions[-1] if executions else None
+
+    def comparer(self, reference, resultats):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"\nComparaison avec {reference.get('commit') or '?'} du {reference['date']} :"
+        ))
+        for cle, mesure in resultats.items():
+            avant = reference['resultats'].get(cle)
+            if avant is None:
+                continue
+            ecart = (mesure['mediane_ms'] - avant['mediane_ms']) / avant['mediane_ms'] * 100 if avant['mediane_ms'] else 0
+            ligne = (f"{cle:<55} médiane {avant['mediane_ms']:8.2f} -> {mesure['mediane_ms']:8.2f} ms "
+                     f"({ecart:+.0f} %)  requêtes {avant['requetes']} -> {mesure['requetes']}")
+            regression = ecart > 20 or mesure['requetes'] > avant['requetes']
+            self.stdout.write(self.style.WARNING(ligne) if regression else ligne)
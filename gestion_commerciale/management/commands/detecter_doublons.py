@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from gestion_commerciale import doublons
+from gestion_commerciale.models import Particulier, Entreprise
+
+
+class Command(BaseCommand):
+    help = (
+        "Détecte les doublons probables parmi les particuliers et les entreprises (clés de "
+        "regroupement : téléphone, e-mail, nom et ville...) et les ajoute à la file d'examen."
+    )
+    modeles = {'particuliers': Particulier, 'entreprises': Entreprise}
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type', choices=sorted(self.modeles), action='append', dest='types',
+            help="Limite la détection à ce type de client (répétable). Par défaut : tous.",
+        )
+        parser.add_argument(
+            '--seuil', type=float, default=doublons.SEUIL_DOUBLON,
+            help="Score minimal (0 à 1) d'une paire retenue.",
+        )
+        parser.add_argument(
+            '--taille-bloc', type=int, default=doublons.TAILLE_BLOC_MAX,
+            help="Taille au-delà de laquelle un bloc (même clé) est ignoré.",
+        )
+
+    def handle(self, *args, **options):
+        modeles = [self.modeles[type_client] for type_client in options['types'] or sorted(self.modeles)]
+        debut = time.monotonic()
+        resultats = doublons.detecter_doublons(modeles, options['seuil'], options['taille_bloc'])
+        for modele, paires in resultats.items():
+            self.stdout.write(f"{modele._meta.verbose_name_plural} : {paires} paire(s) ajoutée(s) ou mise(s) à jour.")
+        self.stdout.write(self.style.SUCCESS(f"Détection terminée en {time.monotonic() - debut:.1f} s."))
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from gestion_commerciale import fusion
+from gestion_commerciale.models import DoublonPotentiel
+
+
+class Command(BaseCommand):
+    help = (
+        "Fusionne en masse les paires de la file des doublons dont le score atteint un minimum "
+        "(opportunités et contacts rattachés à la fiche conservée, fiche absorbée supprimée)."
+    )
+    colonnes = {'particuliers': 'particulier_a__isnull', 'entreprises': 'entreprise_a__isnull'}
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--score-min', type=float, required=True,
+            help="Score minimal (0 à 1) des paires fusionnées sans examen.",
+        )
+        parser.add_argument(
+            '--type', choices=sorted(self.colonnes), action='append', dest='types',
+            help="Limite la fusion à ce type de client (répétable). Par défaut : tous.",
+        )
+        parser.add_argument(
+            '--conserver', choices=['a', 'b'], default='a',
+            help="Fiche conservée de chaque paire : A (la plus ancienne, par défaut) ou B.",
+        )
+        parser.add_argument('--taille-lot', type=int, default=fusion.TAILLE_LOT_FUSION)
+
+    def handle(self, *args, **options):
+        debut = time.monotonic()
+        absorbees = 0
+        for type_client in options['types'] or sorted(self.colonnes):
+            doublons = DoublonPotentiel.objects.filter(
+                score__gte=options['score_min'], **{self.colonnes[type_client]: False},
+            )
+            fusionnees = fusion.fusionner_doublons(doublons, options['conserver'], options['taille_lot'])
+            self.stdout.write(f"{type_client} : {fusionnees} fiche(s) absorbée(s).")
+            absorbees += fusionnees
+        self.stdout.write(self.style.SUCCESS(
+            f"{absorbees} fiche(s) fusionnée(s) en {time.monotonic() - debut:.1f} s."
+        ))
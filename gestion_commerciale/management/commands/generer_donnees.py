@@ -0,0 +1,268 @@
+import random
+import time
+from decimal import Decimal
+from uuid import uuid4
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from catalogue_service.models import Categorie, Service
+from gestion_commerciale.models import (
+    Particulier, Entreprise, Opportunite, recalculer_types_clients,
+    CIVILITE_CHOICES, SOURCE_CHOICES, STATUT_ENTREPRISE_CHOICES, SECTEUR_ACTIVITE_CHOICES,
+    NOMBRE_EMPLOYES_CHOICES, STATUTS_CLOS,
+)
+from tableau_de_bord import agregats, cumuls, entonnoir
+from tableau_de_bord.cache import invalider_tableau_de_bord
+from tableau_de_bord.models import TransitionStatut
+from utilisateur.models import Utilisateur, Role
+
+NOMS = ['Alami', 'Bennani', 'Chraibi', 'Daoudi', 'El Fassi', 'Filali', 'Guessous', 'Haddad',
+        'Idrissi', 'Jettou', 'Kettani', 'Lahlou', 'Mansouri', 'Naciri', 'Ouazzani', 'Rami',
+        'Sqalli', 'Tazi', 'Yacoubi', 'Zniber']
+PRENOMS = ['Karim', 'Sara', 'Omar', 'Salma', 'Youssef', 'Imane', 'Mehdi', 'Nadia', 'Hamza',
+           'Leila', 'Amine', 'Zineb', 'Rachid', 'Houda', 'Anas', 'Meryem']
+VILLES = ['Casablanca', 'Rabat', 'Marrakech', 'Fès', 'Tanger', 'Agadir', 'Meknès', 'Oujda',
+          'Kénitra', 'Tétouan']
+# Pondération des statuts : environ 20 % d'opportunités ouvertes.
+STATUTS = ['qualification', 'negociation'] + ['gagnee'] * 3 + ['perdue'] * 5
+
+
+def _valeurs(choix):
+    return [valeur for valeur, _ in choix]
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données réaliste à l'échelle choisie (utilisateurs par rôle, "
+        "catégories, services, clients, opportunités), par INSERT ... SELECT côté serveur "
+        "et par lots. Les données sont conservées ; types de clients, agrégats du tableau "
+        "de bord et statistiques du planificateur sont recalculés à la fin."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--administrateurs', type=int, default=2)
+        parser.add_argument('--managers', type=int, default=10)
+        parser.add_argument('--commerciaux', type=int, default=100)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--services', type=int, default=200)
+        parser.add_argument('--particuliers', type=int, default=350_000)
+        parser.add_argument('--entreprises', type=int, default=150_000)
+        parser.add_argument('--opportunites', type=int, default=1_000_000)
+        parser.add_argument('--taille-lot', type=int, default=100_000, help="Lignes insérées par transaction.")
+        parser.add_argument('--graine', type=int, default=None, help="Graine aléatoire, pour un jeu reproductible.")
+        parser.add_argument('--mot-de-passe', default='password123', help="Mot de passe des utilisateurs générés.")
+
+    def handle(self, *args, **options):
+        graine = options['graine'] if options['graine'] is not None else random.randrange(2 ** 31)
+        self.hasard = random.Random(graine)
+        # Préfixe propre à cette exécution : les champs uniques ne collisionnent pas d'une exécution à l'autre.
+        self.prefixe = uuid4().hex[:6]
+        self.taille_lot = options['taille_lot']
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT setseed(%s)', [graine / 2 ** 31])
+        self.stdout.write(f"Génération « {self.prefixe} » (graine {graine}).")
+
+        commerciaux = self.generer_utilisateurs(options)
+        services = self.generer_catalogue(options['categories'], options['services'])
+        self.par_lots("particuliers", options['particuliers'], self.inserer_particuliers, commerciaux)
+        self.par_lots("entreprises", options['entreprises'], self.inserer_entreprises, commerciaux)
+        self.par_lots("opportunités", options['opportunites'], self.inserer_opportunites, commerciaux, services)
+
+        self.stdout.write("Recalcul des types de clients, des agrégats, des cumuls, de l'historique des statuts et des statistiques...")
+        with transaction.atomic():
+            recalculer_types_clients(tous=True)
+            agregats.reconstruire()
+            cumuls.reconstruire()
+        entonnoir.reconstruire_historique()
+        with connection.cursor() as cursor:
+            for model in (Particulier, Entreprise, Opportunite, Service, TransitionStatut):
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+        invalider_tableau_de_bord()
+        self.stdout.write(self.style.SUCCESS("Jeu de données généré."))
+
+    def generer_utilisateurs(self, options):
+        mot_de_passe = make_password(options['mot_de_passe'])
+        utilisateurs = []
+        for role, nombre in ((Role.ADMIN, options['administrateurs']), (Role.MANAGER, options['managers']),
+                             (Role.COMMERCIAL, options['commerciaux'])):
+            utilisateurs += [
+                Utilisateur(
+                    username=f'{self.prefixe}_{role.lower()}_{i}', password=mot_de_passe, role=role,
+                    first_name=self.hasard.choice(PRENOMS), last_name=self.hasard.choice(NOMS),
+                    is_staff=role != Role.COMMERCIAL, is_superuser=role == Role.ADMIN,
+                )
+                for i in range(1, nombre + 1)
+            ]
+        # bulk_create ne passe pas par Utilisateur.save() : les groupes de rôle sont posés ici.
+        with transaction.atomic():
+            utilisateurs = Utilisateur.objects.bulk_create(utilisateurs)
+            groupes = {label: Group.objects.get_or_create(name=label)[0] for _, label in Role.choices}
+            Utilisateur.groups.through.objects.bulk_create(
+                Utilisateur.groups.through(utilisateur_id=u.pk, group_id=groupes[u.get_role_display()].pk)
+                for u in utilisateurs
+            )
+        self.stdout.write(f"  {len(utilisateurs)} utilisateurs.")
+        commerciaux = [u.pk for u in utilisateurs if u.role == Role.COMMERCIAL]
+        return commerciaux or list(Utilisateur.objects.filter(role=Role.COMMERCIAL).values_list('pk', flat=True))
+
+    def generer_catalogue(self, nb_categories, nb_services):
+        with transaction.atomic():
+            categories = Categorie.objects.bulk_create(
+                Categorie(nom=f'Catégorie {self.prefixe} {i}', description='') for i in range(1, nb_categories + 1)
+            )
+            Service.objects.bulk_create(
+                Service(
+                    nom=f'Service {self.prefixe} {i}',
+                    categorie=self.hasard.choice(categories) if categories else None,
+                    description='',
+                    prix=Decimal(self.hasard.randrange(500, 200_000, 50)),
+                    type_tarif=self.hasard.choice(Service.TypeTarif.values),
+                    actif=self.hasard.random() > 0.1,
+                )
+                for i in range(1, nb_services + 1)
+            )
+        self.stdout.write(f"  {nb_categories} catégories, {nb_services} services.")
+        return list(Service.objects.filter(actif=True).values_list('pk', flat=True))
+
+    def par_lots(self, libelle, total, inserer, *args):
+        inseres = 0
+        debut = time.perf_counter()
+        for premier in range(1, total + 1, self.taille_lot):
+            dernier = min(premier + self.taille_lot - 1, total)
+            with transaction.atomic(), connection.cursor() as cursor:
+                inserer(cursor, premier, dernier, *args)
+                inseres += cursor.rowcount
+            self.stdout.write(f"  {libelle} : {inseres}/{total}", ending='\r')
+        self.stdout.write(f"  {libelle} : {inseres} lignes en {time.perf_counter() - debut:.1f} s.")
+
+    # Dans les requêtes ci-dessous, la sous-requête LATERAL dépend de g (WHERE g IS
+    # NOT NULL) : ses tirages aléatoires sont refaits à chaque ligne au lieu d'une fois.
+
+    def inserer_particuliers(self, cursor, premier, dernier, commerciaux):
+        cursor.execute(
+            f"""
+            INSERT INTO {connection.ops.quote_name(Particulier._meta.db_table)}
+                (civilite, nom, prenom, date_de_naissance, email, telephone, source,
+                 notes_supplementaires, adresse, ville, code_postal, pays, type_relation,
+                 responsable_id, date_creation, date_mise_a_jour)
+            SELECT s.civilite, s.nom, s.prenom,
+                   DATE '1950-01-01' + floor(random() * 18000)::int,
+                   lower(s.prenom || '.' || replace(s.nom, ' ', '')) || '.' || %(prefixe)s || g || '@example.com',
+                   '+2126' || lpad((floor(random() * 100000000))::bigint::text, 8, '0'),
+                   (%(sources)s::text[])[1 + floor(random() * cardinality(%(sources)s::text[]))::int],
+                   '', g || ' rue ' || s.nom, s.ville, lpad((10000 + floor(random() * 80000))::int::text, 5, '0'),
+                   'Maroc', 'prospect', s.responsable_id, s.date_creation, s.date_creation
+            FROM generate_series(%(premier)s, %(dernier)s) AS g
+            CROSS JOIN LATERAL (
+                SELECT (%(civilites)s::text[])[1 + floor(random() * 2)::int] AS civilite,
+                       (%(noms)s::text[])[1 + floor(random() * cardinality(%(noms)s::text[]))::int] AS nom,
+                       (%(prenoms)s::text[])[1 + floor(random() * cardinality(%(prenoms)s::text[]))::int] AS prenom,
+                       (%(villes)s::text[])[1 + floor(random() * cardinality(%(villes)s::text[]))::int] AS ville,
+                       (%(commerciaux)s::bigint[])[1 + floor(power(random(), 2) * %(nb_commerciaux)s)::int] AS responsable_id,
+                       now() - random() * interval '3 years' AS date_creation
+                WHERE g IS NOT NULL
+            ) AS s
+            ON CONFLICT DO NOTHING
+            """,
+            {
+                'premier': premier, 'dernier': dernier, 'prefixe': self.prefixe,
+                'civilites': _valeurs(CIVILITE_CHOICES), 'sources': _valeurs(SOURCE_CHOICES),
+                'noms': NOMS, 'prenoms': PRENOMS, 'villes': VILLES,
+                'commerciaux': commerciaux, 'nb_commerciaux': len(commerciaux),
+            },
+        )
+
+    def inserer_entreprises(self, cursor, premier, dernier, commerciaux):
+        cursor.execute(
+            f"""
+            INSERT INTO {connection.ops.quote_name(Entreprise._meta.db_table)}
+                (nom_entreprise, ice, statut_juridique, secteur_activite, nombre_employes, email,
+                 telephone, source, notes_supplementaires, adresse, ville, code_postal, pays,
+                 type_compte, responsable_id, date_creation, date_mise_a_jour)
+            SELECT s.nom || ' ' || %(prefixe)s || '-' || g,
+                   lpad((floor(random() * 1e15))::bigint::text, 15, '0'),
+                   (%(statuts)s::text[])[1 + floor(random() * cardinality(%(statuts)s::text[]))::int],
+                   (%(secteurs)s::text[])[1 + floor(random() * cardinality(%(secteurs)s::text[]))::int],
+                   (%(tailles)s::text[])[1 + floor(random() * cardinality(%(tailles)s::text[]))::int],
+                   'contact.' || %(prefixe)s || g || '@entreprise.example.com',
+                   '+2125' || lpad((floor(random() * 100000000))::bigint::text, 8, '0'),
+                   (%(sources)s::text[])[1 + floor(random() * cardinality(%(sources)s::text[]))::int],
+                   '', g || ' boulevard ' || s.nom, s.ville,
+                   lpad((10000 + floor(random() * 80000))::int::text, 5, '0'), 'Maroc', 'prospect',
+                   s.responsable_id, s.date_creation, s.date_creation
+            FROM generate_series(%(premier)s, %(dernier)s) AS g
+            CROSS JOIN LATERAL (
+                SELECT (%(noms)s::text[])[1 + floor(random() * cardinality(%(noms)s::text[]))::int]
+                       || (ARRAY[' Conseil', ' Industries', ' Services', ' Distribution', ' Technologies'])[1 + floor(random() * 5)::int]
+                       AS nom,
+                       (%(villes)s::text[])[1 + floor(random() * cardinality(%(villes)s::text[]))::int] AS ville,
+                       (%(commerciaux)s::bigint[])[1 + floor(power(random(), 2) * %(nb_commerciaux)s)::int] AS responsable_id,
+                       now() - random() * interval '3 years' AS date_creation
+                WHERE g IS NOT NULL
+            ) AS s
+            ON CONFLICT DO NOTHING
+            """,
+            {
+                'premier': premier, 'dernier': dernier, 'prefixe': self.prefixe,
+                'statuts': _valeurs(STATUT_ENTREPRISE_CHOICES), 'secteurs': _valeurs(SECTEUR_ACTIVITE_CHOICES),
+                'tailles': _valeurs(NOMBRE_EMPLOYES_CHOICES), 'sources': _valeurs(SOURCE_CHOICES),
+                'noms': NOMS, 'villes': VILLES,
+                'commerciaux': commerciaux, 'nb_commerciaux': len(commerciaux),
+            },
+        )
+
+    def inserer_opportunites(self, cursor, premier, dernier, commerciaux, services):
+        qn = connection.ops.quote_name
+        # Les clients sont numérotés (row_number) puis tirés par rang : aucun tirage
+        # ne tombe dans un trou de la séquence des identifiants.
+        cursor.execute(
+            f"""
+            WITH p AS MATERIALIZED (
+                SELECT id, responsable_id, row_number() OVER (ORDER BY id) AS rang
+                FROM {qn(Particulier._meta.db_table)}
+            ), e AS MATERIALIZED (
+                SELECT id, responsable_id, row_number() OVER (ORDER BY id) AS rang
+                FROM {qn(Entreprise._meta.db_table)}
+            ), n AS (
+                SELECT (SELECT count(*) FROM p) AS particuliers, (SELECT count(*) FROM e) AS entreprises
+            )
+            INSERT INTO {qn(Opportunite._meta.db_table)}
+                (nom, description, statut, montant, responsable_id, client_particulier_id,
+                 client_entreprise_id, service_id, date_creation, date_mise_a_jour, date_cloture)
+            SELECT 'Opportunité ' || %(prefixe)s || '-' || s.g, '', s.statut,
+                   sv.prix,
+                   coalesce(p.responsable_id, e.responsable_id, s.responsable_id),
+                   p.id, e.id, sv.id,
+                   s.date_creation, s.date_creation + s.part_maj * (now() - s.date_creation),
+                   CASE WHEN s.statut = ANY(%(statuts_clos)s::text[])
+                        THEN s.date_creation + s.part_maj * (now() - s.date_creation) END
+            FROM (
+                SELECT g,
+                       (%(statuts)s::text[])[1 + floor(random() * cardinality(%(statuts)s::text[]))::int] AS statut,
+                       (%(commerciaux)s::bigint[])[1 + floor(power(random(), 2) * %(nb_commerciaux)s)::int] AS responsable_id,
+                       CASE WHEN n.entreprises = 0 THEN true
+                            WHEN n.particuliers = 0 THEN false
+                            ELSE random() < 0.6 END AS pour_particulier,
+                       1 + floor(random() * n.particuliers)::bigint AS rang_particulier,
+                       1 + floor(random() * n.entreprises)::bigint AS rang_entreprise,
+                       CASE WHEN random() < 0.9
+                            THEN (%(services)s::bigint[])[1 + floor(random() * %(nb_services)s)::int] END AS service_id,
+                       now() - random() * interval '3 years' AS date_creation,
+                       random() AS part_maj
+                FROM generate_series(%(premier)s, %(dernier)s) AS g, n
+            ) AS s
+            LEFT JOIN p ON s.pour_particulier AND p.rang = s.rang_particulier
+            LEFT JOIN e ON NOT s.pour_particulier AND e.rang = s.rang_entreprise
+            LEFT JOIN {qn(Service._meta.db_table)} AS sv ON sv.id = s.service_id
+            WHERE p.id IS NOT NULL OR e.id IS NOT NULL
+            ON CONFLICT DO NOTHING
+            """,
+            {
+                'premier': premier, 'dernier': dernier, 'prefixe': self.prefixe, 'statuts': STATUTS,
+                'statuts_clos': list(STATUTS_CLOS),
+                'commerciaux': commerciaux, 'nb_commerciaux': len(commerciaux),
+                'services': services, 'nb_services': len(services),
+            },
+        )
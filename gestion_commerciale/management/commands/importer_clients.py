@@ -0,0 +1,58 @@
+import csv
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from gestion_commerciale.importation import TAILLE_LOT, FormatImportInvalide, Importateur, lire_lignes
+from gestion_commerciale.models import Particulier, Entreprise
+
+User = get_user_model()
+
+MODELES = {'particuliers': Particulier, 'entreprises': Entreprise}
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe en masse des particuliers ou des entreprises depuis un fichier CSV ou XLSX, "
+        "lu au fil de l'eau et inséré par lots. Les lignes invalides sont listées dans un rapport."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Fichier .csv ou .xlsx ; la première ligne contient les en-têtes.")
+        parser.add_argument('--type', choices=sorted(MODELES), required=True, dest='type_client')
+        parser.add_argument('--responsable', help="Nom d'utilisateur du responsable des clients importés.")
+        parser.add_argument('--rapport', help="Fichier CSV recevant les erreurs (ligne, champ, erreur).")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT)
+
+    def handle(self, *args, **options):
+        responsable = None
+        if options['responsable']:
+            try:
+                responsable = User.objects.get(username=options['responsable'])
+            except User.DoesNotExist:
+                raise CommandError(f"Utilisateur inconnu : {options['responsable']}")
+
+        rapport = open(options['rapport'], 'w', newline='', encoding='utf-8') if options['rapport'] else None
+        try:
+            ecrivain = csv.writer(rapport) if rapport else None
+            if ecrivain:
+                ecrivain.writerow(['ligne', 'champ', 'erreur'])
+
+            def signaler_erreur(numero, champ, message):
+                if ecrivain:
+                    ecrivain.writerow([numero, champ or '', message])
+                else:
+                    self.stderr.write(f"Ligne {numero} : {champ or '-'} : {message}")
+
+            importateur = Importateur(
+                MODELES[options['type_client']], responsable=responsable,
+                signaler_erreur=signaler_erreur, taille_lot=options['taille_lot'],
+            )
+            with open(options['fichier'], 'rb') as fichier:
+                crees, rejetees = importateur.importer(lire_lignes(fichier, options['fichier']))
+        except FormatImportInvalide as exc:
+            raise CommandError(str(exc))
+        finally:
+            if rapport:
+                rapport.close()
+
+        self.stdout.write(self.style.SUCCESS(f"{crees} ligne(s) importée(s), {rejetees} rejetée(s)."))
@@ -0,0 +1,37 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.core.management.base import BaseCommand
+from django.db import connection
+from gestion_commerciale.models import Particulier, Entreprise, Opportunite
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintenance des index de recherche (GIN plein texte et trigrammes) : "
+        "mise à jour des statistiques, reconstruction optionnelle et rapport de taille."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reindex', action='store_true',
+            help="Reconstruit les index de recherche (REINDEX CONCURRENTLY, sans bloquer les écritures).",
+        )
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            for model in (Particulier, Entreprise, Opportunite):
+                table = model._meta.db_table
+                index_recherche = [index.name for index in model._meta.indexes if isinstance(index, GinIndex)]
+
+                if options['reindex']:
+                    for nom in index_recherche:
+                        self.stdout.write(f"Reconstruction de {nom}...")
+                        cursor.execute(f'REINDEX INDEX CONCURRENTLY {connection.ops.quote_name(nom)}')
+
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+
+                for nom in index_recherche:
+                    cursor.execute('SELECT pg_size_pretty(pg_relation_size(%s::regclass))', [nom])
+                    taille = cursor.fetchone()[0]
+                    self.stdout.write(f"{table}.{nom} : {taille}")
+
+        self.stdout.write(self.style.SUCCESS("Index de recherche à jour."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from gestion_commerciale.models import recalculer_types_clients
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule le type de relation des particuliers et le type de compte des entreprises "
+        "(client ou prospect) à partir de leurs opportunités gagnées."
+    )
+
+    def handle(self, *args, **options):
+        modifies = recalculer_types_clients(tous=True)
+        self.stdout.write(self.style.SUCCESS(f"{modifies} client(s) mis à jour."))
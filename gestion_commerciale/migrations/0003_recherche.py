@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:01
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue_service', '0003_categorie_date_mise_a_jour'),
+        ('gestion_commerciale', '0002_entreprise_source'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        migrations.RunSQL(
+            sql=[
+                "CREATE TEXT SEARCH CONFIGURATION francais_sans_accents (COPY = french);",
+                "ALTER TEXT SEARCH CONFIGURATION francais_sans_accents "
+                "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem;",
+            ],
+            reverse_sql="DROP TEXT SEARCH CONFIGURATION francais_sans_accents;",
+        ),
+        migrations.AddField(
+            model_name='entreprise',
+            name='vecteur_recherche',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('nom_entreprise', config='francais_sans_accents', weight='A'), '||', django.contrib.postgres.search.SearchVector('ice', config='francais_sans_accents', weight='B'), django.contrib.postgres.search.SearchConfig('francais_sans_accents')), '||', django.contrib.postgres.search.SearchVector('email', config='francais_sans_accents', weight='B'), django.contrib.postgres.search.SearchConfig('francais_sans_accents')), '||', django.contrib.postgres.search.SearchVector('ville', config='francais_sans_accents', weight='C'), django.contrib.postgres.search.SearchConfig('francais_sans_accents')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='opportunite',
+            name='vecteur_recherche',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('nom', config='francais_sans_accents', weight='A'), '||', django.contrib.postgres.search.SearchVector('description', config='francais_sans_accents', weight='B'), django.contrib.postgres.search.SearchConfig('francais_sans_accents')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='particulier',
+            name='vecteur_recherche',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('nom', config='francais_sans_accents', weight='A'), '||', django.contrib.postgres.search.SearchVector('prenom', config='francais_sans_accents', weight='A'), django.contrib.postgres.search.SearchConfig('francais_sans_accents')), '||', django.contrib.postgres.search.SearchVector('email', config='francais_sans_accents', weight='B'), django.contrib.postgres.search.SearchConfig('francais_sans_accents')), '||', django.contrib.postgres.search.SearchVector('ville', config='francais_sans_accents', weight='C'), django.contrib.postgres.search.SearchConfig('francais_sans_accents')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='entreprise',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['vecteur_recherche'], name='entreprise_recherche_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='entreprise',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nom_entreprise'], name='entreprise_nom_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='entreprise',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['ice'], name='entreprise_ice_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='opportunite',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['vecteur_recherche'], name='opportunite_recherche_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunite',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nom'], name='opportunite_nom_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='particulier',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['vecteur_recherche'], name='particulier_recherche_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='particulier',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nom'], name='particulier_nom_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='particulier',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['prenom'], name='particulier_prenom_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:05
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index créés sans verrouiller les tables en écriture (CREATE INDEX CONCURRENTLY).
+    atomic = False
+
+    dependencies = [
+        ('catalogue_service', '0004_index_acces'),
+        ('gestion_commerciale', '0003_recherche'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='entreprise',
+            index=models.Index(fields=['responsable', 'nom_entreprise', 'id'], name='entreprise_resp_tri_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='opportunite',
+            index=models.Index(fields=['-date_creation', '-id'], name='opportunite_tri_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='opportunite',
+            index=models.Index(fields=['responsable', '-date_creation', '-id'], name='opportunite_resp_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='opportunite',
+            index=models.Index(fields=['statut', 'responsable'], name='opportunite_statut_resp_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='opportunite',
+            index=models.Index(condition=models.Q(('statut__in', ['qualification', 'negociation'])), fields=['responsable', '-date_creation'], name='opportunite_ouvertes_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='opportunite',
+            index=models.Index(fields=['date_mise_a_jour'], name='opportunite_maj_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='particulier',
+            index=models.Index(fields=['nom', 'prenom', 'id'], name='particulier_tri_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='particulier',
+            index=models.Index(fields=['responsable', 'nom', 'prenom', 'id'], name='particulier_resp_tri_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue_service', '0004_index_acces'),
+        ('gestion_commerciale', '0004_index_acces'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='opportunite',
+            name='date_cloture',
+            field=models.DateTimeField(blank=True, editable=False, help_text="Date du passage au statut gagnée ou perdue ; vide tant que l'opportunité est ouverte.", null=True, verbose_name='Date de clôture'),
+        ),
+        # Sans historique des statuts, la dernière modification tient lieu de date de clôture.
+        migrations.RunSQL(
+            sql="UPDATE gestion_commerciale_opportunite SET date_cloture = date_mise_a_jour "
+                "WHERE statut IN ('gagnee', 'perdue');",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='opportunite',
+            index=models.Index(condition=models.Q(('date_cloture__isnull', False)), fields=['date_cloture'], name='opportunite_cloture_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:13
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_commerciale', '0005_date_cloture'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoublonPotentiel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(help_text='Ressemblance estimée, de 0 à 1.')),
+                ('motifs', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=20), help_text='Clés de regroupement partagées par les deux fiches (téléphone, e-mail, nom...).', size=None)),
+                ('statut', models.CharField(choices=[('a_examiner', 'À examiner'), ('ignore', 'Ignoré'), ('fusionne', 'Fusionné')], default='a_examiner', max_length=10)),
+                ('date_detection', models.DateTimeField(default=django.utils.timezone.now)),
+                ('date_examen', models.DateTimeField(blank=True, null=True)),
+                ('entreprise_a', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion_commerciale.entreprise')),
+                ('entreprise_b', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion_commerciale.entreprise')),
+                ('examine_par', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('particulier_a', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion_commerciale.particulier')),
+                ('particulier_b', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion_commerciale.particulier')),
+            ],
+            options={
+                'verbose_name': 'Doublon potentiel',
+                'verbose_name_plural': 'Doublons potentiels',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['statut', '-score', '-id'], name='doublon_file_idx')],
+                'constraints': [models.UniqueConstraint(fields=('particulier_a', 'particulier_b'), name='doublon_particuliers_unique'), models.UniqueConstraint(fields=('entreprise_a', 'entreprise_b'), name='doublon_entreprises_unique'), models.CheckConstraint(condition=models.Q(models.Q(('entreprise_a__isnull', True), ('entreprise_b__isnull', True), ('particulier_a__lt', models.F('particulier_b'))), models.Q(('entreprise_a__lt', models.F('entreprise_b')), ('particulier_a__isnull', True), ('particulier_b__isnull', True)), _connector='OR'), name='doublon_paire_ordonnee')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_commerciale', '0006_doublons'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='doublonpotentiel',
+            name='statut',
+            field=models.CharField(choices=[('a_examiner', 'À examiner'), ('ignore', 'Ignoré')], default='a_examiner', max_length=10),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue_service', '0004_index_acces'),
+        ('gestion_commerciale', '0007_statut_doublon'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpportuniteArchivee',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('nom', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('statut', models.CharField(choices=[('qualification', 'Qualification'), ('negociation', 'Négociation'), ('gagnee', 'Gagnée'), ('perdue', 'Perdue')], max_length=13)),
+                ('montant', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('date_creation', models.DateTimeField()),
+                ('date_mise_a_jour', models.DateTimeField()),
+                ('date_cloture', models.DateTimeField(blank=True, null=True, verbose_name='Date de clôture')),
+                ('date_archivage', models.DateTimeField(default=django.utils.timezone.now, verbose_name="Date d'archivage")),
+                ('vecteur_recherche', models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('nom', config='francais_sans_accents', weight='A'), '||', django.contrib.postgres.search.SearchVector('description', config='francais_sans_accents', weight='B'), django.contrib.postgres.search.SearchConfig('francais_sans_accents')), output_field=django.contrib.postgres.search.SearchVectorField())),
+                ('client_entreprise', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='opportunites_archivees_entreprise', to='gestion_commerciale.entreprise')),
+                ('client_particulier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='opportunites_archivees_particulier', to='gestion_commerciale.particulier')),
+                ('responsable', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalogue_service.service')),
+            ],
+            options={
+                'verbose_name': 'Opportunité archivée',
+                'verbose_name_plural': 'Opportunités archivées',
+                'ordering': ['-date_creation'],
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['vecteur_recherche'], name='archive_recherche_gin'), django.contrib.postgres.indexes.GinIndex(fields=['nom'], name='archive_nom_trgm', opclasses=['gin_trgm_ops'])],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:42
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+import gestion_commerciale.lookups
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue_service', '0004_index_acces'),
+        ('gestion_commerciale', '0008_opportunites_archivees'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # unaccent() n'est que STABLE (dictionnaire lu à l'exécution) : une fonction à
+        # dictionnaire explicite peut être déclarée IMMUTABLE et servir dans un index.
+        migrations.RunSQL(
+            sql="""
+                CREATE FUNCTION sans_accents(text) RETURNS text
+                LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+                AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+            """,
+            reverse_sql="DROP FUNCTION sans_accents(text);",
+        ),
+        migrations.AddIndex(
+            model_name='entreprise',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(gestion_commerciale.lookups.SansAccents(django.db.models.functions.text.Lower('nom_entreprise')), name='gin_trgm_ops'), name='entreprise_nom_sa_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='opportunite',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(gestion_commerciale.lookups.SansAccents(django.db.models.functions.text.Lower('nom')), name='gin_trgm_ops'), name='opportunite_nom_sa_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='particulier',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(gestion_commerciale.lookups.SansAccents(django.db.models.functions.text.Lower('nom')), name='gin_trgm_ops'), name='particulier_nom_sa_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='particulier',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(gestion_commerciale.lookups.SansAccents(django.db.models.functions.text.Lower('prenom')), name='gin_trgm_ops'), name='particulier_prenom_sa_trgm'),
+        ),
+    ]
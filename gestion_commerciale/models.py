@@ -1,9 +1,16 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
 from django.core.validators import MinLengthValidator, MaxLengthValidator, RegexValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
+from catalogue_service.cache import objet_catalogue
 from catalogue_service.models import Service
+from .lookups import forme_normalisee
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 
 User = get_user_model()
 
@@ -56,6 +63,9 @@ STATUT_OPPORTUNITE_CHOICES = [
     ('perdue', 'Perdue'),
 ]
 
+# Statuts qui clôturent une opportunité (date_cloture renseignée).
+STATUTS_CLOS = ('gagnee', 'perdue')
+
 SOURCE_CHOICES = [
     ('telephone', 'Appel Téléphonique'),
     ('web', 'Site Web'),
@@ -83,6 +93,27 @@ TYPE_RELATION_CHOICES = [
     ('client', 'Client'),
 ]
 
+STATUT_DOUBLON_CHOICES = [
+    ('a_examiner', 'À examiner'),
+    ('ignore', 'Ignoré'),
+]
+
+# Configuration plein texte « french » précédée de unaccent (migration 0003).
+CONFIG_RECHERCHE = 'francais_sans_accents'
+
+
+def vecteur_recherche(*champs_ponderes):
+    """Colonne tsvector générée par PostgreSQL à partir de (champ, poids)."""
+    expression = None
+    for champ, poids in champs_ponderes:
+        vecteur = SearchVector(champ, weight=poids, config=CONFIG_RECHERCHE)
+        expression = vecteur if expression is None else expression + vecteur
+    return models.GeneratedField(
+        expression=expression,
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
 
 class BaseModelTracking(models.Model):
     date_creation = models.DateTimeField(
@@ -173,23 +204,27 @@ class Particulier(BaseModelTracking, BaseAdresseInfo, BaseContactInfo):
         default='prospect',
         help_text="Le type de relation avec ce particulier."
     )
+    vecteur_recherche = vecteur_recherche(('nom', 'A'), ('prenom', 'A'), ('email', 'B'), ('ville', 'C'))
 
     class Meta:
         verbose_name = "Particulier"
         verbose_name_plural = "Particuliers"
         ordering = ['nom', 'prenom']
+        indexes = [
+            GinIndex(fields=['vecteur_recherche'], name='particulier_recherche_gin'),
+            GinIndex(fields=['nom'], name='particulier_nom_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['prenom'], name='particulier_prenom_trgm', opclasses=['gin_trgm_ops']),
+            # Filtres « contient » de la liste (lookups.Contient).
+            GinIndex(OpClass(forme_normalisee('nom'), name='gin_trgm_ops'), name='particulier_nom_sa_trgm'),
+            GinIndex(OpClass(forme_normalisee('prenom'), name='gin_trgm_ops'), name='particulier_prenom_sa_trgm'),
+            # Liste paginée par curseur (nom, prenom, id), avec et sans périmètre commercial.
+            models.Index(fields=['nom', 'prenom', 'id'], name='particulier_tri_idx'),
+            models.Index(fields=['responsable', 'nom', 'prenom', 'id'], name='particulier_resp_tri_idx'),
+        ]
 
     def __str__(self):
         return f"{self.prenom} {self.nom}"
 
-    def update_relation_type(self):
-        gagné_count = self.opportunites_particulier.filter(statut='gagnee').count()
-        if gagné_count >= 1:
-            self.type_relation = 'client'
-        else:
-            self.type_relation = 'prospect'
-            self.save()
-
 
 class Entreprise(BaseModelTracking, BaseAdresseInfo, BaseContactInfo):
     ice = models.CharField(
@@ -252,23 +287,24 @@ class Entreprise(BaseModelTracking, BaseAdresseInfo, BaseContactInfo):
         default='prospect',
         help_text="Le type de relation avec cette entreprise."
     )
+    vecteur_recherche = vecteur_recherche(('nom_entreprise', 'A'), ('ice', 'B'), ('email', 'B'), ('ville', 'C'))
 
     class Meta:
         verbose_name = "Entreprise"
         verbose_name_plural = "Entreprises"
         ordering = ['nom_entreprise']
+        indexes = [
+            GinIndex(fields=['vecteur_recherche'], name='entreprise_recherche_gin'),
+            GinIndex(fields=['nom_entreprise'], name='entreprise_nom_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['ice'], name='entreprise_ice_trgm', opclasses=['gin_trgm_ops']),
+            # Filtre « contient » de la liste (lookups.Contient).
+            GinIndex(OpClass(forme_normalisee('nom_entreprise'), name='gin_trgm_ops'), name='entreprise_nom_sa_trgm'),
+            models.Index(fields=['responsable', 'nom_entreprise', 'id'], name='entreprise_resp_tri_idx'),
+        ]
 
     def __str__(self):
         return self.nom_entreprise
 
-    def update_relation_type(self):
-        gagné_count = self.opportunites_entreprise.filter(statut='gagnee').count()
-        if gagné_count >= 1:
-            self.type_compte = 'client'
-        else:
-            self.type_compte = 'prospect'
-            self.save()
-
 
 class Opportunite(BaseModelTracking):
     nom = models.CharField(
@@ -324,21 +360,81 @@ class Opportunite(BaseModelTracking):
         verbose_name="Service associé",
         help_text="Le service ou produit unique inclus dans cette opportunité."
     )
+    date_cloture = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Date de clôture",
+        help_text="Date du passage au statut gagnée ou perdue ; vide tant que l'opportunité est ouverte."
+    )
+    vecteur_recherche = vecteur_recherche(('nom', 'A'), ('description', 'B'))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._etat_client = instance._lire_etat_client()
+        return instance
+
+    def _lire_etat_client(self):
+        champs = ('statut', 'client_particulier_id', 'client_entreprise_id')
+        if any(champ not in self.__dict__ for champ in champs):
+            return None
+        return tuple(self.__dict__[champ] for champ in champs)
 
     def save(self, *args, **kwargs):
-        if self.service:
-            self.montant = self.service.prix
-            super().save(*args, **kwargs)
-        if self.statut == 'gagnee':
-            if self.client_particulier:
-                self.client_particulier.update_relation_type()
-            if self.client_entreprise:
-                self.client_entreprise.update_relation_type()
+        if self.service_id:
+            # Prix lu dans l'instantané du catalogue, avant d'ouvrir la transaction
+            # (un instantané chargé dans une transaction n'est pas gardé).
+            self.montant = (objet_catalogue(Service, self.service_id) or self.service).prix
+        # Date de clôture avant cet enregistrement : la période qu'il fait quitter (cumuls périodiques).
+        self._cloture_precedente = self.date_cloture
+        if self.statut not in STATUTS_CLOS:
+            self.date_cloture = None
+        elif self.date_cloture is None or (getattr(self, '_etat_client', None) and self._etat_client[0] != self.statut):
+            self.date_cloture = timezone.now()
+        self._enregistrer(*args, **kwargs)
+
+    # Atomique : les agrégats du tableau de bord sont mis à jour par post_save.
+    @transaction.atomic
+    def _enregistrer(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+
+        # Type des clients concernés (actuel et précédent), seulement si le statut ou le client a changé.
+        avant = getattr(self, '_etat_client', None)
+        apres = self._lire_etat_client()
+        if avant != apres and (avant is not None or self.statut == 'gagnee'):
+            etats = [apres] if avant is None else [avant, apres]
+            recalculer_types_clients(
+                particuliers={etat[1] for etat in etats},
+                entreprises={etat[2] for etat in etats},
+            )
+        self._etat_client = apres
 
     class Meta:
         verbose_name = "Opportunité"
         verbose_name_plural = "Opportunités"
         ordering = ['-date_creation']
+        indexes = [
+            GinIndex(fields=['vecteur_recherche'], name='opportunite_recherche_gin'),
+            GinIndex(fields=['nom'], name='opportunite_nom_trgm', opclasses=['gin_trgm_ops']),
+            # Filtre « contient » de la liste (lookups.Contient).
+            GinIndex(OpClass(forme_normalisee('nom'), name='gin_trgm_ops'), name='opportunite_nom_sa_trgm'),
+            # Liste paginée par curseur (-date_creation, -id), avec et sans périmètre commercial.
+            models.Index(fields=['-date_creation', '-id'], name='opportunite_tri_idx'),
+            models.Index(fields=['responsable', '-date_creation', '-id'], name='opportunite_resp_date_idx'),
+            # Répartition par statut (tableau de bord, filtres) pour un responsable.
+            models.Index(fields=['statut', 'responsable'], name='opportunite_statut_resp_idx'),
+            # Pipeline : seules les opportunités ouvertes, une petite fraction de la table.
+            models.Index(
+                fields=['responsable', '-date_creation'],
+                condition=models.Q(statut__in=['qualification', 'negociation']),
+                name='opportunite_ouvertes_idx',
+            ),
+            models.Index(fields=['date_mise_a_jour'], name='opportunite_maj_idx'),
+            # Cumuls périodiques : opportunités clôturées sur une période.
+            models.Index(fields=['date_cloture'], condition=models.Q(date_cloture__isnull=False),
+                         name='opportunite_cloture_idx'),
+        ]
 
     def clean(self):
         if not (self.client_particulier or self.client_entreprise):
@@ -348,4 +444,153 @@ class Opportunite(BaseModelTracking):
                 "Une opportunité ne peut être associée qu'à un seul client (particulier ou entreprise).")
 
     def __str__(self):
-        return self.nom
\ No newline at end of file
+        return self.nom
+
+
+class OpportuniteArchivee(models.Model):
+    """
+    Opportunité clôturée déplacée hors de la table courante par
+    archiver_opportunites, sous la même clé primaire. Ses champs sont copiés
+    tels quels (dates comprises) ; elle reste comptée dans les agrégats et
+    les cumuls et n'est lue que par la recherche et la fiche « avec archives ».
+    """
+    id = models.BigIntegerField(primary_key=True)
+    nom = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    statut = models.CharField(max_length=13, choices=STATUT_OPPORTUNITE_CHOICES)
+    montant = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    responsable = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    client_particulier = models.ForeignKey(
+        'Particulier',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='opportunites_archivees_particulier',
+    )
+    client_entreprise = models.ForeignKey(
+        'Entreprise',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='opportunites_archivees_entreprise',
+    )
+    service = models.ForeignKey(Service, on_delete=models.SET_NULL, null=True, related_name='+')
+    date_creation = models.DateTimeField()
+    date_mise_a_jour = models.DateTimeField()
+    date_cloture = models.DateTimeField(null=True, blank=True, verbose_name="Date de clôture")
+    date_archivage = models.DateTimeField(default=timezone.now, verbose_name="Date d'archivage")
+    vecteur_recherche = vecteur_recherche(('nom', 'A'), ('description', 'B'))
+
+    class Meta:
+        verbose_name = "Opportunité archivée"
+        verbose_name_plural = "Opportunités archivées"
+        ordering = ['-date_creation']
+        indexes = [
+            GinIndex(fields=['vecteur_recherche'], name='archive_recherche_gin'),
+            GinIndex(fields=['nom'], name='archive_nom_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
+    def __str__(self):
+        return self.nom
+
+
+class DoublonPotentiel(models.Model):
+    """
+    Paire de particuliers ou d'entreprises qui désignent probablement le même
+    client, trouvée par la détection de doublons (doublons.py) et soumise à
+    examen. La paire est ordonnée (clé de a < clé de b).
+    """
+    # Index : contrainte d'unicité de la paire.
+    particulier_a = models.ForeignKey(
+        Particulier, on_delete=models.CASCADE, null=True, blank=True, db_index=False, related_name='+',
+    )
+    particulier_b = models.ForeignKey(
+        Particulier, on_delete=models.CASCADE, null=True, blank=True, related_name='+',
+    )
+    # Index : contrainte d'unicité de la paire.
+    entreprise_a = models.ForeignKey(
+        Entreprise, on_delete=models.CASCADE, null=True, blank=True, db_index=False, related_name='+',
+    )
+    entreprise_b = models.ForeignKey(
+        Entreprise, on_delete=models.CASCADE, null=True, blank=True, related_name='+',
+    )
+    score = models.FloatField(help_text="Ressemblance estimée, de 0 à 1.")
+    motifs = ArrayField(
+        models.CharField(max_length=20),
+        help_text="Clés de regroupement partagées par les deux fiches (téléphone, e-mail, nom...).",
+    )
+    statut = models.CharField(max_length=10, choices=STATUT_DOUBLON_CHOICES, default='a_examiner')
+    date_detection = models.DateTimeField(default=timezone.now)
+    date_examen = models.DateTimeField(null=True, blank=True)
+    examine_par = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        verbose_name = "Doublon potentiel"
+        verbose_name_plural = "Doublons potentiels"
+        ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(fields=['particulier_a', 'particulier_b'], name='doublon_particuliers_unique'),
+            models.UniqueConstraint(fields=['entreprise_a', 'entreprise_b'], name='doublon_entreprises_unique'),
+            models.CheckConstraint(
+                condition=(
+                    models.Q(particulier_a__lt=models.F('particulier_b'), entreprise_a__isnull=True,
+                             entreprise_b__isnull=True)
+                    | models.Q(entreprise_a__lt=models.F('entreprise_b'), particulier_a__isnull=True,
+                               particulier_b__isnull=True)
+                ),
+                name='doublon_paire_ordonnee',
+            ),
+        ]
+        indexes = [
+            # File d'examen paginée par curseur (-score, -id) : paires en attente, les plus probables d'abord.
+            models.Index(fields=['statut', '-score', '-id'], name='doublon_file_idx'),
+        ]
+
+    @property
+    def fiches(self):
+        if self.particulier_a_id:
+            return self.particulier_a, self.particulier_b
+        return self.entreprise_a, self.entreprise_b
+
+    def __str__(self):
+        a, b = self.fiches
+        return f"{a} / {b} ({self.score:.2f})"
+
+
+def recalculer_types_clients(particuliers=(), entreprises=(), tous=False):
+    """
+    Recalcule Particulier.type_relation et Entreprise.type_compte (« client »
+    dès qu'une opportunité est gagnée, sinon « prospect ») pour les clients
+    donnés (liste de clés ou QuerySet de clés), ou pour tous avec
+    ``tous=True``. Deux UPDATE par modèle, quel que soit le nombre de
+    clients ; seules les lignes à corriger sont écrites.
+    Renvoie le nombre de clients modifiés.
+    """
+    modifies = 0
+    for model, champ_type, relation, pks in (
+        (Particulier, 'type_relation', 'client_particulier', particuliers),
+        (Entreprise, 'type_compte', 'client_entreprise', entreprises),
+    ):
+        if tous:
+            queryset = model.objects.all()
+        elif isinstance(pks, models.QuerySet):
+            # Sous-requête (ex. les clients d'un lot d'opportunités) : rien n'est chargé en Python.
+            queryset = model.objects.filter(pk__in=pks)
+        else:
+            pks = [pk for pk in pks if pk is not None]
+            if not pks:
+                continue
+            queryset = model.objects.filter(pk__in=pks)
+
+        # Une opportunité gagnée archivée fait toujours du client un client.
+        gagnees = (
+            Exists(Opportunite.objects.filter(**{relation: OuterRef('pk')}, statut='gagnee'))
+            | Exists(OpportuniteArchivee.objects.filter(**{relation: OuterRef('pk')}, statut='gagnee'))
+        )
+        # update() ne passe pas par auto_now : date_mise_a_jour est posée ici (clés des fragments de liste).
+        maintenant = timezone.now()
+        modifies += queryset.filter(gagnees).exclude(**{champ_type: 'client'}).update(
+            **{champ_type: 'client'}, date_mise_a_jour=maintenant)
+        modifies += queryset.filter(~gagnees).exclude(**{champ_type: 'prospect'}).update(
+            **{champ_type: 'prospect'}, date_mise_a_jour=maintenant)
+    return modifies
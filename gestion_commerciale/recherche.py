@@ -0,0 +1,135 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+from django.db.models import CharField, F, Q, Value
+from django.db.models.functions import Concat, Greatest
+from utils.permissions import est_manager_ou_plus
+from .models import Particulier, Entreprise, Opportunite, OpportuniteArchivee, User, CONFIG_RECHERCHE
+
+LIMITE_RESULTATS = 50
+
+
+def requete_plein_texte(terme):
+    """
+    Requête tsquery où chaque mot est un préfixe (« dup » trouve « Dupont »),
+    normalisée par la même configuration sans accents que les vecteurs.
+    """
+    mots = re.findall(r'\w+', terme)
+    if not mots:
+        return None
+    return SearchQuery(' & '.join(f'{mot}:*' for mot in mots), search_type='raw', config=CONFIG_RECHERCHE)
+
+
+def _rechercher(queryset, terme, requete, champs_trigramme):
+    similarites = [TrigramWordSimilarity(terme, champ) for champ in champs_trigramme]
+    similarite = similarites[0] if len(similarites) == 1 else Greatest(*similarites)
+    correspondance = Q(vecteur_recherche=requete)
+    for champ in champs_trigramme:
+        correspondance |= Q(**{f'{champ}__trigram_word_similar': terme})
+    return queryset.filter(correspondance).annotate(
+        rang=SearchRank(F('vecteur_recherche'), requete) + similarite
+    )
+
+
+def rechercher_particuliers(queryset, terme):
+    requete = requete_plein_texte(terme)
+    if requete is None:
+        return queryset.none()
+    return _rechercher(queryset, terme, requete, ['nom', 'prenom'])
+
+
+def rechercher_entreprises(queryset, terme):
+    requete = requete_plein_texte(terme)
+    if requete is None:
+        return queryset.none()
+    return _rechercher(queryset, terme, requete, ['nom_entreprise', 'ice'])
+
+
+def rechercher_opportunites(queryset, terme):
+    requete = requete_plein_texte(terme)
+    if requete is None:
+        return queryset.none()
+    return _rechercher(queryset, terme, requete, ['nom'])
+
+
+def recherche_globale(user, terme, limite=LIMITE_RESULTATS, inclure_archives=False):
+    """
+    Recherche unifiée : une seule requête UNION ALL classe ensemble les
+    particuliers, entreprises et opportunités visibles par l'utilisateur,
+    ainsi que les opportunités archivées avec ``inclure_archives``.
+    Renvoie des dictionnaires {pk, type_resultat, libelle, rang}.
+    """
+    if requete_plein_texte(terme) is None:
+        return []
+
+    particuliers = Particulier.objects.all()
+    entreprises = Entreprise.objects.all()
+    opportunites = Opportunite.objects.all()
+    archives = OpportuniteArchivee.objects.all()
+    if not est_manager_ou_plus(user):
+        particuliers = particuliers.filter(responsable=user)
+        entreprises = entreprises.filter(responsable=user)
+        opportunites = opportunites.filter(responsable=user)
+        archives = archives.filter(responsable=user)
+
+    def colonnes(queryset, type_resultat, libelle):
+        return queryset.order_by().annotate(
+            type_resultat=Value(type_resultat, output_field=CharField()),
+            libelle=libelle,
+        ).values('pk', 'type_resultat', 'libelle', 'rang')
+
+    autres = [
+        colonnes(rechercher_entreprises(entreprises, terme), 'entreprise', F('nom_entreprise')),
+        colonnes(rechercher_opportunites(opportunites, terme), 'opportunite', F('nom')),
+    ]
+    if inclure_archives:
+        autres.append(colonnes(rechercher_opportunites(archives, terme), 'opportunite_archivee', F('nom')))
+    union = colonnes(
+        rechercher_particuliers(particuliers, terme), 'particulier',
+        Concat('prenom', Value(' '), 'nom', output_field=CharField()),
+    ).union(*autres, all=True)
+    return list(union.order_by('-rang')[:limite])
+
+
+LIMITE_SUGGESTIONS = 20
+
+
+def _suggerer(queryset, terme, champs, limite):
+    """
+    Préfixe (ILIKE 'x%') ou similarité trigramme, les plus proches en premier.
+    Les deux conditions sont servies par l'index trigramme du champ (BitmapOr).
+    """
+    if terme:
+        correspondance = Q()
+        for champ in champs:
+            correspondance |= Q(**{f'{champ}__commence_par': terme})
+            correspondance |= Q(**{f'{champ}__trigram_word_similar': terme})
+        similarites = [TrigramWordSimilarity(terme, champ) for champ in champs]
+        queryset = queryset.filter(correspondance).annotate(
+            similarite=similarites[0] if len(similarites) == 1 else Greatest(*similarites)
+        ).order_by('-similarite', *queryset.model._meta.ordering)
+    return queryset[:limite]
+
+
+def suggestions(source, user, terme, limite=LIMITE_SUGGESTIONS):
+    """
+    Suggestions d'autocomplétion pour les listes déroulantes, limitées à
+    ``limite`` résultats et aux enregistrements visibles par l'utilisateur.
+    Renvoie des dictionnaires {id, texte}.
+    """
+    if source == 'particuliers':
+        queryset = Particulier.objects.only('nom', 'prenom')
+        if not est_manager_ou_plus(user):
+            queryset = queryset.filter(responsable=user)
+        queryset = _suggerer(queryset, terme, ['nom', 'prenom'], limite)
+    elif source == 'entreprises':
+        queryset = Entreprise.objects.only('nom_entreprise')
+        if not est_manager_ou_plus(user):
+            queryset = queryset.filter(responsable=user)
+        queryset = _suggerer(queryset, terme, ['nom_entreprise', 'ice'], limite)
+    elif source == 'responsables':
+        queryset = User.objects.only('username', 'first_name', 'last_name').order_by('last_name', 'first_name')
+        queryset = _suggerer(queryset, terme, ['last_name', 'first_name', 'username'], limite)
+    else:
+        raise ValueError(source)
+    return [{'id': obj.pk, 'texte': str(obj)} for obj in queryset]
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete
+from django.dispatch import Signal, receiver
+from .models import Opportunite, recalculer_types_clients
+
+# Encadrent une modification en masse (QuerySet.update, sans signal par ligne) d'un lot
+# d'opportunités ; arguments : queryset, le lot (filtré par clé primaire), valeurs, les
+# champs modifiés (statut et/ou responsable), et date, la nouvelle date_mise_a_jour.
+opportunites_avant_maj_groupee = Signal()
+opportunites_maj_groupee = Signal()
+
+# Envoyé après un import en masse (bulk_create, sans post_save par ligne) ; arguments : nombre.
+clients_importes = Signal()
+
+# Envoyé après la fusion d'un lot de fiches (UPDATE et DELETE ensemblistes) ; arguments : nombre.
+clients_fusionnes = Signal()
+
+# Envoyé après le déplacement d'un lot d'opportunités vers les archives (sans signal par ligne) ; arguments : nombre.
+opportunites_archivees = Signal()
+
+
+@receiver(post_delete, sender=Opportunite)
+def recalculer_type_client_supprime(sender, instance, **kwargs):
+    # Une opportunité gagnée supprimée peut faire repasser son client en prospect.
+    if instance.statut == 'gagnee':
+        recalculer_types_clients(
+            particuliers=[instance.client_particulier_id],
+            entreprises=[instance.client_entreprise_id],
+        )
@@ -1,16 +1,33 @@
+from django.core.cache import caches
 from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import Group
 from utilisateur.models import Utilisateur, Role
 from catalogue_service.models import Service, Categorie
-from .models import Particulier, Entreprise, Opportunite, STATUT_OPPORTUNITE_CHOICES
+from .models import Particulier, Entreprise, Opportunite, OpportuniteArchivee, DoublonPotentiel, STATUT_OPPORTUNITE_CHOICES, recalculer_types_clients
+from .actions import modifier_opportunites
+from .doublons import ignorer
+from .fusion import fusionner, resoudre
+from .importation import Importateur
+from .filters import EntrepriseFilter, OpportuniteFilter, ParticulierFilter
 from .forms import ParticulierForm, EntrepriseForm, OpportuniteForm
 from decimal import Decimal
-from datetime import date
+from datetime import date, timedelta
+from django.utils import timezone
 from django.core.exceptions import ValidationError
 from utils.permissions import est_commercial_ou_plus, est_manager_ou_plus
+from utils.pagination import KeysetPaginator
+from utils.testing import QueryBudgetTestMixin
+from unittest import mock
+from io import StringIO
+import csv
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
 
-class GestionCommercialeTest(TestCase):
+class GestionCommercialeTest(QueryBudgetTestMixin, TestCase):
     @classmethod
     def setUpTestData(cls):
         # Création des utilisateurs et des groupes
@@ -91,6 +108,7 @@ class GestionCommercialeTest(TestCase):
 
     def setUp(self):
         self.client = Client()
+        caches['template_fragments'].clear()
 
     # --- Tests de Vues et Permissions ---
 
@@ -173,6 +191,44 @@ class GestionCommercialeTest(TestCase):
         self.particulier1.refresh_from_db()
         self.assertEqual(self.particulier1.type_relation, 'client')
 
+    def test_type_client_suit_changements_et_suppressions(self):
+        """Perdre ou supprimer la seule opportunité gagnée fait repasser le client en prospect."""
+        opportunite = Opportunite.objects.create(
+            nom="Projet Gagné", statut="gagnee", responsable=self.commercial1,
+            client_entreprise=self.entreprise1, service=self.service
+        )
+        self.entreprise1.refresh_from_db()
+        self.assertEqual(self.entreprise1.type_compte, 'client')
+
+        opportunite = Opportunite.objects.get(pk=opportunite.pk)
+        opportunite.statut = 'perdue'
+        opportunite.save()
+        self.entreprise1.refresh_from_db()
+        self.assertEqual(self.entreprise1.type_compte, 'prospect')
+
+        opportunite.statut = 'gagnee'
+        opportunite.save()
+        opportunite.delete()
+        self.entreprise1.refresh_from_db()
+        self.assertEqual(self.entreprise1.type_compte, 'prospect')
+
+    def test_recalculer_types_clients(self):
+        """La commande corrige en quelques requêtes les types ayant dérivé."""
+        Opportunite.objects.create(
+            nom="Projet Gagné", statut="gagnee", responsable=self.commercial1,
+            client_particulier=self.particulier1, service=self.service
+        )
+        Particulier.objects.update(type_relation='prospect')
+        Entreprise.objects.update(type_compte='client')
+
+        sortie = StringIO()
+        with self.assertNumQueries(4):
+            call_command('recalculer_types_clients', stdout=sortie)
+        self.assertIn('3 client(s) mis à jour', sortie.getvalue())
+        self.particulier1.refresh_from_db()
+        self.assertEqual(self.particulier1.type_relation, 'client')
+        self.assertFalse(Entreprise.objects.filter(type_compte='client').exists())
+
     def test_opportunite_clean_one_client_only(self):
         """Une opportunité ne peut avoir qu'un seul client ou aucun."""
         # Tentative de créer une opportunité avec les deux clients
@@ -212,4 +268,577 @@ class GestionCommercialeTest(TestCase):
         form = OpportuniteForm(request=request)
         self.assertEqual(form.fields['client_particulier'].queryset.count(), 1)
         self.assertEqual(form.fields['client_entreprise'].queryset.count(), 1)
-        self.assertIn(self.particulier1, form.fields['client_particulier'].queryset)
\ No newline at end of file
+        self.assertIn(self.particulier1, form.fields['client_particulier'].queryset)
+
+    # --- Tests de la pagination par curseur ---
+
+    def test_opportunite_list_pagination_curseur(self):
+        """Les pages successives couvrent toutes les opportunités filtrées, sans doublon."""
+        for i in range(30):
+            Opportunite.objects.create(
+                nom=f"Lot {i:02d}", statut="qualification", responsable=self.commercial1,
+                client_particulier=self.particulier1, service=self.service
+            )
+        self.client.login(username='commercial1', password='password123')
+        response = self.client.get(reverse('opportunite_list'), {'statut': 'qualification'})
+        premiere_page = list(response.context['opportunites'])
+        self.assertEqual(len(premiere_page), 25)
+        self.assertFalse(response.context['page_obj'].has_previous())
+        self.assertTrue(response.context['page_obj'].has_next())
+        self.assertEqual(response.context['total_opportunites'], 30)
+
+        curseur = response.context['page_obj'].next_cursor
+        response = self.client.get(reverse('opportunite_list'), {'statut': 'qualification', 'curseur': curseur})
+        seconde_page = list(response.context['opportunites'])
+        self.assertEqual(len(seconde_page), 5)
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertFalse(set(premiere_page) & set(seconde_page))
+        self.assertEqual(response.context['total_opportunites'], 30)
+
+        curseur = response.context['page_obj'].previous_cursor
+        response = self.client.get(reverse('opportunite_list'), {'statut': 'qualification', 'curseur': curseur})
+        self.assertEqual(list(response.context['opportunites']), premiere_page)
+
+    def test_opportunite_list_total_estime_au_dela_du_seuil(self):
+        """Au-delà du seuil, le total affiché est l'estimation du planificateur."""
+        self.client.login(username='manager', password='password123')
+        with mock.patch('gestion_commerciale.views.OpportuniteListView.seuil_estimation', -1):
+            response = self.client.get(reverse('opportunite_list'))
+        self.assertTrue(response.context['page_obj'].total_estime)
+        self.assertContains(response, "Nombre total d'opportunités : environ")
+
+    def test_filtres_liste_sans_accents_par_index(self):
+        """Filtres « contient » insensibles à la casse et aux accents, servis par les index trigrammes."""
+        Particulier.objects.filter(pk=self.particulier2.pk).update(prenom='Marié')
+        filtres = [
+            (ParticulierFilter({'nom': 'DUPÔNT'}, queryset=Particulier.objects.all()), 'particulier_nom_sa_trgm'),
+            (ParticulierFilter({'prenom': 'marie'}, queryset=Particulier.objects.all()), 'particulier_prenom_sa_trgm'),
+            (EntrepriseFilter({'nom_entreprise': 'tech sol'}, queryset=Entreprise.objects.all()), 'entreprise_nom_sa_trgm'),
+            (EntrepriseFilter({'ice': '0000001'}, queryset=Entreprise.objects.all()), 'entreprise_ice_trgm'),
+            (OpportuniteFilter({'nom': 'projet'}, queryset=Opportunite.objects.all()), 'opportunite_nom_sa_trgm'),
+        ]
+        self.assertEqual(
+            [list(filtre.qs) for filtre, _ in filtres],
+            [[self.particulier2], [self.particulier2], [self.entreprise1], [self.entreprise1], [self.opportunite_gagnee]],
+        )
+        with connection.cursor() as cursor:
+            # Tables minuscules en test : sans cela, le parcours séquentiel l'emporterait.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            for filtre, index in filtres:
+                sql, params = filtre.qs.query.sql_with_params()
+                cursor.execute(f'EXPLAIN {sql}', params)
+                self.assertIn(f'Bitmap Index Scan on {index}', '\n'.join(ligne for ligne, in cursor.fetchall()))
+
+    def test_pagination_curseur_page_profonde_par_index(self):
+        """Une page atteinte par curseur part de sa position dans l'index, sans filtrer les lignes qui la précèdent."""
+        paginateur = KeysetPaginator(Opportunite.objects.all(), 25)
+        requete = paginateur.requete_apres(paginateur.valeurs(self.opportunite_negociation))[:26]
+        self.assertEqual(list(requete), [self.opportunite_gagnee])
+        sql, params = requete.query.sql_with_params()
+        with connection.cursor() as cursor:
+            # Table minuscule en test : sans cela, le parcours séquentiel l'emporterait.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(ligne for ligne, in cursor.fetchall())
+        self.assertIn('opportunite_tri_idx', plan)
+        self.assertRegex(plan, r'Index Cond: \(.*date_creation <= ')
+
+    def test_opportunite_list_curseur_invalide(self):
+        """Un curseur illisible renvoie une 404 plutôt qu'une erreur serveur."""
+        self.client.login(username='commercial1', password='password123')
+        response = self.client.get(reverse('opportunite_list'), {'curseur': 'pas-un-curseur'})
+        self.assertEqual(response.status_code, 404)
+
+
+    # --- Tests du cache des fragments ---
+
+    def test_liste_opportunites_lignes_en_cache(self):
+        """Une ligne est resservie telle quelle tant que ni l'opportunité ni son client ou son service ne changent."""
+        self.client.login(username='manager', password='password123')
+        self.client.get(reverse('opportunite_list'))
+
+        # Écriture sans date de mise à jour : la ligne vient du cache.
+        Opportunite.objects.filter(pk=self.opportunite_negociation.pk).update(nom="Audit SI complet")
+        self.assertContains(self.client.get(reverse('opportunite_list')), 'Audit SI\n')
+
+        self.entreprise1.nom_entreprise = 'Tech Solutions Maroc'
+        self.entreprise1.save()
+        self.service.nom = 'Développement Mobile'
+        self.service.save()
+        response = self.client.get(reverse('opportunite_list'))
+        self.assertContains(response, 'Audit SI complet')
+        self.assertContains(response, 'Tech Solutions Maroc')
+        self.assertNotContains(response, 'Développement Web')
+
+        modifier_opportunites(Opportunite.objects.filter(pk=self.opportunite_perdue.pk), statut='negociation')
+        response = self.client.get(reverse('opportunite_list'))
+        self.assertContains(response, '<td>Négociation</td>', count=2)
+
+    def test_liste_particuliers_type_recalcule(self):
+        """Le recalcul groupé du type de client date la modification : la ligne est rafraîchie."""
+        self.client.login(username='manager', password='password123')
+        self.client.get(reverse('particulier_list'))
+        Opportunite.objects.filter(pk=self.opportunite_perdue.pk).update(
+            client_particulier=self.particulier2, statut='gagnee')
+        recalculer_types_clients([self.particulier2.pk])
+        self.assertContains(self.client.get(reverse('particulier_list')), 'Client</span>', count=2)
+
+    # --- Tests des budgets de requêtes ---
+
+    def test_budget_requetes_vues(self):
+        """Le nombre de requêtes des vues ne dépend pas du nombre de lignes affichées."""
+        for i in range(10):
+            Opportunite.objects.create(
+                nom=f"Budget {i}", statut="negociation", responsable=self.commercial2,
+                client_entreprise=self.entreprise2 if i % 2 else None,
+                client_particulier=None if i % 2 else self.particulier2, service=self.service
+            )
+        self.entreprise1.contact_principal = self.particulier1
+        self.entreprise1.save()
+        self.client.login(username='manager', password='password123')
+        for url in [
+            reverse('particulier_list'), reverse('entreprise_list'), reverse('opportunite_list'),
+            reverse('particulier_detail', args=[self.particulier1.pk]),
+            reverse('entreprise_detail', args=[self.entreprise1.pk]),
+            reverse('opportunite_detail', args=[self.opportunite_gagnee.pk]),
+            reverse('particulier_create'), reverse('entreprise_create'), reverse('opportunite_create'),
+            reverse('particulier_update', args=[self.particulier1.pk]),
+            reverse('entreprise_update', args=[self.entreprise1.pk]),
+            reverse('opportunite_update', args=[self.opportunite_gagnee.pk]),
+            reverse('particulier_delete', args=[self.particulier1.pk]),
+            reverse('entreprise_delete', args=[self.entreprise1.pk]),
+            reverse('opportunite_delete', args=[self.opportunite_gagnee.pk]),
+            reverse('import_clients'),
+        ]:
+            with self.subTest(url=url):
+                self.assertRespecteBudget(url)
+
+    # --- Tests de la recherche ---
+
+    def test_recherche_insensible_aux_accents(self):
+        """La recherche plein texte ignore les accents et accepte les préfixes."""
+        Particulier.objects.create(
+            civilite='Mme', nom='Lefèvre', prenom='Hélène', email='helene.lefevre@example.com',
+            telephone='+212600000009', date_de_naissance=date(1980, 3, 3),
+            adresse='1 Rue des Écoles', ville='Fès', code_postal='30000', pays='Maroc',
+            responsable=self.commercial1
+        )
+        self.client.login(username='commercial1', password='password123')
+        response = self.assertRespecteBudget(reverse('recherche'), {'q': 'helene lefev'})
+        libelles = [resultat['libelle'] for resultat in response.context['resultats']]
+        self.assertEqual(libelles, ['Hélène Lefèvre'])
+
+    def test_recherche_globale_classe_et_respecte_les_roles(self):
+        """La recherche unifiée mélange les trois types et ne montre au commercial que ses données."""
+        self.client.login(username='commercial2', password='password123')
+        response = self.client.get(reverse('recherche'), {'q': 'tech'})
+        self.assertEqual(response.context['resultats'], [])
+
+        self.client.login(username='manager', password='password123')
+        response = self.client.get(reverse('recherche'), {'q': 'tech'})
+        resultats = response.context['resultats']
+        self.assertEqual(resultats[0]['type_resultat'], 'entreprise')
+        self.assertEqual(resultats[0]['pk'], self.entreprise1.pk)
+        self.assertContains(response, reverse('entreprise_detail', args=[self.entreprise1.pk]))
+
+    def test_maintenance_recherche(self):
+        """La commande de maintenance met à jour les statistiques et rapporte la taille des index."""
+        sortie = StringIO()
+        call_command('maintenance_recherche', stdout=sortie)
+        self.assertIn('particulier_recherche_gin', sortie.getvalue())
+
+    def test_benchmark_index(self):
+        """Le benchmark compare les plans sans puis avec index et laisse la base intacte."""
+        sortie = StringIO()
+        nb_opportunites = Opportunite.objects.count()
+        call_command('benchmark_index', lignes=200, responsables=3, stdout=sortie)
+        self.assertIn('AVANT', sortie.getvalue())
+        self.assertIn('opportunite_resp_date_idx', sortie.getvalue())
+        self.assertEqual(Opportunite.objects.count(), nb_opportunites)
+
+    # --- Tests de l'export CSV ---
+
+    def test_export_csv_filtre_et_perimetre(self):
+        """L'export reprend les filtres actifs et le périmètre du commercial, en flux."""
+        Opportunite.objects.create(
+            nom="Autre commercial", statut="negociation", responsable=self.commercial2,
+            client_particulier=self.particulier2, service=self.service
+        )
+        self.client.login(username='commercial1', password='password123')
+        response = self.client.get(reverse('opportunite_list'), {'statut': 'negociation', 'export': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            response['Content-Disposition'],
+            f"attachment; filename*=utf-8''opportunit%C3%A9s-{timezone.localdate():%Y%m%d}.csv",
+        )
+
+        with CaptureQueriesContext(connection) as requetes:
+            lignes = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(requetes), 1)
+        self.assertEqual(lignes[0].split(';')[:3], ["Nom de l'opportunité", 'Statut', 'Montant'])
+        self.assertEqual(len(lignes), 2)
+        self.assertTrue(lignes[1].startswith('Audit SI;Négociation;10000.00;'))
+
+    def test_export_csv_neutralise_formules(self):
+        """Une saisie commençant par =, +, -, @, tabulation ou CR est exportée en texte, pas en formule."""
+        noms = ['=HYPERLINK("http://x")', '+1+1', '-2+3', '@SUM(A1)', '\tonglet', '\rretour']
+        for nom in noms:
+            Opportunite.objects.create(
+                nom=nom, statut="qualification", responsable=self.commercial1,
+                client_particulier=self.particulier1, service=self.service
+            )
+        self.client.login(username='commercial1', password='password123')
+        response = self.client.get(reverse('opportunite_list'), {'statut': 'qualification', 'export': 'csv'})
+        contenu = b''.join(response.streaming_content).decode('utf-8-sig')
+        cellules = {ligne[0] for ligne in csv.reader(StringIO(contenu), delimiter=';')}
+        for nom in noms:
+            self.assertIn(f"'{nom}", cellules)
+            self.assertNotIn(nom, cellules)
+
+    # --- Tests de l'import en masse ---
+
+    def test_import_particuliers_csv(self):
+        """Import CSV : lignes valides insérées, doublons (base et fichier) et erreurs de formulaire rapportés."""
+        contenu = (
+            "civilite;nom;prenom;email;telephone;date_de_naissance;adresse;ville;code_postal;pays\n"
+            "M;Alami;Karim;karim@example.com;+212600000101;1990-01-01;1 Rue A;Fès;30000;Maroc\n"
+            "Mme;Bennani;Sara;john.doe@example.com;+212600000102;1991-02-02;2 Rue B;Fès;30000;Maroc\n"
+            "M;Chraibi;Omar;omar@example.com;+212600000101;1992-03-03;3 Rue C;Fès;30000;Maroc\n"
+            "M;Daoudi;Ali;ali@example.com;pas-un-numero;1993-04-04;4 Rue D;Fès;30000;Maroc\n"
+        ).encode()
+        fichier = SimpleUploadedFile('leads.csv', contenu, content_type='text/csv')
+        self.client.login(username='commercial1', password='password123')
+        response = self.client.post(reverse('import_clients'), {'type_client': 'particuliers', 'fichier': fichier})
+
+        resultat = response.context['resultat']
+        self.assertEqual((resultat['crees'], resultat['rejetees']), (1, 3))
+        self.assertEqual([(e['ligne'], e['champ']) for e in resultat['erreurs']],
+                         [(5, 'telephone'), (3, 'email'), (4, 'telephone')])
+        importe = Particulier.objects.get(email='karim@example.com')
+        self.assertEqual(importe.responsable, self.commercial1)
+
+    def test_import_doublon_concurrent(self):
+        """Un doublon inséré entre la vérification et l'insertion est rapporté par champ, sans le message SQL."""
+        erreurs = []
+        importateur = Importateur(
+            Particulier, self.commercial1, lambda numero, champ, message: erreurs.append((numero, champ, message)),
+        )
+        ligne = {
+            'civilite': 'M', 'nom': 'Alami', 'prenom': 'Karim', 'email': 'john.doe@example.com',
+            'telephone': '+212600000103', 'date_de_naissance': '1990-01-01', 'adresse': '1 Rue A',
+            'ville': 'Fès', 'code_postal': '30000', 'pays': 'Maroc',
+        }
+        # La vérification par lot ne voit pas le doublon, comme si la fiche existante venait d'être insérée.
+        with mock.patch('gestion_commerciale.importation._cle_unique', side_effect=lambda valeur: object()), \
+                self.assertLogs('gestion_commerciale.importation', 'WARNING'):
+            self.assertEqual(importateur.importer([ligne]), (0, 1))
+        verbose = Particulier._meta.get_field('email').verbose_name.capitalize()
+        self.assertEqual(erreurs, [(2, 'email', f"{verbose} déjà utilisé(e).")])
+
+    def test_import_entreprises_xlsx_commande(self):
+        """La commande importe un XLSX par lots et écrit le rapport d'erreurs (ICE invalide)."""
+        import csv
+        import os
+        import tempfile
+        from openpyxl import Workbook
+
+        classeur = Workbook()
+        feuille = classeur.active
+        feuille.append(['Nom de l\'entreprise', 'ice', 'statut_juridique', 'secteur_activite', 'email',
+                        'telephone', 'adresse', 'ville', 'code_postal', 'pays', 'nombre_employes'])
+        for i in range(1, 6):
+            feuille.append([f'Société {i}', f'{i:015d}'.replace('0', '9', 1), 'SARL', 'A', f'societe{i}@example.com',
+                            f'+2126000002{i:02d}', 'Adresse', 'Rabat', '10000', 'Maroc', 'micro'])
+        feuille.append(['Société X', '123', 'SARL', 'A', 'x@example.com',
+                        '+212600000299', 'Adresse', 'Rabat', '10000', 'Maroc', 'micro'])
+
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, 'entreprises.xlsx')
+            rapport = os.path.join(dossier, 'rapport.csv')
+            classeur.save(chemin)
+            sortie = StringIO()
+            call_command('importer_clients', chemin, type_client='entreprises', responsable='manager',
+                         rapport=rapport, taille_lot=2, stdout=sortie)
+            with open(rapport, encoding='utf-8') as f:
+                erreurs = list(csv.DictReader(f))
+
+        self.assertIn('5 ligne(s) importée(s), 1 rejetée(s)', sortie.getvalue())
+        self.assertEqual({(e['ligne'], e['champ']) for e in erreurs}, {('7', 'ice')})
+        self.assertEqual(Entreprise.objects.filter(responsable=self.manager, email__startswith='societe').count(), 5)
+
+    # --- Tests de l'autocomplétion ---
+
+    def test_autocompletion_prefixe_et_perimetre(self):
+        """L'API d'autocomplétion trouve par préfixe et ne sort pas du périmètre du commercial."""
+        self.client.login(username='commercial1', password='password123')
+        response = self.assertRespecteBudget(reverse('autocompletion', args=['particuliers']), {'q': 'Do'})
+        self.assertEqual(response.json()['resultats'], [{'id': self.particulier1.pk, 'texte': 'John Doe'}])
+
+        response = self.client.get(reverse('autocompletion', args=['particuliers']), {'q': 'Dup'})
+        self.assertEqual(response.json()['resultats'], [])
+
+        response = self.client.get(reverse('autocompletion', args=['responsables']))
+        self.assertEqual(response.status_code, 403)
+
+    def test_autocompletion_par_index(self):
+        """Préfixe et similarité sont servis par l'index trigramme du champ, sans parcours de la table."""
+        self.client.login(username='manager', password='password123')
+        response = self.client.get(reverse('autocompletion', args=['particuliers']), {'q': 'Dup'})
+        self.assertEqual(response.json()['resultats'][0]['id'], self.particulier2.pk)
+        for champ, index in (('nom', 'particulier_nom_trgm'), ('prenom', 'particulier_prenom_trgm')):
+            for lookup in ('commence_par', 'trigram_word_similar'):
+                with self.subTest(champ=champ, lookup=lookup):
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+                        plan = Particulier.objects.filter(**{f'{champ}__{lookup}': 'Dup'}).order_by().explain()
+                    self.assertIn(f'Bitmap Index Scan on {index}', plan)
+
+    def test_autocompletion_responsables_par_index(self):
+        """Chaque champ de l'autocomplétion des responsables a son index trigramme."""
+        champs = (
+            ('last_name', 'utilisateur_nom_trgm'), ('first_name', 'utilisateur_prenom_trgm'),
+            ('username', 'utilisateur_username_trgm'),
+        )
+        for champ, index in champs:
+            for lookup in ('commence_par', 'trigram_word_similar'):
+                with self.subTest(champ=champ, lookup=lookup):
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+                        plan = Utilisateur.objects.filter(**{f'{champ}__{lookup}': 'Dup'}).order_by().explain()
+                    self.assertIn(f'Bitmap Index Scan on {index}', plan)
+
+    def test_autocompletion_trigramme(self):
+        """Une faute de frappe est rattrapée par la similarité trigramme."""
+        self.client.login(username='manager', password='password123')
+        response = self.client.get(reverse('autocompletion', args=['entreprises']), {'q': 'Inovate'})
+        self.assertEqual(response.json()['resultats'][0]['id'], self.entreprise2.pk)
+
+    def test_opportunite_form_ne_rend_que_le_client_selectionne(self):
+        """Le formulaire ne rend plus la liste complète des clients, seulement la sélection."""
+        self.client.login(username='manager', password='password123')
+        response = self.client.get(reverse('opportunite_update', args=[self.opportunite_gagnee.pk]))
+        self.assertContains(response, 'John Doe')
+        self.assertNotContains(response, 'Marie Dupont')
+        self.assertNotContains(response, 'Innovate Co')
+        self.assertContains(response, reverse('autocompletion', args=['particuliers']))
+
+    # --- Tests des actions groupées ---
+
+    def test_action_groupee_statut_selection(self):
+        """Changement de statut sur la sélection : hors périmètre ignoré, types clients et agrégats à jour."""
+        from tableau_de_bord import agregats
+        autre = Opportunite.objects.create(
+            nom="Autre commercial", statut="negociation", responsable=self.commercial2,
+            client_entreprise=self.entreprise2, service=self.service
+        )
+        self.client.login(username='commercial1', password='password123')
+        response = self.client.post(
+            reverse('opportunite_list') + '?statut=negociation',
+            {'opportunites': [self.opportunite_negociation.pk, autre.pk], 'statut': 'gagnee'},
+        )
+        self.assertRedirects(response, reverse('opportunite_list') + '?statut=negociation')
+
+        self.opportunite_negociation.refresh_from_db()
+        autre.refresh_from_db()
+        self.assertEqual(self.opportunite_negociation.statut, 'gagnee')
+        self.assertEqual(autre.statut, 'negociation')
+        self.entreprise1.refresh_from_db()
+        self.assertEqual(self.entreprise1.type_compte, 'client')
+        self.assertEqual(agregats.reconstruire(), 0)
+
+    def test_action_groupee_reaffectation_ensemble_filtre(self):
+        """« Tout sélectionner » s'applique à l'ensemble filtré ; la réaffectation est réservée aux managers."""
+        self.client.login(username='manager', password='password123')
+        self.client.post(
+            reverse('opportunite_list') + '?statut=gagnee',
+            {'tout_selectionner': 'on', 'responsable': self.commercial2.pk},
+        )
+        self.assertEqual(
+            set(Opportunite.objects.filter(responsable=self.commercial2).values_list('pk', flat=True)),
+            {self.opportunite_gagnee.pk},
+        )
+
+        self.client.login(username='commercial1', password='password123')
+        response = self.client.get(reverse('opportunite_list'))
+        self.assertNotIn('responsable', response.context['action_form'].fields)
+        response = self.client.post(
+            reverse('opportunite_list'),
+            {'opportunites': [self.opportunite_perdue.pk], 'responsable': self.commercial1.pk},
+            follow=True,
+        )
+        self.assertContains(response, "Choisissez un nouveau statut ou un nouveau responsable.")
+        self.opportunite_perdue.refresh_from_db()
+        self.assertEqual(self.opportunite_perdue.responsable, self.commercial1)
+
+    # --- Tests du générateur de données et du benchmark des vues ---
+
+    def test_generer_donnees(self):
+        """Le générateur insère à l'échelle demandée des données cohérentes (rôles, clients, agrégats)."""
+        from tableau_de_bord import agregats
+        nb_opportunites = Opportunite.objects.count()
+        call_command(
+            'generer_donnees', administrateurs=1, managers=1, commerciaux=3, categories=2, services=4,
+            particuliers=30, entreprises=20, opportunites=100, taille_lot=40, graine=1, stdout=StringIO(),
+        )
+        self.assertEqual(Particulier.objects.count(), 2 + 30)
+        self.assertEqual(Entreprise.objects.count(), 2 + 20)
+        self.assertEqual(Opportunite.objects.count(), nb_opportunites + 100)
+        commercial = Utilisateur.objects.filter(role=Role.COMMERCIAL, username__endswith='_commercial_1').get()
+        self.assertTrue(est_commercial_ou_plus(commercial))
+        self.assertFalse(Opportunite.objects.filter(client_particulier__isnull=True, client_entreprise__isnull=True).exists())
+        self.assertTrue(Particulier.objects.filter(type_relation='client').exists())
+        # Montant = prix du service, comme Opportunite.save() ; aucun sans service.
+        self.assertFalse(Opportunite.objects.filter(service__isnull=False).exclude(montant=F('service__prix')).exists())
+        self.assertFalse(Opportunite.objects.filter(service__isnull=True, montant__isnull=False).exists())
+        self.assertEqual(agregats.reconstruire(), 0)
+
+    def test_benchmark_vues(self):
+        """Le benchmark mesure chaque vue, enregistre les résultats et les compare à l'exécution précédente."""
+        import json
+        import tempfile
+        from pathlib import Path
+        with tempfile.TemporaryDirectory() as dossier:
+            sortie = Path(dossier) / 'vues.jsonl'
+            call_command('benchmark_vues', vues=['opportunite_list', 'service_detail'], repetitions=2,
+                         sortie=str(sortie), stdout=StringIO())
+            texte = StringIO()
+            call_command('benchmark_vues', vues=['opportunite_list'], repetitions=2, sortie=str(sortie),
+                         comparer='', stdout=texte)
+            executions = [json.loads(ligne) for ligne in sortie.read_text().splitlines()]
+        self.assertEqual(len(executions), 2)
+        mesure = executions[0]['resultats']["opportunite_list [commercial]"]
+        self.assertEqual(mesure['statut'], 200)
+        self.assertGreater(mesure['requetes'], 0)
+        self.assertIn('service_detail [manager]', executions[0]['resultats'])
+        self.assertIn('Comparaison avec', texte.getvalue())
+
+    def test_detecter_doublons(self):
+        """Les quasi-doublons sont mis en file ; les fiches distinctes et les paires écartées n'y entrent pas."""
+        double = Particulier.objects.create(
+            civilite='M', nom='DOE', prenom='Jöhn', email='john.doe.pro@gmail.com',
+            telephone='+33600000000', date_de_naissance=date(1990, 1, 1),
+            adresse='1 Rue', ville='Casablanca', code_postal='20000', pays='Maroc',
+        )
+        homonyme = Particulier.objects.create(
+            civilite='Mme', nom='Dupont', prenom='Léa', email='lea.dupont@example.com',
+            telephone='+212600000009', date_de_naissance=date(1970, 3, 3),
+            adresse='2 Rue', ville='Rabat', code_postal='10000', pays='Maroc',
+        )
+        societe = Entreprise.objects.create(
+            nom_entreprise='Sté Tech-Solutions SARL', ice='000000000000003',
+            statut_juridique='SARL', secteur_activite='A', email='ventes@tech.com',
+            telephone='+212500000009', adresse='1 Bd', ville='Casablanca', code_postal='20000', pays='Maroc',
+        )
+        sortie = StringIO()
+        call_command('detecter_doublons', stdout=sortie)
+        self.assertIn('Détection terminée', sortie.getvalue())
+
+        particuliers = DoublonPotentiel.objects.filter(particulier_a__isnull=False)
+        self.assertEqual(
+            [(d.particulier_a, d.particulier_b) for d in particuliers], [(self.particulier1, double)],
+        )
+        self.assertIn('telephone', particuliers[0].motifs)
+        self.assertNotIn(homonyme.pk, particuliers.values_list('particulier_b', flat=True))
+        entreprises = DoublonPotentiel.objects.filter(entreprise_a__isnull=False)
+        self.assertEqual([(d.entreprise_a, d.entreprise_b) for d in entreprises], [(self.entreprise1, societe)])
+        self.assertEqual(entreprises[0].score, 0.9)
+
+        ignorer(particuliers, self.manager)
+        call_command('detecter_doublons', type=['particuliers'], stdout=sortie)
+        self.assertEqual(particuliers.get().statut, 'ignore')
+
+    def test_file_doublons(self):
+        """File d'examen réservée aux managers, dans son budget de requêtes ; une paire écartée en sort."""
+        doublon = DoublonPotentiel.objects.create(
+            particulier_a=self.particulier1, particulier_b=self.particulier2, score=0.7, motifs=['ville_nom'],
+        )
+        self.client.login(username='commercial1', password='password123')
+        self.assertEqual(self.client.get(reverse('doublon_list')).status_code, 403)
+
+        self.client.login(username='manager', password='password123')
+        response = self.assertRespecteBudget(reverse('doublon_list'))
+        self.assertContains(response, 'Marie Dupont')
+        response = self.client.get(reverse('doublon_list'), {'type_client': 'entreprises'})
+        self.assertNotContains(response, 'Marie Dupont')
+
+        self.client.post(reverse('doublon_list'), {'doublons': [doublon.pk], 'action': 'ignorer'})
+        doublon.refresh_from_db()
+        self.assertEqual((doublon.statut, doublon.examine_par), ('ignore', self.manager))
+        self.assertNotContains(self.client.get(reverse('doublon_list')), 'Marie Dupont')
+
+    def test_fusionner(self):
+        """Références reportées sur la fiche conservée, champs vides repris, type recalculé, fiches absorbées supprimées."""
+        self.assertEqual(resoudre([(1, 2), (2, 3), (3, 1), (4, 3)]), {2: 4, 3: 4, 1: 4})
+        Particulier.objects.filter(pk=self.particulier1.pk).update(notes_supplementaires='Client fidèle')
+        Particulier.objects.filter(pk=self.particulier2.pk).update(responsable=None, notes_supplementaires='')
+        doublon = Particulier.objects.create(
+            civilite='M', nom='Doe', prenom='J.', email='jdoe@example.com', telephone='+212600000009',
+            date_de_naissance=date(1990, 1, 1), ville='Casablanca', pays='Maroc', notes_supplementaires='Rappeler',
+        )
+        Entreprise.objects.filter(pk=self.entreprise2.pk).update(contact_principal=doublon)
+        en_attente = DoublonPotentiel.objects.create(
+            particulier_a=self.particulier1, particulier_b=doublon, score=0.9, motifs=['ville_nom'],
+        )
+
+        # Le doublon rejoint particulier1, qui rejoint à son tour particulier2 : une chaîne, un seul lot.
+        absorbees = fusionner(Particulier, [(self.particulier1.pk, doublon.pk), (self.particulier2.pk, self.particulier1.pk)])
+        self.assertEqual(absorbees, 2)
+        self.assertFalse(Particulier.objects.filter(pk__in=[self.particulier1.pk, doublon.pk]).exists())
+        self.assertFalse(DoublonPotentiel.objects.filter(pk=en_attente.pk).exists())
+
+        conservee = Particulier.objects.get(pk=self.particulier2.pk)
+        self.assertEqual(conservee.type_relation, 'client')
+        self.assertEqual(conservee.responsable, self.commercial1)
+        self.assertEqual(conservee.notes_supplementaires, 'Client fidèle\n\nRappeler')
+        self.assertEqual(conservee.email, 'marie.dupont@example.com')
+        self.assertEqual(
+            set(Opportunite.objects.filter(client_particulier=conservee).values_list('pk', flat=True)),
+            {self.opportunite_gagnee.pk, self.opportunite_perdue.pk},
+        )
+        self.assertEqual(Entreprise.objects.get(pk=self.entreprise2.pk).contact_principal, conservee)
+
+    def test_archiver_opportunites(self):
+        """Seules les opportunités clôturées depuis assez longtemps passent aux archives, visibles sur demande."""
+        Opportunite.objects.filter(pk=self.opportunite_gagnee.pk).update(
+            date_cloture=timezone.now() - timedelta(days=800),
+        )
+        sortie = StringIO()
+        call_command('archiver_opportunites', stdout=sortie)
+        self.assertIn('1 opportunité(s) archivée(s)', sortie.getvalue())
+        self.assertFalse(Opportunite.objects.filter(pk=self.opportunite_gagnee.pk).exists())
+        archivee = OpportuniteArchivee.objects.get(pk=self.opportunite_gagnee.pk)
+        self.assertEqual(
+            (archivee.nom, archivee.client_particulier, archivee.date_creation),
+            ("Projet Web", self.particulier1, self.opportunite_gagnee.date_creation),
+        )
+        self.assertEqual(Opportunite.objects.count(), 2)
+
+        # Un client dont la vente gagnée est archivée reste client.
+        Particulier.objects.filter(pk=self.particulier1.pk).update(type_relation='prospect')
+        recalculer_types_clients(particuliers=[self.particulier1.pk])
+        self.assertEqual(Particulier.objects.get(pk=self.particulier1.pk).type_relation, 'client')
+
+        self.client.login(username='commercial1', password='password123')
+        url = reverse('opportunite_detail', args=[archivee.pk])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        response = self.assertRespecteBudget(url, {'archives': '1'})
+        self.assertContains(response, 'Archivée le')
+        self.assertNotContains(response, reverse('opportunite_update', args=[archivee.pk]))
+
+        self.assertNotContains(self.client.get(reverse('recherche'), {'q': 'Projet'}), 'Projet Web')
+        response = self.client.get(reverse('recherche'), {'q': 'Projet', 'archives': '1'})
+        self.assertContains(response, 'Opportunité archivée')
+        self.assertContains(response, f'{url}?archives=1')
+
+    def test_fusionner_depuis_la_file(self):
+        """La file d'examen fusionne les paires choisies en conservant la fiche demandée."""
+        doublon = DoublonPotentiel.objects.create(
+            entreprise_a=self.entreprise1, entreprise_b=self.entreprise2, score=0.8, motifs=['nom'],
+        )
+        self.client.login(username='manager', password='password123')
+        self.client.post(
+            reverse('doublon_list') + '?type_client=entreprises', {'doublons': [doublon.pk], 'action': 'fusionner_b'},
+        )
+        self.assertEqual(list(Entreprise.objects.values_list('pk', flat=True)), [self.entreprise2.pk])
+        self.assertEqual(Opportunite.objects.get(pk=self.opportunite_negociation.pk).client_entreprise, self.entreprise2)
+        self.assertFalse(DoublonPotentiel.objects.exists())
@@ -2,7 +2,8 @@ from django.urls import path
 from .views import (
     ParticulierListView, ParticulierDetailView, ParticulierCreateView, ParticulierUpdateView, ParticulierDeleteView,
     EntrepriseListView, EntrepriseDetailView, EntrepriseCreateView, EntrepriseUpdateView, EntrepriseDeleteView,
-    OpportuniteListView, OpportuniteDetailView, OpportuniteCreateView, OpportuniteUpdateView, OpportuniteDeleteView
+    OpportuniteListView, OpportuniteDetailView, OpportuniteCreateView, OpportuniteUpdateView, OpportuniteDeleteView,
+    RechercheView, AutocompletionView, ImportClientsView, DoublonListView
 )
 
 urlpatterns = [
@@ -23,4 +24,9 @@ urlpatterns = [
     path('opportunites/<int:pk>/', OpportuniteDetailView.as_view(), name='opportunite_detail'),
     path('opportunites/<int:pk>/update/', OpportuniteUpdateView.as_view(), name='opportunite_update'),
     path('opportunites/<int:pk>/delete/', OpportuniteDeleteView.as_view(), name='opportunite_delete'),
+
+    path('recherche/', RechercheView.as_view(), name='recherche'),
+    path('autocompletion/<str:source>/', AutocompletionView.as_view(), name='autocompletion'),
+    path('import/', ImportClientsView.as_view(), name='import_clients'),
+    path('doublons/', DoublonListView.as_view(), name='doublon_list'),
 ]
\ No newline at end of file
@@ -1,15 +1,37 @@
-from django.urls import reverse_lazy
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, JsonResponse
+from django.shortcuts import redirect
+from django.urls import reverse, reverse_lazy
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, View, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from .models import Particulier, Entreprise, Opportunite
-from .forms import ParticulierForm, EntrepriseForm, OpportuniteForm
+from .models import Particulier, Entreprise, Opportunite, OpportuniteArchivee, DoublonPotentiel
+from .forms import ParticulierForm, EntrepriseForm, OpportuniteForm, ImportClientsForm, ActionGroupeeForm, ExamenDoublonsForm
 from .filters import ParticulierFilter, EntrepriseFilter, OpportuniteFilter
+from .actions import modifier_opportunites
+from .doublons import ignorer
+from .fusion import fusionner_doublons
+from .importation import FormatImportInvalide, Importateur, lire_lignes
+from .recherche import recherche_globale, suggestions
 from utils.permissions import est_commercial_ou_plus, est_manager_ou_plus
+from utils.export import ExportCSVMixin
+from utils.pagination import KeysetPaginationMixin
+from utils.relations import RelationsMixin, charger_relations
+from utils.routage import LectureReplicaMixin
 
-class ParticulierListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class ParticulierListView(LoginRequiredMixin, UserPassesTestMixin, LectureReplicaMixin, ExportCSVMixin, KeysetPaginationMixin, RelationsMixin, ListView):
     model = Particulier
     template_name = 'gestion_commerciale/particulier_list.html'
     context_object_name = 'particuliers'
+    relations = ('responsable',)
+    max_queries = 5
+    export_colonnes = (
+        ('civilite', 'Civilité'), ('nom', 'Nom'), ('prenom', 'Prénom'), ('email', 'E-mail'),
+        ('telephone', 'Téléphone'), ('date_de_naissance', 'Date de naissance'), ('adresse', 'Adresse'),
+        ('ville', 'Ville'), ('code_postal', 'Code Postal'), ('pays', 'Pays'), ('source', 'Source'),
+        ('type_relation', 'Type de relation'), ('responsable__username', 'Responsable'),
+        ('date_creation', 'Date de création'),
+    )
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
@@ -26,13 +48,14 @@ class ParticulierListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filter'] = self.filterset
-        context['total_particuliers'] = self.get_queryset().count()
+        context['total_particuliers'] = context['page_obj'].total
         context['peut_voir_responsable'] = est_manager_ou_plus(self.request.user)
         return context
 
-class ParticulierDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+class ParticulierDetailView(LoginRequiredMixin, UserPassesTestMixin, LectureReplicaMixin, RelationsMixin, DetailView):
     model = Particulier
     template_name = 'gestion_commerciale/particulier_detail.html'
+    max_queries = 4
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
@@ -42,11 +65,12 @@ class ParticulierDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView)
         context['peut_voir_responsable'] = est_manager_ou_plus(self.request.user)
         return context
 
-class ParticulierCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
+class ParticulierCreateView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, CreateView):
     model = Particulier
     form_class = ParticulierForm
     template_name = 'gestion_commerciale/particulier_form.html'
     success_url = reverse_lazy('particulier_list')
+    max_queries = 3
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
@@ -55,27 +79,39 @@ class ParticulierCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView)
         form.instance.responsable = self.request.user
         return super().form_valid(form)
 
-class ParticulierUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class ParticulierUpdateView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, UpdateView):
     model = Particulier
     form_class = ParticulierForm
     template_name = 'gestion_commerciale/particulier_form.html'
     success_url = reverse_lazy('particulier_list')
+    max_queries = 4
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
 
-class ParticulierDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class ParticulierDeleteView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, DeleteView):
     model = Particulier
     template_name = 'gestion_commerciale/particulier_confirm_delete.html'
     success_url = reverse_lazy('particulier_list')
+    max_queries = 4
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
 
-class EntrepriseListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class EntrepriseListView(LoginRequiredMixin, UserPassesTestMixin, LectureReplicaMixin, ExportCSVMixin, KeysetPaginationMixin, RelationsMixin, ListView):
     model = Entreprise
     template_name = 'gestion_commerciale/entreprise_list.html'
     context_object_name = 'entreprises'
+    relations = ('responsable',)
+    max_queries = 5
+    export_colonnes = (
+        ('nom_entreprise', "Nom de l'entreprise"), ('ice', 'ICE'), ('statut_juridique', 'Statut Juridique'),
+        ('secteur_activite', "Secteur d'Activité"), ('email', 'E-mail'), ('telephone', 'Téléphone'),
+        ('website', 'Site Web'), ('adresse', 'Adresse'), ('ville', 'Ville'), ('code_postal', 'Code Postal'),
+        ('pays', 'Pays'), ('nombre_employes', "Nombre d'employés"), ('type_compte', 'Type de compte'),
+        ('contact_principal__email', 'Contact Principal'), ('responsable__username', 'Responsable'),
+        ('date_creation', 'Date de création'),
+    )
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
@@ -92,13 +128,15 @@ class EntrepriseListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filter'] = self.filterset
-        context['total_entreprises'] = self.get_queryset().count()
+        context['total_entreprises'] = context['page_obj'].total
         context['peut_voir_responsable'] = est_manager_ou_plus(self.request.user)
         return context
 
-class EntrepriseDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+class EntrepriseDetailView(LoginRequiredMixin, UserPassesTestMixin, LectureReplicaMixin, RelationsMixin, DetailView):
     model = Entreprise
     template_name = 'gestion_commerciale/entreprise_detail.html'
+    relations = ('contact_principal',)
+    max_queries = 4
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
@@ -108,11 +146,12 @@ class EntrepriseDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         context['peut_voir_responsable'] = est_manager_ou_plus(self.request.user)
         return context
 
-class EntrepriseCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
+class EntrepriseCreateView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, CreateView):
     model = Entreprise
     form_class = EntrepriseForm
     template_name = 'gestion_commerciale/entreprise_form.html'
     success_url = reverse_lazy('entreprise_list')
+    max_queries = 3
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
@@ -121,27 +160,38 @@ class EntrepriseCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
         form.instance.responsable = self.request.user
         return super().form_valid(form)
 
-class EntrepriseUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class EntrepriseUpdateView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, UpdateView):
     model = Entreprise
     form_class = EntrepriseForm
     template_name = 'gestion_commerciale/entreprise_form.html'
     success_url = reverse_lazy('entreprise_list')
+    max_queries = 5
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
 
-class EntrepriseDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class EntrepriseDeleteView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, DeleteView):
     model = Entreprise
     template_name = 'gestion_commerciale/entreprise_confirm_delete.html'
     success_url = reverse_lazy('entreprise_list')
+    max_queries = 4
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
 
-class OpportuniteListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class OpportuniteListView(LoginRequiredMixin, UserPassesTestMixin, LectureReplicaMixin, ExportCSVMixin, KeysetPaginationMixin, RelationsMixin, ListView):
     model = Opportunite
     template_name = 'gestion_commerciale/opportunite_list.html'
     context_object_name = 'opportunites'
+    relations = ('client_particulier', 'client_entreprise', 'service', 'responsable')
+    max_queries = 7
+    export_colonnes = (
+        ('nom', "Nom de l'opportunité"), ('statut', 'Statut'), ('montant', 'Montant'),
+        ('client_particulier__prenom', 'Prénom du client'), ('client_particulier__nom', 'Nom du client'),
+        ('client_entreprise__nom_entreprise', 'Entreprise cliente'), ('service__nom', 'Service associé'),
+        ('responsable__username', 'Responsable'), ('date_creation', 'Date de création'),
+        ('date_mise_a_jour', 'Date de mise à jour'),
+    )
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
@@ -158,27 +208,55 @@ class OpportuniteListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['filter'] = self.filterset
-        context['total_opportunites'] = self.get_queryset().count()
+        context['total_opportunites'] = context['page_obj'].total
         context['peut_voir_responsable'] = est_manager_ou_plus(self.request.user)
+        context['action_form'] = ActionGroupeeForm(request=self.request)
         return context
 
-class OpportuniteDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+    def post(self, request, *args, **kwargs):
+        """Action groupée sur la sélection, ou sur tout l'ensemble filtré (mêmes filtres et périmètre que la liste)."""
+        form = ActionGroupeeForm(request.POST, request=request)
+        if form.is_valid():
+            cible = self.get_queryset()
+            if not form.cleaned_data['tout_selectionner']:
+                cible = cible.filter(pk__in=[opportunite.pk for opportunite in form.cleaned_data['opportunites']])
+            modifiees = modifier_opportunites(cible, **form.valeurs())
+            messages.success(request, f"{modifiees} opportunité(s) mise(s) à jour.")
+        else:
+            for erreur in form.non_field_errors():
+                messages.error(request, erreur)
+        return redirect(request.get_full_path())
+
+class OpportuniteDetailView(LoginRequiredMixin, UserPassesTestMixin, LectureReplicaMixin, RelationsMixin, DetailView):
+    """Avec ?archives=1, une opportunité absente de la table courante est cherchée dans les archives."""
     model = Opportunite
     template_name = 'gestion_commerciale/opportunite_detail.html'
+    context_object_name = 'opportunite'
+    relations = ('client_particulier', 'client_entreprise', 'service')
+    max_queries = 5
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
 
+    def get_object(self, queryset=None):
+        try:
+            return super().get_object(queryset)
+        except Http404:
+            if self.request.GET.get('archives') != '1':
+                raise
+            return super().get_object(charger_relations(OpportuniteArchivee.objects.all(), self.relations))
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['peut_voir_responsable'] = est_manager_ou_plus(self.request.user)
         return context
 
-class OpportuniteCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView):
+class OpportuniteCreateView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, CreateView):
     model = Opportunite
     form_class = OpportuniteForm
     template_name = 'gestion_commerciale/opportunite_form.html'
     success_url = reverse_lazy('opportunite_list')
+    max_queries = 5
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
@@ -192,11 +270,12 @@ class OpportuniteCreateView(LoginRequiredMixin, UserPassesTestMixin, CreateView)
         form.instance.responsable = self.request.user
         return super().form_valid(form)
 
-class OpportuniteUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class OpportuniteUpdateView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, UpdateView):
     model = Opportunite
     form_class = OpportuniteForm
     template_name = 'gestion_commerciale/opportunite_form.html'
     success_url = reverse_lazy('opportunite_list')
+    max_queries = 7
 
     def test_func(self):
         return est_commercial_ou_plus(self.request.user)
@@ -206,10 +285,136 @@ class OpportuniteUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView)
         kwargs['request'] = self.request
         return kwargs
 
-class OpportuniteDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class OpportuniteDeleteView(LoginRequiredMixin, UserPassesTestMixin, RelationsMixin, DeleteView):
     model = Opportunite
     template_name = 'gestion_commerciale/opportunite_confirm_delete.html'
     success_url = reverse_lazy('opportunite_list')
+    max_queries = 5
+
+    def test_func(self):
+        return est_commercial_ou_plus(self.request.user)
+
+class RechercheView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    template_name = 'gestion_commerciale/recherche.html'
+    max_queries = 4
+
+    def test_func(self):
+        return est_commercial_ou_plus(self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        terme = self.request.GET.get('q', '').strip()
+        archives = self.request.GET.get('archives') == '1'
+        resultats = recherche_globale(self.request.user, terme, inclure_archives=archives) if terme else []
+        for resultat in resultats:
+            if resultat['type_resultat'] == 'opportunite_archivee':
+                resultat['url'] = reverse('opportunite_detail', args=[resultat['pk']]) + '?archives=1'
+            else:
+                resultat['url'] = reverse(f"{resultat['type_resultat']}_detail", args=[resultat['pk']])
+        context['terme'] = terme
+        context['archives'] = archives
+        context['resultats'] = resultats
+        return context
+
+class AutocompletionView(LoginRequiredMixin, UserPassesTestMixin, View):
+    sources = ('particuliers', 'entreprises', 'responsables')
+    max_queries = 4
+
+    def test_func(self):
+        return est_commercial_ou_plus(self.request.user)
+
+    def get(self, request, source):
+        if source not in self.sources:
+            raise Http404("Source d'autocomplétion inconnue.")
+        if source == 'responsables' and not est_manager_ou_plus(request.user):
+            raise PermissionDenied
+        terme = request.GET.get('q', '').strip()
+        return JsonResponse({'resultats': suggestions(source, request.user, terme)})
+
+class ImportClientsView(LoginRequiredMixin, UserPassesTestMixin, FormView):
+    template_name = 'gestion_commerciale/import_clients.html'
+    form_class = ImportClientsForm
+    modeles = {'particuliers': Particulier, 'entreprises': Entreprise}
+    erreurs_affichees = 100
+    max_queries = 3
 
     def test_func(self):
-        return est_commercial_ou_plus(self.request.user)
\ No newline at end of file
+        return est_commercial_ou_plus(self.request.user)
+
+    def get_initial(self):
+        return {'type_client': self.request.GET.get('type_client', 'particuliers')}
+
+    def form_valid(self, form):
+        # Seules les premières erreurs sont conservées : la mémoire reste bornée quelle que soit la taille du fichier.
+        erreurs = []
+        nombre_erreurs = 0
+
+        def signaler_erreur(numero, champ, message):
+            nonlocal nombre_erreurs
+            nombre_erreurs += 1
+            if len(erreurs) < self.erreurs_affichees:
+                erreurs.append({'ligne': numero, 'champ': champ, 'message': message})
+
+        importateur = Importateur(
+            self.modeles[form.cleaned_data['type_client']],
+            responsable=self.request.user,
+            signaler_erreur=signaler_erreur,
+        )
+        fichier = form.cleaned_data['fichier']
+        try:
+            crees, rejetees = importateur.importer(lire_lignes(fichier.file, fichier.name))
+        except FormatImportInvalide as exc:
+            form.add_error('fichier', str(exc))
+            return self.form_invalid(form)
+
+        return self.render_to_response(self.get_context_data(
+            form=self.form_class(initial={'type_client': form.cleaned_data['type_client']}),
+            resultat={'crees': crees, 'rejetees': rejetees, 'erreurs': erreurs, 'nombre_erreurs': nombre_erreurs},
+        ))
+
+class DoublonListView(LoginRequiredMixin, UserPassesTestMixin, KeysetPaginationMixin, RelationsMixin, ListView):
+    """File d'examen des doublons probables (voir la commande detecter_doublons), un type de client à la fois."""
+    model = DoublonPotentiel
+    template_name = 'gestion_commerciale/doublon_list.html'
+    context_object_name = 'doublons'
+    keyset_ordering = ('-score',)
+    max_queries = 5
+    types_client = {'particuliers': ('particulier_a', 'particulier_b'), 'entreprises': ('entreprise_a', 'entreprise_b')}
+
+    def test_func(self):
+        return est_manager_ou_plus(self.request.user)
+
+    def type_client(self):
+        type_client = self.request.GET.get('type_client')
+        return type_client if type_client in self.types_client else 'particuliers'
+
+    @property
+    def relations(self):
+        return self.types_client[self.type_client()]
+
+    def get_queryset(self):
+        champ = self.relations[0]
+        return super().get_queryset().filter(statut='a_examiner', **{f'{champ}__isnull': False})
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['type_client'] = self.type_client()
+        context['total_doublons'] = context['page_obj'].total
+        context['examen_form'] = ExamenDoublonsForm()
+        return context
+
+    def post(self, request, *args, **kwargs):
+        form = ExamenDoublonsForm(request.POST)
+        if form.is_valid():
+            doublons = DoublonPotentiel.objects.filter(pk__in=[d.pk for d in form.cleaned_data['doublons']])
+            action = form.cleaned_data['action']
+            if action == 'ignorer':
+                ignores = ignorer(doublons, request.user)
+                messages.success(request, f"{ignores} paire(s) écartée(s).")
+            else:
+                absorbees = fusionner_doublons(doublons, conserver=action.removeprefix('fusionner_'))
+                messages.success(request, f"{absorbees} fiche(s) fusionnée(s).")
+        else:
+            messages.error(request, "Sélectionnez au moins une paire à examiner.")
+        return redirect(request.get_full_path())
+
@@ -0,0 +1,36 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    Liste déroulante alimentée à la demande par l'API d'autocomplétion : seule
+    l'option sélectionnée est rendue côté serveur, les autres sont chargées par
+    static/js/main.js au fil de la saisie. La validation reste assurée par le
+    queryset du champ, donc par le périmètre de l'utilisateur.
+    """
+
+    def __init__(self, source, attrs=None):
+        self.source = source
+        super().__init__(attrs)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = reverse('autocompletion', args=[self.source])
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        choix = self.choices
+        selection = [v for v in value if v not in ('', None)]
+        groupes = []
+        if getattr(choix.field, 'empty_label', None) is not None:
+            groupes.append((None, [self.create_option(name, '', choix.field.empty_label, not selection, 0)], 0))
+        try:
+            selectionnes = list(choix.queryset.filter(pk__in=selection)) if selection else []
+        except (ValueError, ValidationError):
+            selectionnes = []
+        for index, obj in enumerate(selectionnes, start=len(groupes)):
+            valeur, libelle = choix.choice(obj)
+            groupes.append((None, [self.create_option(name, valeur, libelle, True, index)], index))
+        return groupes
@@ -52,8 +52,93 @@ function createBarChart(elementId) {
     }
 }
 
+// Graphique en courbes alimenté par l'API des cumuls périodiques (data-url) : une courbe par série
+const COULEURS_ETATS = {gagnee: '#28a745', perdue: '#dc3545', ouverte: '#ffc107'};
+
+function createSeriesChart(elementId) {
+    const chartElement = document.getElementById(elementId);
+    if (chartElement) {
+        fetch(chartElement.dataset.url, {headers: {'Accept': 'application/json'}})
+            .then(function(response) { return response.json(); })
+            .then(function(resultat) {
+                new Chart(chartElement.getContext('2d'), {
+                    type: 'line',
+                    data: {
+                        labels: resultat.periodes,
+                        datasets: resultat.series.map(function(serie) {
+                            return {
+                                label: serie.libelle,
+                                data: serie.montants,
+                                borderColor: COULEURS_ETATS[serie.etat],
+                                backgroundColor: COULEURS_ETATS[serie.etat]
+                            };
+                        })
+                    },
+                    options: {
+                        responsive: true,
+                        scales: {
+                            y: {
+                                beginAtZero: true
+                            }
+                        }
+                    }
+                });
+            });
+    }
+}
+
+// Fonction pour alimenter une liste déroulante via l'API d'autocomplétion
+function createAutocompleteSelect(selectElement) {
+    const searchInput = document.createElement('input');
+    searchInput.type = 'search';
+    searchInput.className = 'form-control form-control-sm mb-1';
+    searchInput.placeholder = 'Tapez pour rechercher...';
+    selectElement.parentNode.insertBefore(searchInput, selectElement);
+
+    const emptyOption = selectElement.querySelector('option[value=""]');
+    let timer = null;
+
+    function loadOptions() {
+        const url = selectElement.dataset.autocompleteUrl + '?q=' + encodeURIComponent(searchInput.value.trim());
+        fetch(url, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+            .then(response => response.json())
+            .then(data => {
+                const selectedValue = selectElement.value;
+                const selectedOption = selectElement.selectedOptions[0];
+                selectElement.innerHTML = '';
+                if (emptyOption) {
+                    selectElement.appendChild(emptyOption);
+                }
+                if (selectedValue && !data.resultats.some(item => String(item.id) === selectedValue)) {
+                    selectElement.appendChild(selectedOption);
+                }
+                data.resultats.forEach(item => {
+                    const option = new Option(item.texte, item.id, false, String(item.id) === selectedValue);
+                    selectElement.appendChild(option);
+                });
+            });
+    }
+
+    searchInput.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(loadOptions, 250);
+    });
+    selectElement.addEventListener('focus', loadOptions, {once: true});
+}
+
+// Case « tout cocher » : data-cocher-tout="<name des cases à cocher>".
+function initCocherTout(caseMaitre) {
+    caseMaitre.addEventListener('change', function() {
+        document.querySelectorAll(`input[type="checkbox"][name="${caseMaitre.dataset.cocherTout}"]`)
+            .forEach(function(caseACocher) { caseACocher.checked = caseMaitre.checked; });
+    });
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     createDoughnutChart('opportunitiesChart');
     createBarChart('servicesChart');
     createBarChart('categoriesChart');
+    createSeriesChart('montantsParMoisChart');
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(createAutocompleteSelect);
+    document.querySelectorAll('input[data-cocher-tout]').forEach(initCocherTout);
 });
\ No newline at end of file
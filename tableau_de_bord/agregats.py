@@ -0,0 +1,183 @@
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+from gestion_commerciale.models import Opportunite, OpportuniteArchivee
+from .models import AgregatOpportunite
+
+# Champs d'Opportunite qui déterminent sa contribution aux agrégats.
+CHAMPS_AGREGAT = ('responsable_id', 'statut', 'service_id', 'montant')
+
+
+def etat_agregat(opportunite):
+    """(responsable_id, statut, service_id, montant) tels qu'en mémoire, ou None si un champ est différé."""
+    if any(champ not in opportunite.__dict__ for champ in CHAMPS_AGREGAT):
+        return None
+    return (
+        opportunite.responsable_id,
+        opportunite.statut,
+        opportunite.service_id,
+        opportunite.montant or Decimal('0'),
+    )
+
+
+def etat_en_base(pk):
+    """
+    État enregistré de l'opportunité ``pk``, ligne verrouillée jusqu'à la fin de
+    la transaction : deux enregistrements concurrents ne partent pas du même état.
+    """
+    ligne = Opportunite.objects.select_for_update().filter(pk=pk).values_list(*CHAMPS_AGREGAT).first()
+    if ligne is None:
+        return None
+    return (*ligne[:3], ligne[3] or Decimal('0'))
+
+
+def _ajouter(etat, categorie_id):
+    responsable_id, statut, service_id, montant = etat
+    table = connection.ops.quote_name(AgregatOpportunite._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} AS a
+                (responsable_id, statut, service_id, categorie_id, nombre, montant_total)
+            VALUES (%s, %s, %s, %s, 1, %s)
+            ON CONFLICT (responsable_id, statut, service_id) DO UPDATE
+            SET nombre = a.nombre + 1,
+                montant_total = a.montant_total + EXCLUDED.montant_total,
+                categorie_id = EXCLUDED.categorie_id
+            """,
+            [responsable_id, statut, service_id, categorie_id, montant],
+        )
+
+
+def _cle(etat):
+    responsable_id, statut, service_id, _ = etat
+    return AgregatOpportunite.objects.filter(responsable_id=responsable_id, statut=statut, service_id=service_id)
+
+
+def appliquer(avant, apres, categorie_id=None):
+    """
+    Reporte sur les agrégats le passage d'une opportunité de l'état ``avant`` à
+    l'état ``apres`` (None pour une création ou une suppression). Une seule
+    requête dans les cas courants ; aucune si les champs agrégés n'ont pas changé.
+    """
+    if avant == apres:
+        return
+    if avant is not None and apres is not None and avant[:3] == apres[:3]:
+        _cle(apres).update(montant_total=F('montant_total') + (apres[3] - avant[3]))
+        return
+    if avant is not None:
+        _cle(avant).update(nombre=F('nombre') - 1, montant_total=F('montant_total') - avant[3])
+    if apres is not None:
+        _ajouter(apres, categorie_id)
+
+
+def reporter_lot(queryset, signe):
+    """
+    Ajoute (signe=1) ou retire (signe=-1) des agrégats la contribution des
+    opportunités de ``queryset``, en une seule requête INSERT ... SELECT ... GROUP BY.
+    Utilisé autour des modifications en masse, qui ne passent pas par save().
+    """
+    sous_requete, params = (
+        queryset.order_by()
+        .values('responsable_id', 'statut', 'service_id', categorie_id=F('service__categorie_id'))
+        .annotate(
+            nombre=Count('id'),
+            montant_total=Coalesce(Sum('montant'), Value(0), output_field=DecimalField()),
+        )
+        .query.sql_with_params()
+    )
+    table = connection.ops.quote_name(AgregatOpportunite._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} AS a
+                (responsable_id, statut, service_id, categorie_id, nombre, montant_total)
+            SELECT s.responsable_id, s.statut, s.service_id, s.categorie_id,
+                   %s * s.nombre, %s * s.montant_total
+            FROM ({sous_requete}) AS s
+            ON CONFLICT (responsable_id, statut, service_id) DO UPDATE
+            SET nombre = a.nombre + EXCLUDED.nombre,
+                montant_total = a.montant_total + EXCLUDED.montant_total
+            """,
+            [signe, signe, *params],
+        )
+
+
+@transaction.atomic
+def reaffecter(queryset, **cle):
+    """
+    Fusionne les lignes de ``queryset`` dans celles de même statut portant les
+    nouvelles valeurs ``cle`` (responsable et/ou service), par exemple quand le
+    responsable ou le service d'origine est supprimé.
+    """
+    lignes = list(queryset.select_for_update().values(
+        'responsable_id', 'statut', 'service_id', 'categorie_id', 'nombre', 'montant_total'
+    ))
+    queryset.delete()
+    table = connection.ops.quote_name(AgregatOpportunite._meta.db_table)
+    with connection.cursor() as cursor:
+        for ligne in lignes:
+            ligne.update(cle)
+            cursor.execute(
+                f"""
+                INSERT INTO {table} AS a
+                    (responsable_id, statut, service_id, categorie_id, nombre, montant_total)
+                VALUES (%(responsable_id)s, %(statut)s, %(service_id)s, %(categorie_id)s,
+                        %(nombre)s, %(montant_total)s)
+                ON CONFLICT (responsable_id, statut, service_id) DO UPDATE
+                SET nombre = a.nombre + EXCLUDED.nombre,
+                    montant_total = a.montant_total + EXCLUDED.montant_total
+                """,
+                ligne,
+            )
+
+
+def calculer_agregats():
+    """
+    Agrégats recalculés depuis les opportunités courantes et archivées (une
+    seule requête UNION ALL : une ligne déplacée entre-temps n'est comptée
+    qu'une fois), indexés par clé.
+    """
+    requetes = [
+        model.objects.order_by()
+        .values('responsable_id', 'statut', 'service_id', categorie_id=F('service__categorie_id'))
+        .annotate(
+            nombre=Count('id'),
+            montant_total=Coalesce(Sum('montant'), Value(0), output_field=DecimalField()),
+        )
+        for model in (Opportunite, OpportuniteArchivee)
+    ]
+    agregats = {}
+    for ligne in requetes[0].union(*requetes[1:], all=True):
+        cle = (ligne['responsable_id'], ligne['statut'], ligne['service_id'])
+        if cle in agregats:
+            agregats[cle]['nombre'] += ligne['nombre']
+            agregats[cle]['montant_total'] += ligne['montant_total']
+        else:
+            agregats[cle] = ligne
+    return agregats
+
+
+@transaction.atomic
+def reconstruire():
+    """
+    Remplace le contenu de la table d'agrégats par un recalcul complet.
+    Renvoie le nombre de clés qui avaient dérivé (absentes, en trop ou fausses).
+    """
+    attendus = calculer_agregats()
+    existants = {
+        (a.responsable_id, a.statut, a.service_id): a
+        for a in AgregatOpportunite.objects.select_for_update()
+        if a.nombre or a.montant_total
+    }
+    derives = sum(
+        1 for cle in attendus.keys() | existants.keys()
+        if cle not in attendus or cle not in existants
+        or (existants[cle].nombre, existants[cle].montant_total, existants[cle].categorie_id)
+        != (attendus[cle]['nombre'], attendus[cle]['montant_total'], attendus[cle]['categorie_id'])
+    )
+    AgregatOpportunite.objects.all().delete()
+    AgregatOpportunite.objects.bulk_create(AgregatOpportunite(**ligne) for ligne in attendus.values())
+    return derives
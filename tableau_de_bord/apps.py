@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TableauDeBordConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tableau_de_bord'
+
+    def ready(self):
+        from . import signals  # noqa: F401
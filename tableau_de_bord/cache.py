@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from utils.permissions import est_manager_ou_plus
+from utils.versions import lire_version, nouvelle_version
+
+DUREE_CACHE_TABLEAU = 300
+# Séquence PostgreSQL : une invalidation faite dans un processus vaut pour tous,
+# même si les contextes restent dans le cache propre à chacun.
+SEQUENCE_GENERATION = 'tableau_de_bord_generation'
+
+
+def cle_cache_tableau(user):
+    """Une entrée commune à tous les managers, une par commercial."""
+    if est_manager_ou_plus(user):
+        return 'tableau_de_bord:managers'
+    return f'tableau_de_bord:commercial:{user.pk}'
+
+
+def lire_tableau(user):
+    """
+    Renvoie (génération, contexte) : le contexte est None s'il est absent ou
+    calculé avant la dernière invalidation. La génération lue ici doit être
+    passée à memoriser_tableau() pour ne pas valider un calcul devenu obsolète.
+    """
+    generation = lire_version(SEQUENCE_GENERATION)
+    entree = cache.get(cle_cache_tableau(user))
+    if entree is not None and entree[0] == generation:
+        return generation, entree[1]
+    return generation, None
+
+
+def memoriser_tableau(user, generation, contexte):
+    cache.set(cle_cache_tableau(user), (generation, contexte), DUREE_CACHE_TABLEAU)
+
+
+def invalider_tableau_de_bord():
+    """Rend obsolètes toutes les entrées (managers et commerciaux) en changeant de génération."""
+    nouvelle_version(SEQUENCE_GENERATION)
@@ -0,0 +1,175 @@
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, CharField, Count, DateField, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, Trunc, TruncDate
+from django.utils import timezone
+from gestion_commerciale.models import STATUTS_CLOS, Opportunite, OpportuniteArchivee
+from .models import CumulPeriodique, JourARecalculer, RafraichissementCumuls
+
+Granularite = CumulPeriodique.Granularite
+
+# Troncature SQL (date_trunc) de chaque granularité.
+TRONCATURES = {Granularite.MOIS: 'month', Granularite.SEMAINE: 'week'}
+
+# Les opportunités sont relues à partir de ce délai avant le dernier rafraîchissement :
+# une transaction validée après lui peut porter une date_mise_a_jour antérieure.
+MARGE_RAFRAICHISSEMENT = timedelta(minutes=5)
+
+# Au plus un rafraîchissement déclenché par la lecture des cumuls par intervalle.
+INTERVALLE_RAFRAICHISSEMENT = 60
+CLE_RAFRAICHISSEMENT = 'cumuls:rafraichis'
+
+
+def debut_periode(granularite, jour):
+    if granularite == Granularite.SEMAINE:
+        return jour - timedelta(days=jour.weekday())
+    return jour.replace(day=1)
+
+
+def fin_periode(granularite, debut):
+    if granularite == Granularite.SEMAINE:
+        return debut + timedelta(days=7)
+    return (debut + timedelta(days=32)).replace(day=1)
+
+
+def minuit(jour):
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def _date_cumul():
+    """Date qui place une opportunité dans une période : sa clôture, ou sa création si elle est ouverte."""
+    return Case(
+        When(statut__in=STATUTS_CLOS, date_cloture__isnull=False, then=F('date_cloture')),
+        default=F('date_creation'),
+    )
+
+
+def _etat():
+    return Case(
+        When(statut='gagnee', then=Value(CumulPeriodique.Etat.GAGNEE)),
+        When(statut='perdue', then=Value(CumulPeriodique.Etat.PERDUE)),
+        default=Value(CumulPeriodique.Etat.OUVERTE),
+        output_field=CharField(),
+    )
+
+
+def _cumuls(queryset, granularite, periodes):
+    queryset = queryset.order_by()
+    if periodes is not None:
+        # Préfiltre sur les dates indexées ; la troncature seule imposerait un parcours complet.
+        debut = minuit(min(periodes))
+        fin = minuit(fin_periode(granularite, max(periodes)))
+        queryset = queryset.filter(
+            Q(date_creation__gte=debut, date_creation__lt=fin)
+            | Q(date_cloture__gte=debut, date_cloture__lt=fin)
+        )
+    queryset = queryset.annotate(
+        periode=Trunc(_date_cumul(), TRONCATURES[granularite], output_field=DateField()),
+        etat=_etat(),
+    )
+    if periodes is not None:
+        queryset = queryset.filter(periode__in=periodes)
+    return queryset.values('periode', 'etat', 'responsable_id', 'service_id').annotate(
+        nombre=Count('id'),
+        montant_total=Coalesce(Sum('montant'), Value(0), output_field=DecimalField()),
+    )
+
+
+def calculer(granularite, periodes=None):
+    """
+    Cumuls recalculés depuis les opportunités courantes et archivées (une seule
+    requête UNION ALL), pour toutes les périodes ou celles données.
+    """
+    courantes = _cumuls(Opportunite.objects.all(), granularite, periodes)
+    archivees = _cumuls(OpportuniteArchivee.objects.all(), granularite, periodes)
+    cumuls = {}
+    for ligne in courantes.union(archivees, all=True):
+        cle = (ligne['periode'], ligne['etat'], ligne['responsable_id'], ligne['service_id'])
+        if cle in cumuls:
+            cumuls[cle].nombre += ligne['nombre']
+            cumuls[cle].montant_total += ligne['montant_total']
+        else:
+            cumuls[cle] = CumulPeriodique(granularite=granularite, **ligne)
+    return list(cumuls.values())
+
+
+def signaler_jours(dates):
+    """Met en file les jours (dates ou datetimes) de ``dates`` dont les cumuls sont à recalculer."""
+    jours = {timezone.localdate(date) if isinstance(date, datetime) else date for date in dates if date is not None}
+    if jours:
+        JourARecalculer.objects.bulk_create((JourARecalculer(jour=jour) for jour in jours), ignore_conflicts=True)
+
+
+def signaler_lot(queryset):
+    """Met en file les jours de clôture des opportunités de ``queryset``, avant une modification en masse."""
+    signaler_jours(
+        queryset.filter(date_cloture__isnull=False).order_by()
+        .annotate(jour=TruncDate('date_cloture')).values_list('jour', flat=True).distinct()
+    )
+
+
+def _remplacer(granularite, periodes):
+    CumulPeriodique.objects.filter(granularite=granularite, periode__in=periodes).delete()
+    CumulPeriodique.objects.bulk_create(calculer(granularite, periodes))
+
+
+@transaction.atomic
+def rafraichir():
+    """
+    Recalcule les périodes touchées depuis le dernier rafraîchissement : celles
+    (création et clôture) des opportunités dont date_mise_a_jour est plus
+    récente, et celles des jours en file. Le premier appel reconstruit tout.
+    Renvoie le nombre de périodes recalculées.
+    """
+    etat, _ = RafraichissementCumuls.objects.select_for_update().get_or_create(pk=1)
+    if etat.jusqu_a is None:
+        return reconstruire()
+    debut = timezone.now()
+
+    modifiees = Opportunite.objects.filter(date_mise_a_jour__gt=etat.jusqu_a - MARGE_RAFRAICHISSEMENT).order_by()
+    en_file = list(JourARecalculer.objects.values_list('pk', 'jour'))
+    jours = {jour for _, jour in en_file}
+    for champ in ('date_creation', 'date_cloture'):
+        jours.update(
+            modifiees.filter(**{f'{champ}__isnull': False})
+            .annotate(jour=TruncDate(champ)).values_list('jour', flat=True).distinct()
+        )
+
+    recalculees = 0
+    for granularite in Granularite:
+        periodes = {debut_periode(granularite, jour) for jour in jours}
+        if periodes:
+            _remplacer(granularite, periodes)
+            recalculees += len(periodes)
+
+    JourARecalculer.objects.filter(pk__in=[pk for pk, _ in en_file]).delete()
+    etat.jusqu_a = debut
+    etat.save(update_fields=['jusqu_a'])
+    return recalculees
+
+
+@transaction.atomic
+def reconstruire():
+    """Remplace tous les cumuls par un recalcul complet. Renvoie le nombre de lignes écrites."""
+    etat, _ = RafraichissementCumuls.objects.select_for_update().get_or_create(pk=1)
+    debut = timezone.now()
+    JourARecalculer.objects.all().delete()
+    CumulPeriodique.objects.all().delete()
+    lignes = 0
+    for granularite in Granularite:
+        lignes += len(CumulPeriodique.objects.bulk_create(calculer(granularite), batch_size=5000))
+    etat.jusqu_a = debut
+    etat.save(update_fields=['jusqu_a'])
+    return lignes
+
+
+def rafraichir_si_perime():
+    """Rafraîchit les cumuls au plus une fois par INTERVALLE_RAFRAICHISSEMENT secondes (tous processus partageant le cache)."""
+    if cache.add(CLE_RAFRAICHISSEMENT, True, INTERVALLE_RAFRAICHISSEMENT):
+        rafraichir()
+
+
+def a_jour_au():
+    return RafraichissementCumuls.objects.filter(pk=1).values_list('jusqu_a', flat=True).first()
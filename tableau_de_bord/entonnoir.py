@@ -0,0 +1,165 @@
+from django.db import connection, connections, transaction
+from django.db.models import F, Max, Q, Window
+from django.db.models.functions import LastValue, Lead
+from django.db.models.expressions import RowRange
+from gestion_commerciale.models import STATUT_OPPORTUNITE_CHOICES, STATUTS_CLOS, Opportunite, OpportuniteArchivee
+from .models import TransitionStatut
+
+# Étapes de l'entonnoir, dans l'ordre du processus de vente.
+ETAPES = dict(STATUT_OPPORTUNITE_CHOICES)
+
+# Statut d'entrée supposé des opportunités clôturées avant l'historique (reconstitution).
+STATUT_INITIAL = 'qualification'
+
+TAILLE_LOT_HISTORIQUE = 50_000
+
+SECONDES_PAR_JOUR = 86400
+
+
+def enregistrer(opportunite, statut_precedent, date):
+    TransitionStatut.objects.create(
+        opportunite_id=opportunite.pk, statut_precedent=statut_precedent, statut=opportunite.statut, date=date,
+    )
+
+
+def enregistrer_lot(queryset, statut, date):
+    """
+    Avant le passage des opportunités de ``queryset`` au statut ``statut`` par
+    une modification en masse : une transition par opportunité qui en change,
+    en une seule requête INSERT ... SELECT.
+    """
+    sous_requete, params = queryset.exclude(statut=statut).order_by().values('id', 'statut').query.sql_with_params()
+    table = connection.ops.quote_name(TransitionStatut._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (opportunite_id, statut_precedent, statut, date, reconstituee)
+            SELECT s.id, s.statut, %s, %s, false FROM ({sous_requete}) AS s
+            """,
+            [statut, date, *params],
+        )
+
+
+def reconstruire_historique(taille_lot=TAILLE_LOT_HISTORIQUE):
+    """
+    Reconstitue l'historique des opportunités qui n'en ont pas : leur entrée à
+    la création (au statut actuel si elles sont ouvertes, à STATUT_INITIAL si
+    elles sont clôturées), puis leur clôture. Par tranches de clés, une
+    transaction par tranche. Renvoie le nombre de transitions ajoutées.
+    """
+    dernier = Opportunite.objects.aggregate(dernier=Max('pk'))['dernier'] or 0
+    table = connection.ops.quote_name(TransitionStatut._meta.db_table)
+    opportunites = connection.ops.quote_name(Opportunite._meta.db_table)
+    sans_historique = f"""
+        o.id > %(debut)s AND o.id <= %(fin)s
+        AND NOT EXISTS (SELECT 1 FROM {table} h WHERE h.opportunite_id = o.id)
+    """
+    ajoutees = 0
+    for debut in range(0, dernier, taille_lot):
+        params = {
+            'debut': debut, 'fin': debut + taille_lot,
+            'clos': list(STATUTS_CLOS), 'initial': STATUT_INITIAL,
+        }
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Triées par date : l'index BRIN suppose un ordre d'insertion proche de l'ordre du temps.
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (opportunite_id, statut_precedent, statut, date, reconstituee)
+                SELECT t.id, t.statut_precedent, t.statut, t.date, true FROM (
+                    SELECT o.id, NULL AS statut_precedent, 0 AS rang, o.date_creation AS date,
+                           CASE WHEN o.date_cloture IS NOT NULL AND o.statut = ANY(%(clos)s)
+                                THEN %(initial)s ELSE o.statut END AS statut
+                    FROM {opportunites} o WHERE {sans_historique}
+                    UNION ALL
+                    SELECT o.id, %(initial)s, 1, GREATEST(o.date_cloture, o.date_creation), o.statut
+                    FROM {opportunites} o
+                    WHERE o.date_cloture IS NOT NULL AND o.statut = ANY(%(clos)s) AND {sans_historique}
+                ) AS t
+                ORDER BY t.date, t.rang
+                """,
+                params,
+            )
+            ajoutees += cursor.rowcount
+    return ajoutees
+
+
+def _jours(secondes):
+    return None if secondes is None else round(float(secondes) / SECONDES_PAR_JOUR, 2)
+
+
+def calculer_entonnoir(du, au, responsable=None, reconstituees=True):
+    """
+    Entonnoir des transitions entrées dans une étape entre ``du`` et ``au``
+    (datetimes, ``au`` exclu) : par étape, le nombre d'entrées, la durée passée
+    (moyenne et médiane, en jours, pour celles qui en sont sorties), le taux
+    de passage vers chaque étape suivante et la part d'opportunités finalement
+    gagnées. Une seule requête : fenêtres par opportunité (étape suivante,
+    date de sortie, statut final) puis GROUPING SETS par étape et par couple
+    d'étapes. ``responsable`` limite aux opportunités qu'il suit actuellement,
+    archivées comprises.
+    """
+    # Les transitions antérieures à ``du`` ne changent ni la suivante ni la dernière d'une transition retenue.
+    transitions = TransitionStatut.objects.filter(date__gte=du)
+    if responsable is not None:
+        # Deux sous-requêtes : une jointure sur la table courante écarterait l'historique des archives.
+        transitions = transitions.filter(
+            Q(opportunite_id__in=Opportunite.objects.filter(responsable=responsable).values('pk'))
+            | Q(opportunite_id__in=OpportuniteArchivee.objects.filter(responsable=responsable).values('pk'))
+        )
+    if not reconstituees:
+        transitions = transitions.filter(reconstituee=False)
+    fenetre = {'partition_by': [F('opportunite_id')], 'order_by': [F('date').asc(), F('id').asc()]}
+    transitions = transitions.annotate(
+        sortie=Window(Lead('date'), **fenetre),
+        suivant=Window(Lead('statut'), **fenetre),
+        finale=Window(LastValue('statut'), frame=RowRange(start=None, end=None), **fenetre),
+    ).values('statut', 'date', 'sortie', 'suivant', 'finale')
+    sous_requete, params = transitions.query.sql_with_params()
+
+    with connections[transitions.db].cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT t.statut, t.suivant, GROUPING(t.suivant) = 1 AS etape,
+                   COUNT(*),
+                   AVG(EXTRACT(EPOCH FROM t.sortie - t.date)),
+                   PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM t.sortie - t.date)),
+                   COUNT(*) FILTER (WHERE t.finale = 'gagnee')
+            FROM ({sous_requete}) AS t
+            WHERE t.date < %s
+            GROUP BY GROUPING SETS ((t.statut), (t.statut, t.suivant))
+            """,
+            [*params, au],
+        )
+        lignes = cursor.fetchall()
+
+    etapes = {
+        statut: {
+            'statut': statut, 'libelle': libelle, 'entrees': 0, 'en_cours': 0,
+            'duree_moyenne_jours': None, 'duree_mediane_jours': None, 'taux_gain': None, 'sorties': [],
+        }
+        for statut, libelle in ETAPES.items()
+    }
+    passages = []
+    for statut, suivant, est_etape, nombre, moyenne, mediane, gagnees in lignes:
+        if est_etape:
+            etapes[statut].update(
+                entrees=nombre,
+                duree_moyenne_jours=_jours(moyenne),
+                duree_mediane_jours=_jours(mediane),
+                taux_gain=round(gagnees / nombre, 4),
+            )
+        elif suivant is None:
+            etapes[statut]['en_cours'] = nombre
+        else:
+            passages.append((statut, suivant, nombre, moyenne))
+
+    ordre = list(ETAPES)
+    for statut, suivant, nombre, moyenne in sorted(passages, key=lambda p: ordre.index(p[1])):
+        etape = etapes[statut]
+        etape['sorties'].append({
+            'statut': suivant,
+            'nombre': nombre,
+            'taux': round(nombre / etape['entrees'], 4),
+            'duree_moyenne_jours': _jours(moyenne),
+        })
+    return list(etapes.values())
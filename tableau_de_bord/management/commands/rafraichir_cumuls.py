@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from tableau_de_bord import cumuls
+
+
+class Command(BaseCommand):
+    help = (
+        "Rafraîchit les cumuls mensuels et hebdomadaires (gagné, perdu, ouvert) des périodes "
+        "touchées depuis le dernier passage, d'après date_mise_a_jour. À planifier (cron) ; "
+        "--complet recalcule tout, par exemple après un import SQL ou des suppressions hors ORM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--complet', action='store_true', help="Recalcule toutes les périodes.")
+
+    def handle(self, *args, **options):
+        if options['complet']:
+            lignes = cumuls.reconstruire()
+            self.stdout.write(self.style.SUCCESS(f"Cumuls reconstruits : {lignes} ligne(s)."))
+        else:
+            periodes = cumuls.rafraichir()
+            self.stdout.write(self.style.SUCCESS(f"Cumuls rafraîchis : {periodes} période(s) recalculée(s)."))
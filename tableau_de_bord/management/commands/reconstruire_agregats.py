@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from tableau_de_bord import agregats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcule entièrement la table d'agrégats du tableau de bord depuis les opportunités, "
+        "pour corriger une dérive (modifications en masse, imports SQL, suppressions hors ORM)."
+    )
+
+    def handle(self, *args, **options):
+        derives = agregats.reconstruire()
+        if derives:
+            self.stdout.write(self.style.WARNING(f"{derives} agrégat(s) corrigé(s)."))
+        self.stdout.write(self.style.SUCCESS("Agrégats du tableau de bord reconstruits."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from tableau_de_bord import entonnoir
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstitue l'historique des statuts des opportunités qui n'en ont pas (créées avant "
+        "l'historique ou hors ORM) : entrée à la création, puis clôture. Peut être relancée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--taille-lot', type=int, default=entonnoir.TAILLE_LOT_HISTORIQUE,
+            help="Plage de clés d'opportunités traitée par transaction.",
+        )
+
+    def handle(self, *args, **options):
+        ajoutees = entonnoir.reconstruire_historique(options['taille_lot'])
+        self.stdout.write(self.style.SUCCESS(f"Historique reconstitué : {ajoutees} transition(s) ajoutée(s)."))
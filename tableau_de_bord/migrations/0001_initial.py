@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def remplir_agregats(apps, schema_editor):
+    Opportunite = apps.get_model('gestion_commerciale', 'Opportunite')
+    AgregatOpportunite = apps.get_model('tableau_de_bord', 'AgregatOpportunite')
+    lignes = (
+        Opportunite.objects.order_by()
+        .values('responsable_id', 'statut', 'service_id', categorie_id=F('service__categorie_id'))
+        .annotate(
+            nombre=Count('id'),
+            montant_total=Coalesce(Sum('montant'), Value(0), output_field=DecimalField()),
+        )
+    )
+    AgregatOpportunite.objects.bulk_create(AgregatOpportunite(**ligne) for ligne in lignes)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('catalogue_service', '0004_index_acces'),
+        ('gestion_commerciale', '0004_index_acces'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgregatOpportunite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statut', models.CharField(choices=[('qualification', 'Qualification'), ('negociation', 'Négociation'), ('gagnee', 'Gagnée'), ('perdue', 'Perdue')], max_length=13)),
+                ('nombre', models.IntegerField(default=0)),
+                ('montant_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('categorie', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalogue_service.categorie')),
+                ('responsable', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalogue_service.service')),
+            ],
+            options={
+                'verbose_name': "Agrégat d'opportunités",
+                'verbose_name_plural': "Agrégats d'opportunités",
+                'constraints': [models.UniqueConstraint(fields=('responsable', 'statut', 'service'), name='agregat_opportunite_cle', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunPython(remplir_agregats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue_service', '0004_index_acces'),
+        ('tableau_de_bord', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JourARecalculer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField(unique=True)),
+            ],
+            options={
+                'verbose_name': 'Jour à recalculer',
+                'verbose_name_plural': 'Jours à recalculer',
+            },
+        ),
+        migrations.CreateModel(
+            name='RafraichissementCumuls',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jusqu_a', models.DateTimeField(null=True)),
+            ],
+            options={
+                'verbose_name': 'Rafraîchissement des cumuls',
+                'verbose_name_plural': 'Rafraîchissements des cumuls',
+            },
+        ),
+        migrations.CreateModel(
+            name='CumulPeriodique',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularite', models.CharField(choices=[('mois', 'Mois'), ('semaine', 'Semaine')], max_length=7)),
+                ('periode', models.DateField(help_text='Premier jour de la période (lundi pour une semaine).')),
+                ('etat', models.CharField(choices=[('gagnee', 'Gagnée'), ('perdue', 'Perdue'), ('ouverte', 'Ouverte')], max_length=7)),
+                ('nombre', models.IntegerField(default=0)),
+                ('montant_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('responsable', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('service', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='catalogue_service.service')),
+            ],
+            options={
+                'verbose_name': 'Cumul périodique',
+                'verbose_name_plural': 'Cumuls périodiques',
+                'constraints': [models.UniqueConstraint(fields=('granularite', 'periode', 'etat', 'responsable', 'service'), name='cumul_periodique_cle', nulls_distinct=False)],
+            },
+        ),
+    ]
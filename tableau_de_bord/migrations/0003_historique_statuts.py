@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:06
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_commerciale', '0005_date_cloture'),
+        ('tableau_de_bord', '0002_cumuls_periodiques'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransitionStatut',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statut_precedent', models.CharField(choices=[('qualification', 'Qualification'), ('negociation', 'Négociation'), ('gagnee', 'Gagnée'), ('perdue', 'Perdue')], max_length=13, null=True)),
+                ('statut', models.CharField(choices=[('qualification', 'Qualification'), ('negociation', 'Négociation'), ('gagnee', 'Gagnée'), ('perdue', 'Perdue')], max_length=13)),
+                ('date', models.DateTimeField()),
+                ('reconstituee', models.BooleanField(default=False)),
+                ('opportunite', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion_commerciale.opportunite')),
+            ],
+            options={
+                'verbose_name': 'Transition de statut',
+                'verbose_name_plural': 'Transitions de statut',
+                'indexes': [django.contrib.postgres.indexes.BrinIndex(autosummarize=True, fields=['date'], name='transition_statut_date_brin'), models.Index(fields=['opportunite', 'date'], name='transition_statut_oppo_idx')],
+            },
+        ),
+    ]
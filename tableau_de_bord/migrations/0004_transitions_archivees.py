@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_commerciale', '0008_opportunites_archivees'),
+        ('tableau_de_bord', '0003_historique_statuts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transitionstatut',
+            name='opportunite',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='gestion_commerciale.opportunite'),
+        ),
+    ]
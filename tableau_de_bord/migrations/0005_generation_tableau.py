@@ -0,0 +1,16 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tableau_de_bord', '0004_transitions_archivees'),
+    ]
+
+    operations = [
+        # Génération du cache du tableau de bord, partagée par tous les processus (tableau_de_bord.cache).
+        migrations.RunSQL(
+            "CREATE SEQUENCE tableau_de_bord_generation; SELECT setval('tableau_de_bord_generation', 1);",
+            'DROP SEQUENCE tableau_de_bord_generation;',
+        ),
+    ]
@@ -1,3 +1,166 @@
+from django.conf import settings
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
+from catalogue_service.models import Categorie, Service
+from gestion_commerciale.models import STATUT_OPPORTUNITE_CHOICES, Opportunite
 
-# Create your models here.
+
+class AgregatOpportunite(models.Model):
+    """
+    Nombre et montant cumulé des opportunités par (responsable, statut, service),
+    avec la catégorie du service en dimension. Tenu à jour dans la transaction
+    de chaque création, modification ou suppression d'Opportunite (voir
+    signals.py) ; ``reconstruire_agregats`` le recalcule en cas de dérive.
+    """
+    responsable = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+    )
+    statut = models.CharField(max_length=13, choices=STATUT_OPPORTUNITE_CHOICES)
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+    )
+    categorie = models.ForeignKey(
+        Categorie,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+    )
+    nombre = models.IntegerField(default=0)
+    montant_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Agrégat d'opportunités"
+        verbose_name_plural = "Agrégats d'opportunités"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['responsable', 'statut', 'service'],
+                nulls_distinct=False,
+                name='agregat_opportunite_cle',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.responsable_id} / {self.statut} / {self.service_id} : {self.nombre}"
+
+
+class CumulPeriodique(models.Model):
+    """
+    Nombre et montant des opportunités par période (mois ou semaine), état
+    (gagnée, perdue ou ouverte), responsable et service. Les opportunités
+    gagnées et perdues comptent dans la période de leur clôture, les ouvertes
+    dans celle de leur création ; la catégorie est celle du service à
+    l'affichage. Rafraîchi par cumuls.rafraichir() (voir rafraichir_cumuls).
+    """
+
+    class Granularite(models.TextChoices):
+        MOIS = 'mois', 'Mois'
+        SEMAINE = 'semaine', 'Semaine'
+
+    class Etat(models.TextChoices):
+        GAGNEE = 'gagnee', 'Gagnée'
+        PERDUE = 'perdue', 'Perdue'
+        OUVERTE = 'ouverte', 'Ouverte'
+
+    granularite = models.CharField(max_length=7, choices=Granularite.choices)
+    periode = models.DateField(help_text="Premier jour de la période (lundi pour une semaine).")
+    etat = models.CharField(max_length=7, choices=Etat.choices)
+    responsable = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+    )
+    service = models.ForeignKey(
+        Service,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+    )
+    nombre = models.IntegerField(default=0)
+    montant_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Cumul périodique"
+        verbose_name_plural = "Cumuls périodiques"
+        constraints = [
+            # Sert aussi les lectures par granularité et plage de périodes.
+            models.UniqueConstraint(
+                fields=['granularite', 'periode', 'etat', 'responsable', 'service'],
+                nulls_distinct=False,
+                name='cumul_periodique_cle',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.granularite} {self.periode} / {self.etat} / {self.responsable_id} / {self.service_id} : {self.nombre}"
+
+
+class JourARecalculer(models.Model):
+    """
+    Jour que des opportunités ont quitté sans que leur date_mise_a_jour ne le
+    désigne (réouverture, nouvelle clôture, suppression) : ses périodes seront
+    recalculées au prochain rafraîchissement des cumuls.
+    """
+    jour = models.DateField(unique=True)
+
+    class Meta:
+        verbose_name = "Jour à recalculer"
+        verbose_name_plural = "Jours à recalculer"
+
+    def __str__(self):
+        return str(self.jour)
+
+
+class RafraichissementCumuls(models.Model):
+    """Ligne unique : date_mise_a_jour jusqu'à laquelle les opportunités sont reportées dans les cumuls."""
+    jusqu_a = models.DateTimeField(null=True)
+
+    class Meta:
+        verbose_name = "Rafraîchissement des cumuls"
+        verbose_name_plural = "Rafraîchissements des cumuls"
+
+    def __str__(self):
+        return f"Cumuls à jour au {self.jusqu_a}"
+
+
+class TransitionStatut(models.Model):
+    """
+    Passage d'une opportunité d'un statut à un autre (statut_precedent vide à
+    la création). Table en ajout seul, alimentée par signals.py à chaque
+    enregistrement et modification groupée ; lue par entonnoir.py. Les lignes
+    ``reconstituee`` viennent de ``reconstruire_historique_statuts`` (historique
+    antérieur à la table, déduit des dates de création et de clôture).
+    """
+    # Index : transition_statut_oppo_idx. Sans contrainte en base : l'historique d'une
+    # opportunité archivée (même clé, hors de la table courante) est conservé.
+    opportunite = models.ForeignKey(
+        Opportunite, on_delete=models.CASCADE, db_index=False, db_constraint=False, related_name='+',
+    )
+    statut_precedent = models.CharField(max_length=13, choices=STATUT_OPPORTUNITE_CHOICES, null=True)
+    statut = models.CharField(max_length=13, choices=STATUT_OPPORTUNITE_CHOICES)
+    date = models.DateTimeField()
+    reconstituee = models.BooleanField(default=False)
+
+    class Meta:
+        verbose_name = "Transition de statut"
+        verbose_name_plural = "Transitions de statut"
+        indexes = [
+            # Lignes ajoutées dans l'ordre du temps : un index BRIN suffit aux filtres par période.
+            BrinIndex(fields=['date'], autosummarize=True, name='transition_statut_date_brin'),
+            # Historique d'une opportunité, dans l'ordre (fenêtres de l'entonnoir).
+            models.Index(fields=['opportunite', 'date'], name='transition_statut_oppo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.opportunite_id} : {self.statut_precedent} -> {self.statut} ({self.date})"
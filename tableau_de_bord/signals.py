@@ -0,0 +1,146 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.db import transaction
+from django.dispatch import receiver
+from catalogue_service.models import Categorie, Service
+from gestion_commerciale.models import Entreprise, Opportunite, OpportuniteArchivee, Particulier
+from gestion_commerciale.signals import (
+    clients_fusionnes, clients_importes, opportunites_archivees, opportunites_avant_maj_groupee,
+    opportunites_maj_groupee,
+)
+from . import agregats, cumuls, entonnoir
+from .cache import invalider_tableau_de_bord
+from .models import AgregatOpportunite, TransitionStatut
+
+User = get_user_model()
+
+
+@receiver(pre_save, sender=Opportunite)
+def lire_etat_precedent(sender, instance, **kwargs):
+    # Relu en base sous verrou (dans la transaction d'Opportunite._enregistrer) : une
+    # instance chargée avant une autre modification ne fait pas dériver les agrégats.
+    instance._etat_agregat = None if instance._state.adding else agregats.etat_en_base(instance.pk)
+
+
+@receiver(pre_save, sender=Opportunite)
+def memoriser_statut_precedent(sender, instance, **kwargs):
+    # Après lire_etat_precedent : le statut en base est déjà connu, sans requête.
+    etat = instance._etat_agregat
+    instance._statut_precedent = etat[1] if etat is not None else None
+
+
+@receiver(post_save, sender=Opportunite)
+def enregistrer_transition_statut(sender, instance, created, **kwargs):
+    if created:
+        entonnoir.enregistrer(instance, None, instance.date_creation)
+    elif instance._statut_precedent != instance.statut:
+        entonnoir.enregistrer(instance, instance._statut_precedent, instance.date_mise_a_jour)
+
+
+@receiver(opportunites_avant_maj_groupee)
+def enregistrer_transitions_lot(sender, queryset, valeurs, date, **kwargs):
+    if 'statut' in valeurs:
+        entonnoir.enregistrer_lot(queryset, valeurs['statut'], date)
+
+
+@receiver(post_save, sender=Opportunite)
+def maj_agregats_enregistrement(sender, instance, **kwargs):
+    apres = agregats.etat_agregat(instance)
+    categorie_id = instance.service.categorie_id if instance.service_id else None
+    agregats.appliquer(instance._etat_agregat, apres, categorie_id)
+    instance._etat_agregat = apres
+
+
+@receiver(pre_delete, sender=Opportunite)
+def lire_etat_avant_suppression(sender, instance, **kwargs):
+    # Dans la transaction de la suppression, comme lire_etat_precedent.
+    instance._etat_agregat = agregats.etat_en_base(instance.pk)
+
+
+@receiver(post_delete, sender=Opportunite)
+def maj_agregats_suppression(sender, instance, **kwargs):
+    agregats.appliquer(instance._etat_agregat, None)
+
+
+@receiver(post_delete, sender=OpportuniteArchivee)
+def retirer_opportunite_archivee(sender, instance, **kwargs):
+    # Suppression en cascade d'un client : l'archive sort des agrégats, des cumuls et de l'entonnoir.
+    agregats.appliquer(agregats.etat_agregat(instance), None)
+    cumuls.signaler_jours([instance.date_creation, instance.date_cloture])
+    TransitionStatut.objects.filter(opportunite_id=instance.pk).delete()
+
+
+@receiver(opportunites_avant_maj_groupee)
+def retirer_lot_agregats(sender, queryset, **kwargs):
+    agregats.reporter_lot(queryset, -1)
+
+
+# Cumuls périodiques : rafraîchis d'après date_mise_a_jour, sauf pour les
+# périodes qu'une opportunité quitte, mises en file ici.
+
+@receiver(post_save, sender=Opportunite)
+def signaler_cloture_quittee(sender, instance, **kwargs):
+    precedente = getattr(instance, '_cloture_precedente', None)
+    if precedente is not None and precedente != instance.date_cloture:
+        cumuls.signaler_jours([precedente])
+
+
+@receiver(pre_delete, sender=Opportunite)
+def signaler_opportunite_supprimee(sender, instance, **kwargs):
+    cumuls.signaler_jours([instance.date_creation, instance.date_cloture])
+
+
+@receiver(opportunites_avant_maj_groupee)
+def signaler_lot_cumuls(sender, queryset, **kwargs):
+    cumuls.signaler_lot(queryset)
+
+
+@receiver(opportunites_maj_groupee)
+def ajouter_lot_agregats(sender, queryset, **kwargs):
+    agregats.reporter_lot(queryset, 1)
+
+
+@receiver(pre_delete, sender=User)
+def reaffecter_agregats_responsable(sender, instance, **kwargs):
+    # Les opportunités passent à responsable NULL (SET_NULL), sans signal par ligne.
+    agregats.reaffecter(AgregatOpportunite.objects.filter(responsable_id=instance.pk), responsable_id=None)
+
+
+@receiver(pre_delete, sender=Service)
+def reaffecter_agregats_service(sender, instance, **kwargs):
+    agregats.reaffecter(
+        AgregatOpportunite.objects.filter(service_id=instance.pk), service_id=None, categorie_id=None
+    )
+
+
+@receiver(post_save, sender=Service)
+def maj_categorie_agregats(sender, instance, created, **kwargs):
+    if not created:
+        AgregatOpportunite.objects.filter(service_id=instance.pk).exclude(
+            categorie_id=instance.categorie_id
+        ).update(categorie_id=instance.categorie_id)
+
+
+@receiver(pre_delete, sender=Categorie)
+def detacher_categorie_agregats(sender, instance, **kwargs):
+    AgregatOpportunite.objects.filter(categorie_id=instance.pk).update(categorie_id=None)
+
+
+@receiver(post_save, sender=Opportunite)
+@receiver(post_delete, sender=Opportunite)
+@receiver(post_save, sender=Particulier)
+@receiver(post_delete, sender=Particulier)
+@receiver(post_save, sender=Entreprise)
+@receiver(post_delete, sender=Entreprise)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(post_save, sender=Categorie)
+@receiver(post_delete, sender=Categorie)
+@receiver(clients_importes)
+@receiver(clients_fusionnes)
+@receiver(opportunites_archivees)
+@receiver(opportunites_maj_groupee)
+def invalider_cache_tableau(sender, **kwargs):
+    # Immédiatement, puis au commit : un calcul concurrent lancé avant le commit ne reste pas en cache.
+    invalider_tableau_de_bord()
+    transaction.on_commit(invalider_tableau_de_bord)
@@ -1,10 +1,26 @@
-from django.test import TestCase, Client
+from datetime import date, timedelta
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User, Group
-from gestion_commerciale.models import Particulier, Entreprise, Opportunite, Service
+from gestion_commerciale.actions import modifier_opportunites
+from gestion_commerciale.archivage import archiver
+from gestion_commerciale.models import STATUTS_CLOS, Particulier, Entreprise, Opportunite, OpportuniteArchivee, Service
 from utilisateur.models import Utilisateur, Role
 from decimal import Decimal
 from utils.permissions import est_manager_ou_plus, est_administrateur
+from catalogue_service.models import Categorie
+from tableau_de_bord import agregats, cumuls
+from tableau_de_bord.models import AgregatOpportunite, CumulPeriodique, JourARecalculer, TransitionStatut
+from tableau_de_bord.views import calculer_tableau
+from utils.concurrence import executer_en_parallele
 
 class DashboardTest(TestCase):
     @classmethod
@@ -141,3 +157,423 @@ class DashboardTest(TestCase):
         self.assertEqual(stats_dict['gagnee'], 1)
         self.assertEqual(stats_dict['perdue'], 1)
         self.assertEqual(stats_dict['qualification'], 1)
+
+
+class OpportunitesTestCase(TestCase):
+    """Un manager, un commercial, deux services et un client : de quoi créer des opportunités."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Group.objects.get_or_create(name='Manager')
+        Group.objects.get_or_create(name='Commercial')
+        cls.manager = Utilisateur.objects.create_user(username='manager', password='password123', role=Role.MANAGER)
+        cls.commercial = Utilisateur.objects.create_user(username='commercial', password='password123')
+        cls.categorie = Categorie.objects.create(nom="Web")
+        cls.service_a = Service.objects.create(nom="Service A", prix=Decimal('1000.00'), categorie=cls.categorie)
+        cls.service_b = Service.objects.create(nom="Service B", prix=Decimal('5000.00'))
+        cls.particulier = Particulier.objects.create(
+            nom="Test", prenom="Client", email='client@example.com', telephone='+212600000020',
+            date_de_naissance=date(1990, 1, 1), responsable=cls.commercial,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def creer(self, nom, statut, service=None, responsable=None):
+        return Opportunite.objects.create(
+            nom=nom, statut=statut, service=service or self.service_a, client_particulier=self.particulier,
+            responsable=responsable or self.commercial,
+        )
+
+
+class AgregatOpportuniteTest(OpportunitesTestCase):
+    def assertAgregatsExacts(self):
+        attendus = {
+            cle: (ligne['nombre'], ligne['montant_total'], ligne['categorie_id'])
+            for cle, ligne in agregats.calculer_agregats().items()
+        }
+        tenus = {
+            (a.responsable_id, a.statut, a.service_id): (a.nombre, a.montant_total, a.categorie_id)
+            for a in AgregatOpportunite.objects.exclude(nombre=0)
+        }
+        self.assertEqual(tenus, attendus)
+
+    def test_agregats_suivent_creation_modification_suppression(self):
+        """Les agrégats sont tenus à jour à chaque enregistrement et suppression."""
+        opportunite = self.creer("Oppo 1", 'qualification', self.service_a)
+        self.creer("Oppo 2", 'gagnee', self.service_b)
+        self.assertAgregatsExacts()
+
+        opportunite.statut = 'gagnee'
+        opportunite.save()
+        self.assertAgregatsExacts()
+
+        opportunite = Opportunite.objects.get(pk=opportunite.pk)
+        opportunite.responsable = self.manager
+        opportunite.service = self.service_b
+        opportunite.save()
+        self.assertAgregatsExacts()
+
+        opportunite.delete()
+        self.assertAgregatsExacts()
+
+        self.particulier.delete()
+        self.assertFalse(AgregatOpportunite.objects.exclude(nombre=0).exists())
+
+    def test_agregats_instance_perimee(self):
+        """Une instance chargée avant une autre modification ne fait pas dériver les agrégats."""
+        opportunite = self.creer("Oppo 1", 'qualification', self.service_a)
+        perimee = Opportunite.objects.get(pk=opportunite.pk)
+        opportunite.statut = 'gagnee'
+        opportunite.service = self.service_b
+        opportunite.save()
+
+        perimee.responsable = self.manager
+        perimee.save()
+        self.assertAgregatsExacts()
+
+        perimee = Opportunite.objects.get(pk=opportunite.pk)
+        opportunite.statut = 'perdue'
+        opportunite.save()
+        perimee.delete()
+        self.assertAgregatsExacts()
+
+    def test_agregats_suivent_references_supprimees(self):
+        """Suppression d'un responsable, d'un service ou d'une catégorie : les agrégats sont réaffectés."""
+        self.creer("Oppo 1", 'gagnee', self.service_a)
+        self.creer("Oppo 2", 'gagnee', self.service_a, responsable=self.manager)
+        self.creer("Oppo 3", 'perdue', self.service_b)
+
+        self.service_b.categorie = self.categorie
+        self.service_b.save()
+        self.assertAgregatsExacts()
+
+        self.categorie.delete()
+        self.assertAgregatsExacts()
+        self.manager.delete()
+        self.assertAgregatsExacts()
+        self.service_a.delete()
+        self.assertAgregatsExacts()
+
+    def test_reconstruire_agregats(self):
+        """La commande de reconstruction corrige une dérive causée par une mise à jour en masse."""
+        self.creer("Oppo 1", 'qualification', self.service_a)
+        sortie = StringIO()
+        call_command('reconstruire_agregats', stdout=sortie)
+        self.assertNotIn('corrigé', sortie.getvalue())
+
+        Opportunite.objects.update(statut='gagnee')
+        call_command('reconstruire_agregats', stdout=sortie)
+        self.assertIn('2 agrégat(s) corrigé(s)', sortie.getvalue())
+        self.assertAgregatsExacts()
+
+    def test_tableau_de_bord_lit_les_agregats(self):
+        """Le tableau de bord calcule ses indicateurs à partir des agrégats."""
+        self.creer("Oppo 1", 'gagnee', self.service_a)
+        self.creer("Oppo 2", 'qualification', self.service_b)
+        self.creer("Oppo 3", 'gagnee', self.service_b, responsable=self.manager)
+
+        self.client.login(username='commercial', password='password123')
+        response = self.client.get(reverse('tableau_de_bord'))
+        self.assertEqual(response.context['total_opportunites'], 2)
+        self.assertEqual(response.context['ca_total'], Decimal('1000.00'))
+        self.assertEqual(response.context['pipeline_total'], Decimal('5000.00'))
+        self.assertEqual(response.context['taux_conversion'], 50.0)
+
+        self.client.login(username='manager', password='password123')
+        response = self.client.get(reverse('tableau_de_bord'))
+        self.assertEqual(response.context['total_opportunites'], 3)
+        self.assertCountEqual(
+            response.context['services_vendus_par_categorie'],
+            [{'categorie__nom': 'Web', 'ventes': 1}, {'categorie__nom': None, 'ventes': 1}],
+        )
+
+    def test_tableau_de_bord_en_cache(self):
+        """Le contexte est partagé par les managers et invalidé par une écriture."""
+        self.creer("Oppo 1", 'gagnee', self.service_a)
+        admin = Utilisateur.objects.create_user(username='admin', password='password123', is_superuser=True)
+
+        self.client.login(username='manager', password='password123')
+        self.client.get(reverse('tableau_de_bord'))
+        self.client.login(username='admin', password='password123')
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('tableau_de_bord'))
+        self.assertFalse(any('gestion_commerciale' in q['sql'] for q in requetes.captured_queries))
+        self.assertEqual(response.context['total_opportunites'], 1)
+        self.assertTrue(response.context['est_administrateur'])
+
+        self.client.login(username='manager', password='password123')
+        response = self.client.get(reverse('tableau_de_bord'))
+        self.assertFalse(response.context['est_administrateur'])
+
+        self.creer("Oppo 2", 'perdue', self.service_b)
+        response = self.client.get(reverse('tableau_de_bord'))
+        self.assertEqual(response.context['total_opportunites'], 2)
+
+    def test_tableau_de_bord_generation_partagee(self):
+        """Une invalidation faite dans un autre processus (séquence partagée seule) est vue ici."""
+        self.creer("Oppo 1", 'gagnee', self.service_a)
+        self.client.login(username='manager', password='password123')
+        self.client.get(reverse('tableau_de_bord'))
+        # Écriture sans signal, puis génération avancée comme par le processus qui l'a faite.
+        AgregatOpportunite.objects.filter(statut='gagnee').update(nombre=5)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval('tableau_de_bord_generation')")
+        response = self.client.get(reverse('tableau_de_bord'))
+        self.assertEqual(response.context['total_opportunites'], 5)
+
+
+class TableauDeBordAsynchroneTest(TransactionTestCase):
+    """Hors transaction de test, pour que les connexions des autres threads voient les données."""
+    databases = '__all__'  # Réplicas éventuels (DB_REPLICAS), miroirs de la base de test.
+
+    def setUp(self):
+        cache.clear()
+        Group.objects.get_or_create(name='Manager')
+        self.manager = Utilisateur.objects.create_user(username='manager', password='password123', role=Role.MANAGER)
+        service = Service.objects.create(nom="Service A", prix=Decimal('1000.00'))
+        particulier = Particulier.objects.create(
+            nom="Test", prenom="Client", email='client@example.com', telephone='+212600000030',
+            date_de_naissance=date(1990, 1, 1), responsable=self.manager,
+        )
+        for statut in ('gagnee', 'qualification'):
+            Opportunite.objects.create(
+                nom=f"Oppo {statut}", statut=statut, service=service,
+                client_particulier=particulier, responsable=self.manager,
+            )
+
+    async def test_requetes_paralleles_sur_connexions_distinctes(self):
+        """Chaque requête indépendante dispose de sa propre connexion."""
+        def pid():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_backend_pid(), pg_sleep(0.1)')
+                return cursor.fetchone()[0]
+
+        resultats = await executer_en_parallele({'a': pid, 'b': pid, 'c': pid})
+        self.assertEqual(len(set(resultats.values())), 3)
+
+    async def test_tableau_de_bord_sous_asgi(self):
+        """Sous ASGI, le contexte calculé en parallèle est celui du calcul séquentiel."""
+        await self.async_client.aforce_login(self.manager)
+        response = await self.async_client.get(reverse('tableau_de_bord'))
+        self.assertEqual(response.status_code, 200)
+        attendu = await sync_to_async(calculer_tableau)(self.manager)
+        for cle in ('total_opportunites', 'ca_total', 'pipeline_total', 'nombre_clients', 'services_vendus'):
+            self.assertEqual(response.context[cle], attendu[cle])
+        self.assertEqual(response.context['total_opportunites'], 2)
+
+
+class CumulPeriodiqueTest(OpportunitesTestCase):
+    def setUp(self):
+        super().setUp()
+        cumuls.reconstruire()
+
+    def vieillir(self, opportunite, jours):
+        """Recule création et clôture sans passer par save(), comme des données historiques."""
+        passe = timezone.now() - timedelta(days=jours)
+        Opportunite.objects.filter(pk=opportunite.pk).update(
+            date_creation=passe, date_mise_a_jour=passe,
+            date_cloture=passe if opportunite.statut in STATUTS_CLOS else None,
+        )
+        cumuls.reconstruire()
+        return Opportunite.objects.get(pk=opportunite.pk)
+
+    def assertCumulsExacts(self):
+        cle = lambda c: (c.granularite, c.periode, c.etat, c.responsable_id, c.service_id, c.nombre, c.montant_total)
+        for granularite in CumulPeriodique.Granularite:
+            self.assertCountEqual(
+                [cle(c) for c in CumulPeriodique.objects.filter(granularite=granularite)],
+                [cle(c) for c in cumuls.calculer(granularite)],
+            )
+
+    def test_rafraichir_suit_creation_et_cloture(self):
+        """Le rafraîchissement incrémental retrouve le résultat d'un recalcul complet."""
+        self.creer("Oppo 1", 'qualification', self.service_a)
+        opportunite = self.creer("Oppo 2", 'negociation', self.service_b)
+        self.assertGreater(cumuls.rafraichir(), 0)
+        self.assertCumulsExacts()
+
+        opportunite.statut = 'gagnee'
+        opportunite.save()
+        self.assertIsNotNone(opportunite.date_cloture)
+        cumuls.rafraichir()
+        self.assertCumulsExacts()
+        gagnees = CumulPeriodique.objects.get(granularite='mois', etat='gagnee')
+        self.assertEqual((gagnees.nombre, gagnees.montant_total), (1, Decimal('5000.00')))
+
+    def test_reouverture_recalcule_la_periode_de_cloture(self):
+        """Rouvrir ou supprimer une opportunité close de longue date corrige sa période de clôture."""
+        opportunite = self.vieillir(self.creer("Oppo 1", 'gagnee', self.service_a), 100)
+        ancienne = self.vieillir(self.creer("Oppo 2", 'perdue', self.service_b), 200)
+        self.assertTrue(CumulPeriodique.objects.filter(etat='gagnee').exists())
+
+        opportunite.statut = 'negociation'
+        opportunite.save()
+        self.assertIsNone(opportunite.date_cloture)
+        self.assertTrue(JourARecalculer.objects.exists())
+        cumuls.rafraichir()
+        self.assertFalse(JourARecalculer.objects.exists())
+        self.assertFalse(CumulPeriodique.objects.filter(etat='gagnee').exists())
+        self.assertCumulsExacts()
+
+        ancienne.delete()
+        cumuls.rafraichir()
+        self.assertFalse(CumulPeriodique.objects.filter(etat='perdue').exists())
+        self.assertCumulsExacts()
+
+    def test_modification_groupee(self):
+        """Les actions groupées posent la date de clôture et mettent en file les périodes quittées."""
+        perdue = self.vieillir(self.creer("Oppo 1", 'perdue', self.service_a), 100)
+        self.creer("Oppo 2", 'negociation', self.service_b)
+
+        modifier_opportunites(Opportunite.objects.all(), statut='gagnee')
+        self.assertFalse(Opportunite.objects.filter(date_cloture__isnull=True).exists())
+        cumuls.rafraichir()
+        self.assertCumulsExacts()
+
+        modifier_opportunites(Opportunite.objects.filter(pk=perdue.pk), statut='qualification')
+        cumuls.rafraichir()
+        self.assertCumulsExacts()
+        self.assertEqual(CumulPeriodique.objects.get(granularite='mois', etat='gagnee').nombre, 1)
+
+    def test_graphiques_view(self):
+        """Séries par état et par dimension, limitées à ses opportunités pour un commercial."""
+        self.creer("Oppo 1", 'gagnee', self.service_a)
+        self.creer("Oppo 2", 'gagnee', self.service_b, responsable=self.manager)
+        self.creer("Oppo 3", 'qualification', self.service_b)
+
+        self.client.login(username='manager', password='password123')
+        donnees = self.client.get(reverse('graphiques_tableau_de_bord'), {'periodes': 3}).json()
+        self.assertEqual(len(donnees['periodes']), 3)
+        gagnees = next(s for s in donnees['series'] if s['etat'] == 'gagnee')
+        self.assertEqual((gagnees['nombres'][-1], gagnees['montants'][-1]), (2, 6000.0))
+
+        donnees = self.client.get(
+            reverse('graphiques_tableau_de_bord'), {'granularite': 'semaine', 'dimension': 'categorie'},
+        ).json()
+        self.assertCountEqual(
+            [(s['etat'], s['libelle'], s['montants'][-1]) for s in donnees['series']],
+            [('gagnee', 'Web', 1000.0), ('gagnee', 'Sans catégorie', 5000.0), ('ouverte', 'Sans catégorie', 5000.0)],
+        )
+
+        self.client.login(username='commercial', password='password123')
+        donnees = self.client.get(reverse('graphiques_tableau_de_bord')).json()
+        gagnees = next(s for s in donnees['series'] if s['etat'] == 'gagnee')
+        self.assertEqual(gagnees['montants'][-1], 1000.0)
+        response = self.client.get(reverse('graphiques_tableau_de_bord'), {'dimension': 'responsable'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('graphiques_tableau_de_bord'), {'periodes': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class HistoriqueStatutsTest(OpportunitesTestCase):
+    def historique(self, opportunite):
+        return list(
+            TransitionStatut.objects.filter(opportunite=opportunite).order_by('date', 'id')
+            .values_list('statut_precedent', 'statut')
+        )
+
+    def test_transitions_enregistrees(self):
+        """Création, changement de statut et modification groupée ajoutent une transition ; pas les autres modifications."""
+        opportunite = self.creer("Oppo 1", 'qualification')
+        opportunite.description = "Sans changement de statut"
+        opportunite.save()
+        opportunite.statut = 'negociation'
+        opportunite.save()
+        modifier_opportunites(Opportunite.objects.all(), statut='gagnee')
+        modifier_opportunites(Opportunite.objects.all(), responsable=self.manager)
+        self.assertEqual(
+            self.historique(opportunite),
+            [(None, 'qualification'), ('qualification', 'negociation'), ('negociation', 'gagnee')],
+        )
+
+    def test_reconstruire_historique(self):
+        """La reconstitution ne touche que les opportunités sans historique et peut être relancée."""
+        ouverte = self.creer("Oppo 1", 'negociation')
+        gagnee = self.creer("Oppo 2", 'gagnee')
+        suivie = self.creer("Oppo 3", 'perdue')
+        TransitionStatut.objects.exclude(opportunite=suivie).delete()
+
+        sortie = StringIO()
+        call_command('reconstruire_historique_statuts', '--taille-lot', '1', stdout=sortie)
+        self.assertIn('3 transition(s)', sortie.getvalue())
+        self.assertEqual(self.historique(ouverte), [(None, 'negociation')])
+        self.assertEqual(self.historique(gagnee), [(None, 'qualification'), ('qualification', 'gagnee')])
+        self.assertEqual(self.historique(suivie), [(None, 'perdue')])
+        self.assertEqual(TransitionStatut.objects.filter(reconstituee=True).count(), 3)
+
+        call_command('reconstruire_historique_statuts', stdout=sortie)
+        self.assertIn('0 transition(s)', sortie.getvalue())
+
+    def test_entonnoir(self):
+        """Entrées, durées et taux de passage par étape, limités à ses opportunités pour un commercial."""
+        debut = timezone.now() - timedelta(days=30)
+        for i, (parcours, responsable) in enumerate([
+            (['qualification', 'negociation', 'gagnee'], self.commercial),
+            (['qualification', 'negociation', 'perdue'], self.commercial),
+            (['qualification'], self.manager),
+        ]):
+            opportunite = self.creer(f"Oppo {i}", parcours[0], responsable=responsable)
+            for statut in parcours[1:]:
+                opportunite.statut = statut
+                opportunite.save()
+            # Une étape tous les dix jours.
+            for j, transition in enumerate(TransitionStatut.objects.filter(opportunite=opportunite).order_by('id')):
+                TransitionStatut.objects.filter(pk=transition.pk).update(date=debut + timedelta(days=10 * j))
+
+        self.client.login(username='manager', password='password123')
+        donnees = self.client.get(reverse('entonnoir_tableau_de_bord')).json()
+        etapes = {etape['statut']: etape for etape in donnees['etapes']}
+        qualification = etapes['qualification']
+        self.assertEqual((qualification['entrees'], qualification['en_cours']), (3, 1))
+        self.assertEqual(qualification['duree_moyenne_jours'], 10.0)
+        self.assertEqual(qualification['taux_gain'], round(1 / 3, 4))
+        self.assertEqual(qualification['sorties'], [
+            {'statut': 'negociation', 'nombre': 2, 'taux': round(2 / 3, 4), 'duree_moyenne_jours': 10.0},
+        ])
+        self.assertEqual(
+            [(s['statut'], s['nombre']) for s in etapes['negociation']['sorties']], [('gagnee', 1), ('perdue', 1)],
+        )
+        self.assertEqual(etapes['gagnee']['duree_mediane_jours'], None)
+
+        # Fenêtre qui s'arrête avant les entrées en négociation.
+        donnees = self.client.get(
+            reverse('entonnoir_tableau_de_bord'), {'au': (debut + timedelta(days=5)).date().isoformat()},
+        ).json()
+        etapes = {etape['statut']: etape for etape in donnees['etapes']}
+        self.assertEqual((etapes['qualification']['entrees'], etapes['negociation']['entrees']), (3, 0))
+
+        self.client.login(username='commercial', password='password123')
+        donnees = self.client.get(reverse('entonnoir_tableau_de_bord')).json()
+        self.assertEqual(donnees['etapes'][0]['entrees'], 2)
+        response = self.client.get(reverse('entonnoir_tableau_de_bord'), {'responsable': self.manager.pk})
+        self.assertEqual(response.status_code, 400)
+
+    def test_archives_gardent_leur_contribution(self):
+        """Agrégats, cumuls et entonnoir inchangés par l'archivage ; la suppression du client retire l'archive."""
+        gagnee = self.creer("Oppo 1", 'gagnee')
+        self.creer("Oppo 2", 'negociation')
+        Opportunite.objects.filter(pk=gagnee.pk).update(date_cloture=timezone.now() - timedelta(days=400))
+        cumuls.reconstruire()
+        avant = (
+            list(AgregatOpportunite.objects.order_by('statut').values_list('statut', 'nombre', 'montant_total')),
+            sorted(map(str, cumuls.calculer(CumulPeriodique.Granularite.MOIS))),
+        )
+        self.client.login(username='commercial', password='password123')
+        entonnoir = self.client.get(reverse('entonnoir_tableau_de_bord')).json()
+
+        self.assertEqual(archiver(age_jours=365), 1)
+        self.assertEqual(
+            (
+                list(AgregatOpportunite.objects.order_by('statut').values_list('statut', 'nombre', 'montant_total')),
+                sorted(map(str, cumuls.calculer(CumulPeriodique.Granularite.MOIS))),
+            ),
+            avant,
+        )
+        self.assertEqual(agregats.reconstruire(), 0)
+        self.assertEqual(self.client.get(reverse('entonnoir_tableau_de_bord')).json(), entonnoir)
+
+        self.particulier.delete()
+        self.assertFalse(OpportuniteArchivee.objects.exists())
+        self.assertFalse(TransitionStatut.objects.exists())
+        self.assertEqual(AgregatOpportunite.objects.filter(nombre__gt=0).count(), 0)
@@ -3,4 +3,6 @@ from . import views
 
 urlpatterns = [
     path('', views.dashboard_view, name='tableau_de_bord'),
+    path('graphiques/', views.graphiques_view, name='graphiques_tableau_de_bord'),
+    path('entonnoir/', views.entonnoir_view, name='entonnoir_tableau_de_bord'),
 ]
\ No newline at end of file
@@ -1,10 +1,23 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.utils import timezone
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Sum, Q
+from django.db.models import Sum
 from utilisateur.models import Utilisateur
+from catalogue_service.cache import objet_catalogue
+from catalogue_service.models import Categorie, Service
 from gestion_commerciale.models import Particulier, Entreprise, Opportunite
-from catalogue_service.models import Service
+from utils.concurrence import executer_en_parallele, executer_en_sequence
 from utils.permissions import est_manager_ou_plus, est_administrateur
+from utils.routage import lecture_replica
+from . import cumuls, entonnoir
+from .cache import lire_tableau, memoriser_tableau
+from .models import AgregatOpportunite, CumulPeriodique
 
 STATUT_COLORS = {
     'gagnee': '#28a745',  # Vert
@@ -14,61 +27,265 @@ STATUT_COLORS = {
 }
 
 @login_required
-def dashboard_view(request):
-    user = request.user
-    context = {}
+async def dashboard_view(request):
+    """
+    Vue asynchrone. Sous ASGI, les requêtes indépendantes du tableau de bord
+    sont lancées en parallèle (une connexion par requête) ; sous WSGI, la vue
+    est exécutée dans la boucle créée pour la requête et calcule tout en
+    séquence sur la connexion habituelle.
+    """
+    user = await request.auser()
+    generation, context = await sync_to_async(lire_tableau)(user)
+    if context is None:
+        with lecture_replica():
+            if isinstance(request, ASGIRequest):
+                requetes = await sync_to_async(requetes_tableau)(user)
+                resultats = await executer_en_parallele(requetes)
+                context = assembler_tableau(user, resultats)
+            else:
+                context = await sync_to_async(calculer_tableau)(user)
+        await sync_to_async(memoriser_tableau)(user, generation, context)
+
+    if context['vue_manager']:
+        # Partagé entre managers et administrateurs : ce drapeau n'est pas mis en cache.
+        context = {**context, 'est_administrateur': await sync_to_async(est_administrateur)(user)}
+        template = 'tableau_de_bord/tableau_de_bord_gestion.html'
+    else:
+        template = 'tableau_de_bord/tableau_de_bord_commercial.html'
+    return await sync_to_async(render)(request, template, context)
 
-    if est_manager_ou_plus(user):
+
+def requetes_tableau(user):
+    """
+    Requêtes indépendantes du tableau de bord (nom -> fonction qui l'évalue),
+    exécutables en séquence ou en parallèle.
+    """
+    vue_manager = est_manager_ou_plus(user)
+    if vue_manager:
         opportunites_qs = Opportunite.objects.all()
+        agregats_qs = AgregatOpportunite.objects.all()
+        particuliers_qs = Particulier.objects.all()
+        entreprises_qs = Entreprise.objects.all()
     else:
         opportunites_qs = Opportunite.objects.filter(responsable=user)
+        agregats_qs = AgregatOpportunite.objects.filter(responsable=user)
+        particuliers_qs = Particulier.objects.filter(responsable=user)
+        entreprises_qs = Entreprise.objects.filter(responsable=user)
 
-    opportunites_agg = opportunites_qs.aggregate(
-        total_opportunites=Count('id'),
-        pipeline_total=Sum('montant', filter=~Q(statut__in=['gagnee', 'perdue'])),
-        ca_total=Sum('montant', filter=Q(statut='gagnee'))
-    )
-    context.update(opportunites_agg)
+    requetes = {
+        # Une ligne par statut, lue dans la table d'agrégats plutôt qu'en parcourant les opportunités.
+        'opportunites_par_statut': lambda: list(
+            agregats_qs.values('statut')
+            .annotate(count=Sum('nombre'), montant=Sum('montant_total'))
+            .filter(count__gt=0)
+            .order_by('statut')
+        ),
+        'opportunites_recentes': lambda: list(opportunites_qs.select_related(
+            'client_particulier', 'client_entreprise', 'responsable'
+        ).order_by('-date_creation')[:5]),
+        'nombre_particuliers': particuliers_qs.count,
+        'nombre_entreprises': entreprises_qs.count,
+    }
+    if vue_manager:
+        ventes = AgregatOpportunite.objects.filter(statut='gagnee', service__isnull=False, nombre__gt=0)
+        requetes['services_vendus'] = lambda: classement(
+            ventes.values('service_id').annotate(ventes=Sum('nombre')).order_by('-ventes'),
+            Service, 'service_id', 'nom',
+        )
+        requetes['services_vendus_par_categorie'] = lambda: classement(
+            ventes.values('categorie_id').annotate(ventes=Sum('nombre')).order_by('-ventes'),
+            Categorie, 'categorie_id', 'categorie__nom',
+        )
+    return requetes
+
+
+def classement(lignes, modele, champ, cle_nom):
+    """Lignes (clé, ventes) complétées du nom lu dans l'instantané du catalogue, sans jointure."""
+    resultat = []
+    for ligne in lignes:
+        objet = objet_catalogue(modele, ligne[champ]) if ligne[champ] is not None else None
+        resultat.append({cle_nom: objet.nom if objet else None, 'ventes': ligne['ventes']})
+    return resultat
 
-    total_opportunites = opportunites_agg['total_opportunites']
-    opportunites_gagnees = opportunites_qs.filter(statut='gagnee').count()
-    taux_conversion = (opportunites_gagnees / total_opportunites) * 100 if total_opportunites > 0 else 0
-    context['taux_conversion'] = round(taux_conversion, 2)
 
-    opportunites_par_statut_list = list(opportunites_qs.values('statut').annotate(count=Count('id')))
+def assembler_tableau(user, resultats):
+    """Contexte du tableau de bord à partir des résultats de requetes_tableau()."""
+    context = {'vue_manager': est_manager_ou_plus(user)}
+
+    opportunites_par_statut_list = resultats['opportunites_par_statut']
     for item in opportunites_par_statut_list:
         item['color'] = STATUT_COLORS.get(item['statut'], '#6c757d')
 
     context['opportunites_par_statut'] = opportunites_par_statut_list
 
-    context['opportunites_recentes'] = opportunites_qs.order_by('-date_creation')[:5]
+    total_opportunites = sum(item['count'] for item in opportunites_par_statut_list)
+    opportunites_gagnees = sum(item['count'] for item in opportunites_par_statut_list if item['statut'] == 'gagnee')
+    context['total_opportunites'] = total_opportunites
+    context['pipeline_total'] = sum(
+        (item['montant'] for item in opportunites_par_statut_list if item['statut'] not in ['gagnee', 'perdue']),
+        Decimal('0'),
+    )
+    context['ca_total'] = sum(
+        (item['montant'] for item in opportunites_par_statut_list if item['statut'] == 'gagnee'),
+        Decimal('0'),
+    )
+
+    taux_conversion = (opportunites_gagnees / total_opportunites) * 100 if total_opportunites > 0 else 0
+    context['taux_conversion'] = round(taux_conversion, 2)
+
+    context['opportunites_recentes'] = resultats['opportunites_recentes']
+    context['nombre_clients'] = resultats['nombre_particuliers'] + resultats['nombre_entreprises']
 
-    if est_manager_ou_plus(user):
-        context['vue_manager'] = True
-        context['est_administrateur'] = est_administrateur(user)
+    if context['vue_manager']:
+        context['services_vendus'] = resultats['services_vendus']
+        context['services_vendus_par_categorie'] = resultats['services_vendus_par_categorie']
 
-        nombre_particuliers = Particulier.objects.count()
-        nombre_entreprises = Entreprise.objects.count()
-        context['nombre_clients'] = nombre_particuliers + nombre_entreprises
+    return context
+
+
+def calculer_tableau(user):
+    """Contexte du tableau de bord, identique pour tous les utilisateurs d'une même portée."""
+    return assembler_tableau(user, executer_en_sequence(requetes_tableau(user)))
 
-        context['services_vendus'] = list(
-            Service.objects.filter(opportunites__statut='gagnee')
-            .values('nom').annotate(ventes=Count('opportunites__id'))
-            .order_by('-ventes')
-        )
 
-        context['services_vendus_par_categorie'] = list(
-            Service.objects.filter(opportunites__statut='gagnee')
-            .values('categorie__nom').annotate(ventes=Count('opportunites__id'))
-            .order_by('-ventes')
+Granularite = CumulPeriodique.Granularite
+
+# Nombre de périodes renvoyées par défaut (jusqu'à la période courante comprise), et au plus.
+NOMBRE_PERIODES = {Granularite.MOIS: 12, Granularite.SEMAINE: 26}
+NOMBRE_PERIODES_MAX = 120
+
+# Dimension de ventilation -> champ des cumuls regroupé.
+DIMENSIONS = {'service': 'service_id', 'categorie': 'service_id', 'responsable': 'responsable_id'}
+
+
+@login_required
+def graphiques_view(request):
+    """
+    Séries par période (mois ou semaine) des montants et nombres d'opportunités
+    gagnées, perdues et ouvertes, lues dans les cumuls périodiques et non dans
+    les opportunités. Paramètres GET : ``granularite`` (mois, semaine),
+    ``periodes`` (nombre de périodes jusqu'à la courante), ``dimension``
+    (service, categorie, responsable ; sans dimension : une série par état).
+    Un commercial ne voit que ses opportunités et ne peut pas ventiler par responsable.
+    """
+    vue_manager = est_manager_ou_plus(request.user)
+    granularite = request.GET.get('granularite') or Granularite.MOIS
+    dimension = request.GET.get('dimension') or None
+    try:
+        nombre = int(request.GET.get('periodes') or NOMBRE_PERIODES.get(granularite, 0))
+    except ValueError:
+        nombre = 0
+    if (granularite not in Granularite.values or not 0 < nombre <= NOMBRE_PERIODES_MAX
+            or (dimension is not None and dimension not in DIMENSIONS)
+            or (dimension == 'responsable' and not vue_manager)):
+        return JsonResponse({'erreur': "Paramètres invalides."}, status=400)
+
+    cumuls.rafraichir_si_perime()
+    periodes = dernieres_periodes(granularite, nombre)
+    with lecture_replica():
+        lignes = CumulPeriodique.objects.filter(
+            granularite=granularite, periode__gte=periodes[0], periode__lte=periodes[-1],
+        )
+        if not vue_manager:
+            lignes = lignes.filter(responsable=request.user)
+        champ = DIMENSIONS.get(dimension)
+        lignes = list(
+            lignes.values('periode', 'etat', *([champ] if champ else []))
+            .annotate(nombre=Sum('nombre'), montant=Sum('montant_total'))
         )
-        return render(request, 'tableau_de_bord/tableau_de_bord_gestion.html', context)
+        libelles = libelles_dimension(dimension, {ligne[champ] for ligne in lignes} if champ else set())
+
+    rang = {periode: i for i, periode in enumerate(periodes)}
+    series = {}
+    for ligne in lignes:
+        cle = None
+        if champ:
+            cle = cle_dimension(dimension, ligne[champ])
+            cle = cle if cle in libelles else None
+        serie = series.setdefault((ligne['etat'], cle), {
+            'etat': ligne['etat'],
+            'cle': cle,
+            'libelle': libelles[cle] if champ else CumulPeriodique.Etat(ligne['etat']).label,
+            'nombres': [0] * nombre,
+            'montants': [0.0] * nombre,
+        })
+        i = rang[ligne['periode']]
+        serie['nombres'][i] += ligne['nombre']
+        serie['montants'][i] = round(serie['montants'][i] + float(ligne['montant']), 2)
+
+    ordre_etats = list(CumulPeriodique.Etat.values)
+    return JsonResponse({
+        'granularite': granularite,
+        'dimension': dimension,
+        'periodes': [periode.isoformat() for periode in periodes],
+        'a_jour_au': cumuls.a_jour_au(),
+        'series': sorted(series.values(), key=lambda s: (ordre_etats.index(s['etat']), -sum(s['montants']))),
+    })
 
-    else:
-        context['vue_manager'] = False
 
-        nombre_particuliers = Particulier.objects.filter(responsable=user).count()
-        nombre_entreprises = Entreprise.objects.filter(responsable=user).count()
-        context['nombre_clients'] = nombre_particuliers + nombre_entreprises
+def dernieres_periodes(granularite, nombre):
+    """Les ``nombre`` dernières périodes, de la plus ancienne à la courante."""
+    periodes = [cumuls.debut_periode(granularite, timezone.localdate())]
+    while len(periodes) < nombre:
+        periodes.append(cumuls.debut_periode(granularite, periodes[-1] - timedelta(days=1)))
+    return periodes[::-1]
 
-        return render(request, 'tableau_de_bord/tableau_de_bord_commercial.html', context)
\ No newline at end of file
+
+def cle_dimension(dimension, valeur):
+    """Clé de série : la catégorie d'un service (selon le catalogue actuel) pour la dimension « categorie »."""
+    if dimension != 'categorie' or valeur is None:
+        return valeur
+    service = objet_catalogue(Service, valeur)
+    return service.categorie_id if service else None
+
+
+def libelles_dimension(dimension, valeurs):
+    """Clé de série -> libellé ; les services, catégories et responsables disparus sont regroupés sous None."""
+    if dimension == 'responsable':
+        libelles = {
+            u.pk: f"{u.first_name} {u.last_name}".strip() or u.username
+            for u in Utilisateur.objects.filter(pk__in=[v for v in valeurs if v is not None])
+        }
+        return {None: "Non attribué", **libelles}
+    if dimension == 'service':
+        libelles = {v: objet.nom for v in valeurs if v is not None and (objet := objet_catalogue(Service, v))}
+        return {None: "Sans service", **libelles}
+    libelles = {}
+    for v in valeurs:
+        cle = cle_dimension(dimension, v)
+        if cle is not None and (categorie := objet_catalogue(Categorie, cle)):
+            libelles[cle] = categorie.nom
+    return {None: "Sans catégorie", **libelles}
+
+
+# Fenêtre analysée par défaut par l'entonnoir, jusqu'à aujourd'hui compris.
+DUREE_ENTONNOIR = timedelta(days=365)
+
+
+@login_required
+def entonnoir_view(request):
+    """
+    Entonnoir de vente calculé sur l'historique des statuts : par étape, les
+    entrées entre ``du`` et ``au`` (dates ISO, comprises ; par défaut les 365
+    derniers jours), la durée passée dans l'étape, les taux de passage vers
+    les étapes suivantes et la part finalement gagnée. ``reconstituees=0``
+    écarte l'historique reconstitué. Un manager peut limiter à un
+    ``responsable`` ; un commercial ne voit que ses opportunités.
+    """
+    try:
+        au = date.fromisoformat(request.GET['au']) if request.GET.get('au') else timezone.localdate()
+        du = date.fromisoformat(request.GET['du']) if request.GET.get('du') else au - DUREE_ENTONNOIR
+        responsable = int(request.GET['responsable']) if request.GET.get('responsable') else None
+    except ValueError:
+        return JsonResponse({'erreur': "Paramètres invalides."}, status=400)
+    if du > au or (responsable is not None and not est_manager_ou_plus(request.user)):
+        return JsonResponse({'erreur': "Paramètres invalides."}, status=400)
+    if not est_manager_ou_plus(request.user):
+        responsable = request.user.pk
+
+    with lecture_replica():
+        etapes = entonnoir.calculer_entonnoir(
+            cumuls.minuit(du), cumuls.minuit(au + timedelta(days=1)),
+            responsable=responsable, reconstituees=request.GET.get('reconstituees') != '0',
+        )
+    return JsonResponse({'du': du.isoformat(), 'au': au.isoformat(), 'responsable': responsable, 'etapes': etapes})
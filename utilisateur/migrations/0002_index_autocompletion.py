@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:10
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('utilisateur', '0001_initial'),
+        # Extension pg_trgm.
+        ('gestion_commerciale', '0003_recherche'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='utilisateur',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['last_name'], name='utilisateur_nom_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='utilisateur',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['first_name'], name='utilisateur_prenom_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='utilisateur',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['username'], name='utilisateur_username_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
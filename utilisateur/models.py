@@ -1,5 +1,7 @@
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
 from django.contrib.auth.models import AbstractUser, Group
+from utils.permissions import AUCUN_ROLE, memoriser_role
 
 class Role(models.TextChoices):
     ADMIN = 'ADMIN', 'Administrateur'
@@ -36,6 +38,16 @@ class Utilisateur(AbstractUser):
         try:
             group = Group.objects.get(name=group_name)
             self.groups.add(group)
+            memoriser_role(self, group_name)
         except Group.DoesNotExist:
+            memoriser_role(self, AUCUN_ROLE)
             print(
-                f"Attention : le groupe '{group_name}' n'existe pas. Veuillez le créer dans l'administration de Django.")
\ No newline at end of file
+                f"Attention : le groupe '{group_name}' n'existe pas. Veuillez le créer dans l'administration de Django.")
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Autocomplétion des responsables (gestion_commerciale.recherche) : préfixe et similarité trigramme.
+            GinIndex(fields=['last_name'], name='utilisateur_nom_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['first_name'], name='utilisateur_prenom_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['username'], name='utilisateur_username_trgm', opclasses=['gin_trgm_ops']),
+        ]
\ No newline at end of file
@@ -0,0 +1,24 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+from utils.permissions import invalider_role
+from .models import Utilisateur
+
+
+@receiver(m2m_changed, sender=Utilisateur.groups.through)
+def invalider_role_groupes_modifies(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            instance.__dict__.pop('_role_effectif', None)
+            invalider_role(instance.pk)
+    elif action == 'pre_clear':
+        invalider_role(*instance.utilisateur_groups_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        invalider_role(*pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalider_role_membres_groupe(sender, instance, **kwargs):
+    if instance.pk:
+        invalider_role(*instance.utilisateur_groups_set.values_list('pk', flat=True))
@@ -1,6 +1,9 @@
 from django.test import TestCase, Client
 from django.urls import reverse
+from django.contrib.auth.models import Group
+from django.core.cache import cache
 from utilisateur.models import Utilisateur, Role
+from utils.permissions import cle_cache_role, est_administrateur, est_manager_ou_plus, est_commercial_ou_plus
 
 class UtilisateurViewTest(TestCase):
     def setUp(self):
@@ -35,4 +38,51 @@ class UtilisateurViewTest(TestCase):
             follow=True
         )
         self.assertEqual(response.status_code, 200)
-        self.assertContains(response, "Veuillez entrer un nom d’utilisateur et un mot de passe valides")
\ No newline at end of file
+        self.assertContains(response, "Veuillez entrer un nom d’utilisateur et un mot de passe valides")
+
+class RoleEffectifTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for nom in ['Administrateur', 'Manager', 'Commercial']:
+            Group.objects.get_or_create(name=nom)
+        cls.user = Utilisateur.objects.create_user(
+            username='role_user', password='password123', role=Role.COMMERCIAL
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_role_resolu_une_seule_fois(self):
+        """Le rôle est lu une fois en base puis servi par le cache, même pour une nouvelle instance."""
+        user = Utilisateur.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(est_commercial_ou_plus(user))
+            self.assertFalse(est_manager_ou_plus(user))
+            self.assertFalse(est_administrateur(user))
+        autre_instance = Utilisateur.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(est_commercial_ou_plus(autre_instance))
+
+    def test_role_invalide_par_save(self):
+        """Changer le rôle via save() est immédiatement pris en compte."""
+        self.assertFalse(est_manager_ou_plus(Utilisateur.objects.get(pk=self.user.pk)))
+        self.user.role = Role.MANAGER
+        self.user.save()
+        self.assertTrue(est_manager_ou_plus(Utilisateur.objects.get(pk=self.user.pk)))
+
+    def test_role_change_vu_malgre_cache_perime(self):
+        """Un rôle encore en cache dans un autre processus ne survit pas à un changement de rôle."""
+        self.assertFalse(est_manager_ou_plus(Utilisateur.objects.get(pk=self.user.pk)))
+        self.user.role = Role.MANAGER
+        self.user.save()
+        # Entrée que l'invalidation du processus courant n'atteint pas ailleurs.
+        cache.set(cle_cache_role(self.user.pk, Role.COMMERCIAL), 'Commercial')
+        self.assertTrue(est_manager_ou_plus(Utilisateur.objects.get(pk=self.user.pk)))
+
+    def test_role_invalide_par_groupes(self):
+        """Modifier les groupes d'un utilisateur, dans un sens ou dans l'autre, invalide le cache."""
+        self.assertFalse(est_administrateur(Utilisateur.objects.get(pk=self.user.pk)))
+        Group.objects.get(name='Administrateur').utilisateur_groups_set.add(self.user)
+        self.assertTrue(est_administrateur(Utilisateur.objects.get(pk=self.user.pk)))
+        self.user.groups.clear()
+        self.assertFalse(est_commercial_ou_plus(Utilisateur.objects.get(pk=self.user.pk)))
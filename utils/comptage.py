@@ -0,0 +1,36 @@
+import json
+
+from django.db import connections
+from django.db.models import Count, Window
+
+# Au-delà de ce nombre de lignes estimées, un comptage exact coûte plus cher
+# que la page elle-même : on affiche l'estimation du planificateur.
+SEUIL_ESTIMATION = 100_000
+
+ANNOTATION_TOTAL = 'total_lignes'
+
+
+def estimer_lignes(queryset):
+    """
+    Nombre de lignes estimé par le planificateur PostgreSQL (EXPLAIN sans
+    exécution), ou None si la base ne le permet pas.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def annoter_total(queryset):
+    """Ajoute à chaque ligne le nombre total de lignes filtrées (COUNT(*) OVER ())."""
+    return queryset.annotate(**{ANNOTATION_TOTAL: Window(expression=Count('pk'))})
+
+
+def lire_total(lignes):
+    return getattr(lignes[0], ANNOTATION_TOTAL) if lignes else 0
@@ -0,0 +1,44 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+
+def _dans_une_transaction():
+    return any(connections[alias].in_atomic_block for alias in connections)
+
+
+def _executer_isole(requete):
+    # Exécutée dans un thread de l'exécuteur partagé : la connexion de ce thread
+    # lui est propre mais n'est liée à aucun cycle de requête. Elle est rendue
+    # tout de suite (au pool si DB_POOL est actif) plutôt que gardée
+    # CONN_MAX_AGE secondes par chacun des threads de l'exécuteur.
+    try:
+        return requete()
+    finally:
+        connections.close_all()
+
+
+def executer_en_sequence(requetes):
+    """Exécute les fonctions de ``requetes`` (nom -> callable) l'une après l'autre."""
+    return {nom: requete() for nom, requete in requetes.items()}
+
+
+async def executer_en_parallele(requetes):
+    """
+    Exécute les fonctions de ``requetes`` (nom -> callable sans argument, qui
+    évaluent chacune leurs requêtes SQL) en parallèle, chacune dans son propre
+    thread donc sur sa propre connexion : la durée totale est celle de la plus
+    lente, et non leur somme.
+
+    Si une transaction est ouverte (tests, ATOMIC_REQUESTS), les autres
+    connexions ne verraient pas ses écritures non validées : tout est alors
+    exécuté en séquence sur la connexion courante.
+    """
+    if await sync_to_async(_dans_une_transaction)():
+        return await sync_to_async(executer_en_sequence)(requetes)
+    resultats = await asyncio.gather(*(
+        sync_to_async(_executer_isole, thread_sensitive=False)(requete)
+        for requete in requetes.values()
+    ))
+    return dict(zip(requetes, resultats))
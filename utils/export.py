@@ -0,0 +1,81 @@
+import csv
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+TAILLE_LOT_EXPORT = 2000
+
+# Premiers caractères interprétés comme une formule par Excel / LibreOffice.
+DEBUTS_FORMULE = ('=', '+', '-', '@', '\t', '\r')
+
+
+class _Tampon:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne écrite au lieu de la stocker."""
+
+    def write(self, valeur):
+        return valeur
+
+
+def _cellule(valeur, libelles):
+    if valeur is None:
+        return ''
+    if libelles:
+        return libelles.get(str(valeur), valeur)
+    if isinstance(valeur, datetime):
+        return timezone.localtime(valeur).strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valeur, str) and valeur.startswith(DEBUTS_FORMULE):
+        # Saisie utilisateur : préfixée d'une apostrophe pour rester du texte.
+        return f"'{valeur}"
+    return valeur
+
+
+class ExportCSVMixin:
+    """
+    À placer avant ListView : ``?export=csv`` renvoie la liste filtrée (même
+    get_queryset(), donc mêmes filtres et même périmètre de rôle) en CSV.
+
+    Les lignes sont lues par values_list() avec un curseur côté serveur
+    (QuerySet.iterator) et écrites au fil de l'eau dans une StreamingHttpResponse :
+    la mémoire reste constante quel que soit le nombre de lignes.
+
+    ``export_colonnes`` : liste de (chemin ORM, en-tête) ; les champs à choix
+    sont exportés avec leur libellé.
+    """
+    export_kwarg = 'export'
+    export_colonnes = ()
+    export_nom = None
+
+    def get(self, request, *args, **kwargs):
+        if request.GET.get(self.export_kwarg) == 'csv':
+            return self.exporter_csv(self.get_queryset())
+        return super().get(request, *args, **kwargs)
+
+    def _libelles_choix(self, model, chemin):
+        *relations, nom = chemin.split('__')
+        try:
+            for relation in relations:
+                model = model._meta.get_field(relation).related_model
+            champ = model._meta.get_field(nom)
+        except (FieldDoesNotExist, AttributeError):
+            return None
+        return {str(cle): libelle for cle, libelle in champ.flatchoices} if champ.choices else None
+
+    def lignes_csv(self, queryset):
+        chemins = [chemin for chemin, _ in self.export_colonnes]
+        choix = [self._libelles_choix(queryset.model, chemin) for chemin in chemins]
+        ecrivain = csv.writer(_Tampon(), delimiter=';')
+
+        yield '\ufeff' + ecrivain.writerow([entete for _, entete in self.export_colonnes])
+        lignes = queryset.prefetch_related(None).values_list(*chemins).iterator(chunk_size=TAILLE_LOT_EXPORT)
+        for ligne in lignes:
+            yield ecrivain.writerow([_cellule(valeur, libelles) for valeur, libelles in zip(ligne, choix)])
+
+    def exporter_csv(self, queryset):
+        nom = self.export_nom or queryset.model._meta.verbose_name_plural.lower()
+        response = StreamingHttpResponse(self.lignes_csv(queryset), content_type='text/csv; charset=utf-8')
+        # Nom accentué (« opportunités ») : encodé en filename* (RFC 6266), l'en-tête reste ASCII.
+        response['Content-Disposition'] = content_disposition_header(True, f'{nom}-{timezone.localdate():%Y%m%d}.csv')
+        return response
@@ -0,0 +1,172 @@
+import json
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger('essentiel_crm.requetes')
+
+REGLAGES_PAR_DEFAUT = {
+    # Part des requêtes HTTP mesurées (1.0 : toutes).
+    'TAUX_ECHANTILLONNAGE': 0.01,
+    # Au-delà, la ligne de journal passe en WARNING.
+    'SEUIL_DUREE_MS': 500,
+    'SEUIL_REQUETES_SQL': 30,
+    # En-tête Server-Timing sur les réponses mesurées, pour les utilisateurs staff
+    # seulement : il révèle le nombre et la durée des requêtes SQL.
+    'EN_TETE_SERVER_TIMING': False,
+}
+
+_mesures = ContextVar('mesures_requete', default=None)
+
+
+def reglages():
+    return {**REGLAGES_PAR_DEFAUT, **getattr(settings, 'INSTRUMENTATION', {})}
+
+
+class Mesures:
+    """Compteurs d'une requête HTTP, alimentés depuis tous les threads qu'elle lance."""
+
+    def __init__(self):
+        self.verrou = threading.Lock()
+        self.requetes_sql = 0
+        self.duree_sql = 0.0
+        self.plus_lente = (0.0, '')
+        self.duree_gabarits = 0.0
+        # Posé par InstrumentationMiddleware.process_view, juste avant l'appel de la vue.
+        self.debut_vue = None
+
+    def ajouter_sql(self, duree, sql):
+        with self.verrou:
+            self.requetes_sql += 1
+            self.duree_sql += duree
+            if duree > self.plus_lente[0]:
+                self.plus_lente = (duree, sql)
+
+    def ajouter_gabarit(self, duree):
+        with self.verrou:
+            self.duree_gabarits += duree
+
+
+def _mesurer_sql(execute, sql, params, many, context):
+    mesures = _mesures.get()
+    if mesures is None:
+        return execute(sql, params, many, context)
+    debut = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        mesures.ajouter_sql(time.perf_counter() - debut, sql)
+
+
+def _installer_sur_connexion(connection, **kwargs):
+    if _mesurer_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_mesurer_sql)
+
+
+class _TemplateMesure(Template):
+    def render(self, context=None, request=None):
+        mesures = _mesures.get()
+        if mesures is None:
+            return super().render(context, request)
+        debut = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            mesures.ajouter_gabarit(time.perf_counter() - debut)
+
+
+class DjangoTemplatesMesures(DjangoTemplates):
+    """Moteur DjangoTemplates qui chronomètre le rendu des gabarits (hors inclusions, déjà comprises)."""
+
+    def from_string(self, template_code):
+        return _TemplateMesure(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return _TemplateMesure(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class InstrumentationMiddleware:
+    """
+    Mesure, pour une part échantillonnée des requêtes, le nombre de requêtes SQL,
+    leur durée totale, la plus lente, le temps de rendu des gabarits, le temps
+    de la vue (rendu différé d'une TemplateResponse compris) et le temps total
+    sous le middleware. Résultat dans une ligne JSON du journal
+    « essentiel_crm.requetes », indexée par nom d'URL : INFO, ou WARNING
+    au-delà des seuils ; et, si activé, dans l'en-tête Server-Timing des
+    réponses aux utilisateurs staff. Réglages : settings.INSTRUMENTATION.
+
+    Les requêtes non échantillonnées ne paient qu'un test de ContextVar par
+    requête SQL. Le chronométrage SQL est posé sur chaque connexion à sa
+    création : il couvre aussi les threads lancés par la vue (tableau de bord).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        connection_created.connect(_installer_sur_connexion)
+        for connection in connections.all(initialized_only=True):
+            _installer_sur_connexion(connection)
+
+    def __call__(self, request):
+        options = reglages()
+        if random.random() >= options['TAUX_ECHANTILLONNAGE']:
+            return self.get_response(request)
+
+        mesures = Mesures()
+        jeton = _mesures.set(mesures)
+        debut = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            duree = time.perf_counter() - debut
+            _mesures.reset(jeton)
+
+        duree_vue = debut + duree - mesures.debut_vue if mesures.debut_vue is not None else 0.0
+        user = getattr(request, 'user', None)
+        if options['EN_TETE_SERVER_TIMING'] and getattr(user, 'is_staff', False):
+            response['Server-Timing'] = self.server_timing(mesures, duree, duree_vue)
+        self.journaliser(request, response, mesures, duree, duree_vue, options)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Dernier middleware de la liste : la vue est appelée juste après.
+        mesures = _mesures.get()
+        if mesures is not None:
+            mesures.debut_vue = time.perf_counter()
+
+    def server_timing(self, mesures, duree, duree_vue):
+        return ', '.join([
+            f'total;dur={duree * 1000:.1f};desc="Traitement de la requête"',
+            f'vue;dur={duree_vue * 1000:.1f};desc="Vue"',
+            f'sql;dur={mesures.duree_sql * 1000:.1f};desc="{mesures.requetes_sql} requêtes SQL"',
+            f'sql-max;dur={mesures.plus_lente[0] * 1000:.1f};desc="Requête SQL la plus lente"',
+            f'gabarits;dur={mesures.duree_gabarits * 1000:.1f};desc="Rendu des gabarits"',
+        ])
+
+    def journaliser(self, request, response, mesures, duree, duree_vue, options):
+        correspondance = getattr(request, 'resolver_match', None)
+        duree_ms = duree * 1000
+        lente = duree_ms > options['SEUIL_DUREE_MS'] or mesures.requetes_sql > options['SEUIL_REQUETES_SQL']
+        logger.log(logging.WARNING if lente else logging.INFO, json.dumps({
+            'url': correspondance.view_name if correspondance else None,
+            'methode': request.method,
+            'chemin': request.path,
+            'statut': response.status_code,
+            'duree_ms': round(duree_ms, 1),
+            'vue_ms': round(duree_vue * 1000, 1),
+            'requetes_sql': mesures.requetes_sql,
+            'duree_sql_ms': round(mesures.duree_sql * 1000, 1),
+            'plus_lente_ms': round(mesures.plus_lente[0] * 1000, 1),
+            'plus_lente_sql': mesures.plus_lente[1][:300],
+            'gabarits_ms': round(mesures.duree_gabarits * 1000, 1),
+        }, ensure_ascii=False))
@@ -0,0 +1,187 @@
+import base64
+import binascii
+import json
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+from utils.comptage import SEUIL_ESTIMATION, annoter_total, estimer_lignes, lire_total
+
+
+class CurseurInvalide(Exception):
+    pass
+
+
+def _serialiser_valeur(valeur):
+    # isoformat() conserve les microsecondes, contrairement à DjangoJSONEncoder.
+    if hasattr(valeur, 'isoformat'):
+        return valeur.isoformat()
+    if valeur is None or isinstance(valeur, (bool, int, float, str)):
+        return valeur
+    return str(valeur)
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, total, total_estime=False, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.total = total
+        self.total_estime = total_estime
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Pagination par curseur (keyset) : chaque page est obtenue par un
+    WHERE (tri) > (dernière ligne vue) au lieu d'un OFFSET, ce qui garde un
+    coût constant quelle que soit la profondeur de la page.
+
+    Le tri est celui de Meta.ordering du modèle, complété par la clé primaire
+    pour départager les égalités. Les champs de tri ne doivent pas être nuls.
+
+    Le total est calculé par la requête de la première page (COUNT(*) OVER ()),
+    ou estimé par le planificateur au-delà de ``seuil_estimation`` lignes, puis
+    transporté dans les curseurs des pages suivantes.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None, seuil_estimation=SEUIL_ESTIMATION):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.seuil_estimation = seuil_estimation
+        self.model = queryset.model
+        self.ordering = self._normaliser_tri(ordering or self.model._meta.ordering)
+
+    def _normaliser_tri(self, ordering):
+        tri = []
+        for nom in ordering:
+            descendant = nom.startswith('-')
+            champ = self.model._meta.get_field(nom.lstrip('-'))
+            tri.append((champ, descendant))
+        pk = self.model._meta.pk
+        if not any(champ == pk for champ, _ in tri):
+            # Le départage suit le sens du premier critère pour rester couvert par un index.
+            tri.append((pk, tri[0][1] if tri else False))
+        return tri
+
+    def valeurs(self, obj):
+        """Valeurs des champs de tri de ``obj`` : la position d'un curseur placé sur lui."""
+        return [getattr(obj, champ.attname) for champ, _ in self.ordering]
+
+    def encoder_curseur(self, obj, total, total_estime, precedent=False):
+        valeurs = [_serialiser_valeur(valeur) for valeur in self.valeurs(obj)]
+        brut = json.dumps({'v': valeurs, 'p': precedent, 't': total, 'e': total_estime}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(brut.encode()).decode().rstrip('=')
+
+    def decoder_curseur(self, curseur):
+        try:
+            brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4))
+            donnees = json.loads(brut)
+            valeurs = donnees['v']
+            precedent = bool(donnees.get('p', False))
+            total = int(donnees['t'])
+            total_estime = bool(donnees.get('e', False))
+            if len(valeurs) != len(self.ordering):
+                raise CurseurInvalide(curseur)
+            valeurs = [champ.to_python(v) for (champ, _), v in zip(self.ordering, valeurs)]
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError) as exc:
+            raise CurseurInvalide(curseur) from exc
+        return valeurs, precedent, total, total_estime
+
+    def _filtre_apres(self, valeurs, inverse):
+        # (a, b, c) > (x, y, z)  <=>  a >= x AND (a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z))
+        conditions = []
+        for i, (champ, descendant) in enumerate(self.ordering):
+            egalites = {self.ordering[j][0].attname: valeurs[j] for j in range(i)}
+            lookup = 'lt' if descendant != inverse else 'gt'
+            conditions.append(Q(**egalites, **{f'{champ.attname}__{lookup}': valeurs[i]}))
+        # Borne sur le premier critère : seule condition d'accès à l'index (la disjonction n'en est
+        # pas une), elle fait partir le parcours de la position du curseur au lieu du début de l'index.
+        premier, descendant = self.ordering[0]
+        borne = Q(**{f"{premier.attname}__{'lte' if descendant != inverse else 'gte'}": valeurs[0]})
+        return borne & reduce(lambda a, b: a | b, conditions)
+
+    def requete_apres(self, valeurs, precedent=False):
+        """Lignes qui suivent (ou précèdent) la position ``valeurs``, dans l'ordre de la page."""
+        return self.queryset.filter(self._filtre_apres(valeurs, inverse=precedent)).order_by(
+            *self._order_by(inverse=precedent)
+        )
+
+    def _order_by(self, inverse):
+        return [
+            f"{'-' if descendant != inverse else ''}{champ.attname}"
+            for champ, descendant in self.ordering
+        ]
+
+    def page(self, curseur=None):
+        precedent = False
+        total = None
+        total_estime = False
+        if curseur:
+            valeurs, precedent, total, total_estime = self.decoder_curseur(curseur)
+            queryset = self.requete_apres(valeurs, precedent)
+        else:
+            queryset = self.queryset
+            estimation = estimer_lignes(queryset)
+            if estimation is not None and estimation > self.seuil_estimation:
+                total, total_estime = estimation, True
+            else:
+                queryset = annoter_total(queryset)
+            queryset = queryset.order_by(*self._order_by(inverse=False))
+
+        lignes = list(queryset[:self.per_page + 1])
+        if total is None:
+            total = lire_total(lignes)
+        encore = len(lignes) > self.per_page
+        lignes = lignes[:self.per_page]
+        if precedent:
+            lignes.reverse()
+
+        next_cursor = previous_cursor = None
+        if lignes:
+            if encore or precedent:
+                next_cursor = self.encoder_curseur(lignes[-1], total, total_estime)
+            if (encore and precedent) or (curseur and not precedent):
+                previous_cursor = self.encoder_curseur(lignes[0], total, total_estime, precedent=True)
+        return KeysetPage(lignes, self, total, total_estime, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """
+    À placer avant ListView : remplace la pagination par OFFSET de Django par
+    une pagination par curseur, lue dans le paramètre GET « curseur ».
+    """
+    paginate_by = 25
+    keyset_ordering = None
+    cursor_kwarg = 'curseur'
+    seuil_estimation = SEUIL_ESTIMATION
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(
+            queryset, page_size, ordering=self.keyset_ordering, seuil_estimation=self.seuil_estimation
+        )
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except CurseurInvalide:
+            raise Http404("Curseur de pagination invalide.")
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -1,18 +1,65 @@
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+
+# Groupes de rôle, du plus élevé au plus bas.
+GROUPES_ROLES = ['Administrateur', 'Manager', 'Commercial']
+
+# Invalidation explicite (invalider_role) dans le processus de l'écriture. La clé
+# porte Utilisateur.role, relu avec la ligne à chaque requête : un changement de
+# rôle est vu aussitôt par tous les processus, même avec un cache propre à chacun.
+# Seule une modification directe des groupes, sans changer le rôle, attend cette
+# durée dans les autres processus.
+DUREE_CACHE_ROLE = 300
+AUCUN_ROLE = ''
+
+
+def cle_cache_role(user_pk, role):
+    return f'permissions:role:{user_pk}:{role}'
+
+
+def memoriser_role(user, role):
+    """Enregistre le rôle effectif de l'utilisateur (nom de groupe, ou AUCUN_ROLE)."""
+    user._role_effectif = role
+    cache.set(cle_cache_role(user.pk, user.role), role, DUREE_CACHE_ROLE)
+
+
+def invalider_role(*user_pks):
+    roles = [valeur for valeur, _ in get_user_model()._meta.get_field('role').choices]
+    cache.delete_many([cle_cache_role(pk, role) for pk in user_pks for role in roles])
+
+
+def role_effectif(user):
+    """
+    Rôle le plus élevé parmi les groupes de l'utilisateur. Résolu une fois par
+    requête (mémorisé sur l'instance) et partagé entre requêtes via le cache ;
+    invalidé par Utilisateur.save() et par les changements de groupes.
+    """
+    if hasattr(user, '_role_effectif'):
+        return user._role_effectif
+    cle = cle_cache_role(user.pk, user.role)
+    role = cache.get(cle)
+    if role is None:
+        noms = set(user.groups.filter(name__in=GROUPES_ROLES).values_list('name', flat=True))
+        role = next((nom for nom in GROUPES_ROLES if nom in noms), AUCUN_ROLE)
+        cache.set(cle, role, DUREE_CACHE_ROLE)
+    user._role_effectif = role
+    return role
+
 
 def est_administrateur(user):
     if not user.is_authenticated:
         return False
 
-    return user.is_superuser or user.groups.filter(name='Administrateur').exists()
+    return user.is_superuser or role_effectif(user) == 'Administrateur'
 
 def est_manager_ou_plus(user):
     if not user.is_authenticated:
         return False
-    return user.is_superuser or user.groups.filter(name__in=['Administrateur', 'Manager']).exists()
+    return user.is_superuser or role_effectif(user) in ['Administrateur', 'Manager']
 
 def est_commercial_ou_plus(user):
     if not user.is_authenticated:
         return False
 
-    return user.is_superuser or user.groups.filter(name__in=['Administrateur', 'Manager', 'Commercial']).exists()
\ No newline at end of file
+    return user.is_superuser or role_effectif(user) in ['Administrateur', 'Manager', 'Commercial']
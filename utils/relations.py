@@ -0,0 +1,38 @@
+from django.db.models.constants import LOOKUP_SEP
+
+
+def _chemin_joignable(model, chemin):
+    """Vrai si chaque étape du chemin est une clé étrangère (ou un 1-1) portée par le modèle."""
+    for nom in chemin.split(LOOKUP_SEP):
+        champ = model._meta.get_field(nom)
+        if not (champ.concrete and (champ.many_to_one or champ.one_to_one)):
+            return False
+        model = champ.related_model
+    return True
+
+
+def charger_relations(queryset, relations):
+    """
+    Joint (select_related) les relations « vers un » et précharge
+    (prefetch_related) les relations « vers plusieurs » affichées par une vue.
+    """
+    jointures = [r for r in relations if _chemin_joignable(queryset.model, r)]
+    prechargements = [r for r in relations if r not in jointures]
+    if jointures:
+        queryset = queryset.select_related(*jointures)
+    if prechargements:
+        queryset = queryset.prefetch_related(*prechargements)
+    return queryset
+
+
+class RelationsMixin:
+    """
+    Chaque vue déclare les relations que ses gabarits affichent (``relations``)
+    et le nombre maximal de requêtes SQL qu'elle peut émettre (``max_queries``),
+    vérifié par les tests via ``utils.testing.QueryBudgetTestMixin``.
+    """
+    relations = ()
+    max_queries = None
+
+    def get_queryset(self):
+        return charger_relations(super().get_queryset(), self.relations)
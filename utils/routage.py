@@ -0,0 +1,127 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Clé de session : jusqu'à quand (timestamp) les lectures de l'utilisateur restent sur le primaire.
+CLE_SESSION_PRIMAIRE = 'routage:primaire_jusqu_a'
+
+_lecture_replica = ContextVar('lecture_replica', default=False)
+_etat_requete = ContextVar('etat_routage', default=None)
+
+
+class _EtatRequete:
+    """État de routage d'une requête HTTP, partagé par les threads qu'elle lance."""
+
+    def __init__(self, primaire):
+        self.primaire = primaire
+        self.ecriture = False
+        self.replica = None
+
+
+def replicas():
+    return getattr(settings, 'REPLICAS_LECTURE', [])
+
+
+@contextmanager
+def lecture_replica():
+    """Autorise les lectures du bloc à partir d'un réplica (s'il y en a)."""
+    jeton = _lecture_replica.set(True)
+    try:
+        yield
+    finally:
+        _lecture_replica.reset(jeton)
+
+
+def _relire(contenu):
+    with lecture_replica():
+        yield from contenu
+
+
+class LectureReplicaMixin:
+    """
+    À placer après les mixins de permission : les lectures des requêtes GET et
+    HEAD de la vue (y compris un export CSV en flux) peuvent aller sur un réplica.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        with lecture_replica():
+            response = super().dispatch(request, *args, **kwargs)
+        if response.streaming and not response.is_async:
+            response.streaming_content = _relire(response.streaming_content)
+        return response
+
+
+class RoutageReplicas:
+    """
+    Routeur : les écritures vont toujours sur le primaire (``default``). Les
+    lectures vont sur un réplica, choisi une fois par requête, seulement :
+    - dans un bloc lecture_replica() (vues de lecture explicitement désignées) ;
+    - hors transaction ouverte sur le primaire ;
+    - si la requête n'a encore rien écrit et que la session n'est pas collée au
+      primaire par une écriture récente (voir PrimaireApresEcritureMiddleware).
+    """
+
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or not _lecture_replica.get():
+            return None
+        etat = _etat_requete.get()
+        if etat is not None and (etat.primaire or etat.ecriture):
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        if etat is None:
+            return random.choice(aliases)
+        if etat.replica is None:
+            etat.replica = random.choice(aliases)
+        return etat.replica
+
+    def db_for_write(self, model, **hints):
+        etat = _etat_requete.get()
+        if etat is not None:
+            etat.ecriture = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Le schéma des réplicas vient de la réplication.
+        if db in replicas():
+            return False
+        return None
+
+
+class PrimaireApresEcritureMiddleware:
+    """
+    Après une requête qui a écrit, les lectures de la même session restent sur
+    le primaire pendant DUREE_PRIMAIRE_APRES_ECRITURE secondes : l'utilisateur
+    relit ce qu'il vient d'enregistrer même si les réplicas ont du retard.
+    À placer après SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replicas():
+            return self.get_response(request)
+
+        etat = _EtatRequete(primaire=request.session.get(CLE_SESSION_PRIMAIRE, 0) > time.time())
+        jeton = _etat_requete.set(etat)
+        try:
+            response = self.get_response(request)
+        finally:
+            _etat_requete.reset(jeton)
+        if etat.ecriture:
+            request.session[CLE_SESSION_PRIMAIRE] = time.time() + settings.DUREE_PRIMAIRE_APRES_ECRITURE
+        return response
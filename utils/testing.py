@@ -0,0 +1,26 @@
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+
+class QueryBudgetTestMixin:
+    """Assertions de budget de requêtes SQL pour les vues déclarant ``max_queries``."""
+
+    def assertRespecteBudget(self, url, data=None):
+        view_class = getattr(resolve(url).func, 'view_class', None)
+        budget = getattr(view_class, 'max_queries', None)
+        self.assertIsNotNone(budget, f"La vue servant {url} ne déclare pas de max_queries.")
+
+        # Budget mesuré cache froid : les rôles et résultats mis en cache sont recalculés.
+        cache.clear()
+        caches['template_fragments'].clear()
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(requetes), budget,
+            f"{url} : {len(requetes)} requêtes pour un budget de {budget}.\n"
+            + "\n".join(q['sql'] for q in requetes.captured_queries)
+        )
+        return response
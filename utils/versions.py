@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Versions déjà lues pendant la requête en cours : {séquence: valeur}.
+_versions_lues = ContextVar('versions_lues', default=None)
+
+
+def lire_version(sequence):
+    """
+    Version courante du compteur ``sequence`` (séquence PostgreSQL), commune à
+    tous les processus. Lue au plus une fois par requête (VersionsMiddleware),
+    à chaque appel en dehors d'une requête.
+    """
+    lues = _versions_lues.get()
+    if lues is not None and sequence in lues:
+        return lues[sequence]
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute(f'SELECT last_value FROM {connections[DEFAULT_DB_ALIAS].ops.quote_name(sequence)}')
+        version = cursor.fetchone()[0]
+    if lues is not None:
+        lues[sequence] = version
+    return version
+
+
+def nouvelle_version(sequence):
+    """
+    Incrémente le compteur ``sequence``. Une séquence n'est pas transactionnelle :
+    la nouvelle version est vue aussitôt par les autres processus, même si la
+    transaction en cours est ensuite annulée (une invalidation de trop, sans effet).
+    """
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute('SELECT nextval(%s)', [sequence])
+        version = cursor.fetchone()[0]
+    lues = _versions_lues.get()
+    if lues is not None:
+        lues[sequence] = version
+    return version
+
+
+@contextmanager
+def versions_memorisees():
+    """Les versions lues dans le bloc sont gardées jusqu'à sa fin (une requête HTTP)."""
+    jeton = _versions_lues.set({})
+    try:
+        yield
+    finally:
+        _versions_lues.reset(jeton)
+
+
+class VersionsMiddleware:
+    """Une lecture par compteur de version et par requête, quel que soit le nombre d'objets affichés."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with versions_memorisees():
+            return self.get_response(request)